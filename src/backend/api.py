@@ -1,36 +1,70 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import multiprocessing
 import os
 import re
 import glob
 from fastapi.middleware.cors import CORSMiddleware
-import PyPDF2
 import uuid
 import json
-from buildpdf.build import PDFBuilder
-from buildpdf.convert_docx import get_variables_in_docx, convert_docx_template_to_pdf
+from buildpdf.conversion_pool import ConversionPool
+from buildpdf.report_ir import docx_template_to_file_type
+from buildpdf.workers import (
+    BuildValidationError,
+    BuildWorkerPool,
+    preload_modules,
+)
+from buildpdf.workspace import cleanup_stale_workspaces
 from utils.qualify_filename import qualify_filename
-import platform
-from initialization.extract_RPT import extract_rpt_data
+from utils.report_io import (
+    dump_json,
+    is_current_report,
+    read_json,
+    save_report,
+    write_json,
+)
 from pydantic import BaseModel
 import shutil
-import traceback
+import threading
 
 from schema import FileType, FileData, Section
-from validate import validate_report
-from fastapi import HTTPException
-
-# Conditionally import pythoncom on Windows
-if platform.system() == "Windows":
-    import pythoncom
-else:
-    pythoncom = None
-
+from fastapi import HTTPException, Response
 
 def createUUID():
     return str(uuid.uuid4())
 
 
-app = FastAPI()
+def estimate_docx_page_count(docx_path: str) -> dict:
+    """
+    Estimates the page count of a DOCX from its package, without converting it.
+    num_pages is -1 and confidence None if the DOCX can't be read.
+    """
+    from buildpdf.docx_scanner import estimate_docx_pages
+
+    try:
+        return estimate_docx_pages(docx_path)
+    except Exception as e:
+        print(f"Error estimating the page count of {docx_path}: {e}")
+        return {"num_pages": -1, "confidence": None}
+
+
+build_workers = BuildWorkerPool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve the health check right away and warm up the heavy parts in the background
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+    build_workers.shutdown()
+
+
+def _warm_up():
+    preload_modules()
+    build_workers.start()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -89,15 +123,19 @@ def validate_docx_template(doc: dict, parent_directory_source: str) -> dict:
                 "Please convert this file to .docx format from within Word."
             ]
             return file_type
+        from buildpdf.convert_docx import get_variables_in_docx
+
         file_type["variables_in_doc"] = get_variables_in_docx(docx_path)
 
         # Add file to files list
+        estimate = estimate_docx_page_count(docx_path)
         file_type["files"] = [
             {
                 "type": "FileData",
                 "id": createUUID(),
                 "file_path": docx_path,
-                "num_pages": -1,  # Unknown until converted
+                "num_pages": estimate["num_pages"],  # Exact once converted
+                "num_pages_confidence": estimate["confidence"],
                 "bookmark_name": file_type["bookmark_name"],
             }
         ]
@@ -124,14 +162,18 @@ def validate_file_type(file: FileType, parent_directory_source: str) -> FileType
                     "Please convert this file to .docx format from within Word."
                 ]
                 return file
+            from buildpdf.convert_docx import get_variables_in_docx
+
             file.variables_in_doc = get_variables_in_docx(docx_path)
 
             # Add file to files list
+            estimate = estimate_docx_page_count(docx_path)
             file.files.append(
                 FileData(
                     id=createUUID(),
                     file_path=docx_path,
-                    num_pages=-1,
+                    num_pages=estimate["num_pages"],
+                    num_pages_confidence=estimate["confidence"],
                     bookmark_name=file.bookmark_name,
                 )
             )
@@ -185,13 +227,17 @@ def validate_file_type(file: FileType, parent_directory_source: str) -> FileType
     file.files = sorted(file.files, key=lambda x: os.path.basename(x.file_path))
 
     # Set num pages for PDF files only
+    import PyPDF2
+
     for file_data in file.files:
         # Construct full path temporarily for reading
         full_path = os.path.join(directory_source, file_data.file_path)
 
-        # Skip page count for DOCX files
+        # DOCX files are only estimated, converting them takes too long
         if full_path.lower().endswith((".docx")):
-            file_data.num_pages = -1
+            estimate = estimate_docx_page_count(full_path)
+            file_data.num_pages = estimate["num_pages"]
+            file_data.num_pages_confidence = estimate["confidence"]
             continue
 
         try:
@@ -211,11 +257,10 @@ def validate_file_type(file: FileType, parent_directory_source: str) -> FileType
     return file
 
 
-@app.post("/loadfile")
-def load_file(path) -> Section:
+@app.post("/loadfile", response_model=Section)
+def load_file(path) -> Response:
     try:
-        with open(path, "r") as f:
-            data = json.load(f)
+        data = read_json(path)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"File {path} not found.")
     except json.JSONDecodeError:
@@ -225,14 +270,22 @@ def load_file(path) -> Section:
             status_code=500, detail=f"An unexpected error occurred: {e}"
         )
 
-    # Convert DocxTemplate to FileType for backwards compatibility
-    data = convert_docx_templates_to_file_types(data)
+    # Reports saved in the current schema have no DocxTemplates left to convert
+    if not is_current_report(data):
+        # Convert DocxTemplate to FileType for backwards compatibility
+        data = convert_docx_templates_to_file_types(data)
 
     try:
-        return Section(**data)
+        report = Section(**data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error constructing report: {e}")
 
+    # Serialize with orjson rather than validating the report a second time as the response
+    return Response(
+        content=dump_json(report.model_dump(), compact=True),
+        media_type="application/json",
+    )
+
 
 def convert_docx_templates_to_file_types(data):
     """Recursively convert DocxTemplate objects to FileType objects."""
@@ -240,27 +293,7 @@ def convert_docx_templates_to_file_types(data):
         return data
 
     if data.get("type") == "DocxTemplate":
-        # Convert DocxTemplate to FileType
-        file_type = {
-            "type": "FileType",
-            "id": data["id"],
-            "bookmark_name": data.get("bookmark_name"),
-            "directory_source": os.path.dirname(data["docx_path"]) or "./",
-            "filename_text_to_match": os.path.basename(data["docx_path"]),
-            "will_have_page_numbers": data.get("will_have_page_numbers", True),
-            "files": [],
-            "variables_in_doc": data.get("variables_in_doc", []),
-            "is_table_of_contents": data.get("is_table_of_contents", False),
-            "page_number_offset": data.get("page_number_offset", 0),
-            "page_start_col": data.get("page_start_col", 3),
-            "page_end_col": data.get("page_end_col"),
-            "docx_path": data["docx_path"],  # Keep original path for compatibility
-            "exists": data.get("exists", False),
-            "needs_update": data.get("needs_update", False),
-            "bookmark_rules": [],
-        }
-
-        return file_type
+        return docx_template_to_file_type(data)
 
     # Process all values in the dict
     for key in list(data.keys()):
@@ -290,247 +323,24 @@ def convert_docx_templates_to_file_types(data):
 
 
 @app.post("/savefile")
-def save_file(path, data: Section):
-    with open(path, "w") as f:
-        json.dump(data.model_dump(), f, indent=4)
+def save_file(path, data: Section, compact: bool = False):
+    save_report(path, data.model_dump(), compact=compact)
 
 
 @app.post("/buildpdf")
-def build_pdf(data: dict, output_path: str):
-    if platform.system() == "Windows":
-        pythoncom.CoInitialize()  # Initialize COM library only on Windows
+def build_pdf(
+    data: dict, output_path: str, optimize: bool = False, resume: bool = False
+):
+    # Workspaces left behind by builds whose process was killed outright
+    cleanup_stale_workspaces()
     try:
-        # Convert any remaining DocxTemplate to FileType
-        data = convert_docx_templates_to_file_types(data)
-
-        # Convert DOCX files to PDF in all FileType objects
-        temp_pdf_files = []  # Track temporary files for cleanup
-
-        def process_docx_files(node, parent_directory="", parent_section=None):
-            if isinstance(node, dict):
-                if node.get("type") == "FileType":
-                    # Get directory for this FileType
-                    if parent_directory:
-                        directory_source = os.path.join(
-                            parent_directory, node.get("directory_source", "")
-                        )
-                    else:
-                        directory_source = node.get("directory_source", "")
-
-                    directory_source = os.path.normpath(directory_source)
-
-                    # Prepare variable replacements
-                    replacements = {}
-
-                    # Get replacements from variable_replacements if available
-                    if node.get("variable_replacements"):
-                        replacements.update(node.get("variable_replacements"))
-
-                    # Get replacements from parent section's variables if available
-                    if parent_section and parent_section.get("variables"):
-                        for var in parent_section.get("variables"):
-                            if var.get("template_text") and var.get("constant_value"):
-                                replacements[var.get("template_text")] = var.get(
-                                    "constant_value"
-                                )
-
-                    # Check if this is a DocxTemplate-converted FileType
-                    if "docx_path" in node:
-                        docx_path = node["docx_path"]
-                        if parent_directory:
-                            docx_path = os.path.join(parent_directory, docx_path)
-                        docx_path = os.path.normpath(docx_path)
-
-                        if os.path.exists(docx_path) and docx_path.lower().endswith(
-                            ".docx"
-                        ):
-                            try:
-                                print(f"Converting docx_path to PDF: {docx_path}")
-                                print(f"Using replacements: {replacements}")
-
-                                # Use the existing conversion function
-                                pdf_reader, num_pages, pdf_path, modified_docx = (
-                                    convert_docx_template_to_pdf(
-                                        docx_path=docx_path,
-                                        replacements=replacements,
-                                        is_table_of_contents=node.get(
-                                            "is_table_of_contents", False
-                                        ),
-                                        page_start_col=node.get("page_start_col"),
-                                        page_end_col=node.get("page_end_col"),
-                                    )
-                                )
-
-                                if pdf_path and os.path.exists(pdf_path):
-                                    # Create a new file entry for the PDF
-                                    pdf_file_data = {
-                                        "type": "FileData",
-                                        "id": createUUID(),
-                                        "file_path": pdf_path,
-                                        "num_pages": num_pages,
-                                        "bookmark_name": node.get("bookmark_name"),
-                                    }
-
-                                    # Add this file to the files list
-                                    if "files" not in node:
-                                        node["files"] = []
-                                    node["files"].append(pdf_file_data)
-                                    temp_pdf_files.append(pdf_path)  # Track for cleanup
-                                    print(
-                                        f"Successfully converted docx_path to: {pdf_path}"
-                                    )
-                            except Exception as e:
-                                print(
-                                    f"Error converting docx_path to PDF: {docx_path} - {str(e)}"
-                                )
-                                traceback.print_exc()
-                            except Exception as e:
-                                print(
-                                    f"Error converting docx_path to PDF: {docx_path} - {str(e)}"
-                                )
-                                traceback.print_exc()
-
-                    # Check all files in this FileType
-                    updated_files = []
-                    for file_data in node.get("files", []):
-                        if isinstance(file_data, dict):
-                            file_path = file_data.get("file_path", "")
-                        else:
-                            # Handle case where file_data might be a string
-                            file_path = str(file_data)
-                            file_data = {"file_path": file_path}
-
-                        # If it's a DOCX file, convert it to PDF
-                        if file_path.lower().endswith(".docx"):
-                            try:
-                                print(f"Converting DOCX to PDF: {file_path}")
-                                print(f"Using replacements: {replacements}")
-
-                                # Use the existing conversion function
-                                pdf_reader, num_pages, pdf_path, docx_path = (
-                                    convert_docx_template_to_pdf(
-                                        docx_path=file_path, replacements=replacements
-                                    )
-                                )
-
-                                if pdf_path and os.path.exists(pdf_path):
-                                    # Create a new file entry for the PDF
-                                    pdf_file_data = {
-                                        "type": "FileData",
-                                        "id": createUUID(),
-                                        "file_path": pdf_path,
-                                        "num_pages": num_pages,
-                                        "bookmark_name": file_data.get("bookmark_name"),
-                                    }
-
-                                    # Copy any other important attributes from the original file_data
-                                    for key in file_data:
-                                        if (
-                                            key
-                                            not in [
-                                                "type",
-                                                "id",
-                                                "file_path",
-                                                "num_pages",
-                                            ]
-                                            and key not in pdf_file_data
-                                        ):
-                                            pdf_file_data[key] = file_data[key]
-
-                                    updated_files.append(pdf_file_data)
-                                    temp_pdf_files.append(pdf_path)  # Track for cleanup
-                                    print(f"Successfully converted to: {pdf_path}")
-                                else:
-                                    # Keep the original DOCX if conversion failed
-                                    updated_files.append(file_data)
-                                    print(f"Failed to convert DOCX to PDF: {file_path}")
-                            except Exception as e:
-                                print(
-                                    f"Error converting DOCX to PDF: {file_path} - {str(e)}"
-                                )
-                                traceback.print_exc()
-                        else:
-                            # Keep non-DOCX files as they are
-                            updated_files.append(file_data)
-
-                    # Update the files list
-                    node["files"] = updated_files
-
-                # Process child nodes
-                if node.get("type") == "Section":
-                    # Get directory for child processing
-                    if parent_directory:
-                        section_directory = os.path.join(
-                            parent_directory, node.get("base_directory", "")
-                        )
-                    else:
-                        section_directory = node.get("base_directory", "")
-
-                    # Process children
-                    for child in node.get("children", []):
-                        process_docx_files(child, section_directory, node)
-
-                # Process other dictionary fields
-                for key, value in node.items():
-                    if key != "children" and isinstance(value, dict):
-                        process_docx_files(value, parent_directory, parent_section)
-                    elif key != "children" and isinstance(value, list):
-                        for item in value:
-                            if isinstance(item, dict):
-                                process_docx_files(
-                                    item, parent_directory, parent_section
-                                )
-
-        # Process the entire report structure
-        process_docx_files(data, data.get("base_directory", ""))
-
-        # Add empty variables array to all Section objects for backward compatibility
-        def add_variables_to_sections(node):
-            if isinstance(node, dict):
-                # If this is a Section, ensure it has a variables field
-                if node.get("type") == "Section" and "variables" not in node:
-                    node["variables"] = []
-
-                # If this is a FileType, set will_have_page_numbers to False
-                if node.get("type") == "FileType":
-                    node["will_have_page_numbers"] = False
-
-                # Process all children recursively
-                for key, value in node.items():
-                    if isinstance(value, dict):
-                        add_variables_to_sections(value)
-                    elif isinstance(value, list):
-                        for item in value:
-                            if isinstance(item, dict):
-                                add_variables_to_sections(item)
-
-        add_variables_to_sections(data)
-
-        problem = validate_report(data)
-        if isinstance(problem, str):
-            raise HTTPException(status_code=400, detail=problem)
-
-        builder = PDFBuilder()  # Instantiate the PDFBuilder
-        result = builder.generate_pdf(data, output_path)  # Generate the PDF
-
-        # Combine temporary files from both steps
-        temp_pdf_files.extend(result.get("temporary_pdfs", []))
-
-        # Clean up temporary PDF files
-        for temp_file in temp_pdf_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            except Exception as e:
-                print(f"Error removing temporary file {temp_file}: {str(e)}")
-
-        return result  # Return the complete result including problematic_files
-
+        # Runs in a warm build worker process. With resume, the units an earlier
+        # build of output_path checkpointed before it failed are reused.
+        return build_workers.run(data, output_path, optimize, resume)
+    except BuildValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if platform.system() == "Windows":
-            pythoncom.CoUninitialize()  # Uninitialize COM library only on Windows
 
 
 class RPTExtractionRequest(BaseModel):
@@ -565,6 +375,8 @@ def extract_rpt(request: RPTExtractionRequest):
             )
 
         # Extract data from the RPT PDF
+        from initialization.extract_RPT import extract_rpt_data
+
         data = extract_rpt_data(request.pdf_path, request.output_json_path)
 
         if not data:
@@ -613,12 +425,15 @@ def create_directory_structure(request: CreateDirectoryRequest):
     Returns:
         Dictionary with success status and created directories
     """
-    created_dirs = []
+    from buildpdf.convert_docx import convert_docx_template_to_pdf
+
+    created_dirs = {}  # ordered set of normalized directory paths
     generated_documents = []
     report = None
     report_path = None
     analytical_report_path = None
     success = False
+    conversion_pool = ConversionPool()
 
     try:
         # Validate base path exists
@@ -670,23 +485,10 @@ def create_directory_structure(request: CreateDirectoryRequest):
         # Normalize the path to resolve any issues with slashes
         root_dir = os.path.normpath(root_dir)
 
+        # The root directory has to exist before templates can be rendered into it
         print(f"Creating root directory: {root_dir}")
         os.makedirs(root_dir, exist_ok=True)
-        created_dirs.append(root_dir)
-
-        # Create COA folder if requested
-        if request.add_coa_folder:
-            coa_dir = os.path.join(root_dir, "COA")
-            os.makedirs(coa_dir, exist_ok=True)
-            created_dirs.append(coa_dir)
-            print(f"Created COA directory: {coa_dir}")
-
-        # Create Designated Benchsheets folder if requested
-        if request.add_benchsheets_folder:
-            benchsheets_dir = os.path.join(root_dir, "Designated Benchsheets")
-            os.makedirs(benchsheets_dir, exist_ok=True)
-            created_dirs.append(benchsheets_dir)
-            print(f"Created Designated Benchsheets directory: {benchsheets_dir}")
+        created_dirs[root_dir] = None
 
         # Check if the base_path is already an absolute path
         if os.path.isabs(request.base_path):
@@ -700,12 +502,68 @@ def create_directory_structure(request: CreateDirectoryRequest):
             report["base_directory"] = abs_root_dir
             print(f"Setting report base_directory to absolute path: {abs_root_dir}")
 
+        # Start the template conversions first. Each one is a full replace-and-convert
+        # through Word, so they run on the conversion pool while the rest of the
+        # scaffolding happens on this thread.
+        processed_templates = False
+        template_jobs = []
+        if request.process_docx_templates:
+            processed_templates = True
+            # Create a dictionary of replacements from extracted data
+            replacements = {}
+            if request.extracted_data:
+                for key, value in request.extracted_data.items():
+                    if isinstance(value, str):
+                        replacements[key] = value
+                    elif isinstance(value, list):
+                        replacements[key] = ", ".join(value)
+
+            for template_path, template_name in [
+                (request.cover_page_template_path, "Cover Page"),
+                (request.cover_pages_template_path, "Cover Pages"),
+                (request.case_narrative_template_path, "Case Narrative"),
+            ]:
+                if not template_path:
+                    continue
+                if not os.path.exists(template_path):
+                    print(
+                        f"Skipping {template_name}: Template not found at {template_path}"
+                    )
+                    continue
+                base_filename = os.path.splitext(os.path.basename(template_path))[0]
+                modified_docx_path = os.path.join(
+                    root_dir, f"{base_filename}_modified.docx"
+                )
+                future = conversion_pool.submit(
+                    convert_docx_template_to_pdf,
+                    docx_path=template_path,
+                    replacements=replacements,
+                    save_modified_to=modified_docx_path,
+                )
+                template_jobs.append((template_path, template_name, future))
+
+        # Plan every directory up front, then create them in one pass
+        if request.add_coa_folder:
+            created_dirs[os.path.join(root_dir, "COA")] = None
+        if request.add_benchsheets_folder:
+            created_dirs[os.path.join(root_dir, "Designated Benchsheets")] = None
+        try:
+            _plan_section_directories(report, root_dir, created_dirs)
+        except Exception as e:
+            print(f"Error planning section directories: {str(e)}")
+            # Continue even if we couldn't plan all directories
+        for dir_path in created_dirs:
+            try:
+                os.makedirs(dir_path, exist_ok=True)
+            except Exception as e:
+                # Log the error but continue creating the other directories
+                print(f"Error creating directory {dir_path}: {str(e)}")
+
         # Save the report.json in the root directory with Merit set ID in the filename
         try:
             report_json_filename = f"report_{safe_dir_name}.json"
             report_path = os.path.join(root_dir, report_json_filename)
-            with open(report_path, "w") as f:
-                json.dump(report, f, indent=4)
+            write_json(report_path, report)
             print(f"Saved report JSON to: {report_path}")
         except Exception as e:
             print(f"Error saving report JSON: {str(e)}")
@@ -728,89 +586,31 @@ def create_directory_structure(request: CreateDirectoryRequest):
                 print(f"Error copying analytical report: {str(e)}")
                 # Continue even if we couldn't copy the report
 
-        # Process DOCX templates if requested
-        processed_templates = False
-        if request.process_docx_templates:
-            processed_templates = True
-            # Create a dictionary of replacements from extracted data
-            replacements = {}
-            if request.extracted_data:
-                for key, value in request.extracted_data.items():
-                    if isinstance(value, str):
-                        replacements[key] = value
-                    elif isinstance(value, list):
-                        replacements[key] = ", ".join(value)
-
-            # --- Define a helper to process each template ---
-            def process_template(template_path, template_name):
-                if template_path and os.path.exists(template_path):
-                    try:
-                        base_filename = os.path.splitext(
-                            os.path.basename(template_path)
-                        )[0]
-                        modified_docx_path = os.path.join(
-                            root_dir, f"{base_filename}_modified.docx"
-                        )
-
-                        pdf_reader, num_pages, created_pdf_path, created_docx_path = (
-                            convert_docx_template_to_pdf(
-                                docx_path=template_path,
-                                replacements=replacements,
-                                save_modified_to=modified_docx_path,
-                            )
-                        )
-
-                        # Add successfully created files to the list
-                        if created_docx_path and os.path.exists(created_docx_path):
-                            generated_documents.append(created_docx_path)
-                        if created_pdf_path and os.path.exists(created_pdf_path):
-                            generated_documents.append(created_pdf_path)
-
-                    except Exception as e:
-                        # Log the error but continue processing other templates
-                        print(
-                            f"Error processing {template_name} template '{template_path}': {str(e)}"
-                        )
-                else:
-                    if template_path:
-                        print(
-                            f"Skipping {template_name}: Template not found at {template_path}"
-                        )
-
-            # --- Process each template using the helper ---
-            process_template(request.cover_page_template_path, "Cover Page")
-            process_template(request.cover_pages_template_path, "Cover Pages")
-            process_template(request.case_narrative_template_path, "Case Narrative")
-
-        # Create directories recursively
-        try:
-            _create_section_directories(report, root_dir, created_dirs)
-        except Exception as e:
-            print(f"Error creating section directories: {str(e)}")
-            # Continue even if we couldn't create all directories
-
-        # Filter out duplicates and normalize paths for directories
-        unique_dirs = []
-        for dir_path in created_dirs:
-            normalized_path = os.path.normpath(dir_path)
-            if normalized_path not in unique_dirs:
-                unique_dirs.append(normalized_path)
-
-        # Filter out duplicates and non-existent files for documents
-        unique_docs = []
-        for doc_path in generated_documents:
-            normalized_path = os.path.normpath(doc_path)
-            if os.path.exists(normalized_path) and normalized_path not in unique_docs:
-                unique_docs.append(normalized_path)
+        # Collect the template conversions in submission order
+        for template_path, template_name, future in template_jobs:
+            try:
+                pdf_reader, num_pages, created_pdf_path, created_docx_path = (
+                    future.result()
+                )
+                # Add successfully created files to the list
+                if created_docx_path:
+                    generated_documents.append(created_docx_path)
+                if created_pdf_path:
+                    generated_documents.append(created_pdf_path)
+            except Exception as e:
+                # Log the error but continue processing other templates
+                print(
+                    f"Error processing {template_name} template '{template_path}': {str(e)}"
+                )
 
         success = True
 
         response_data = {
             "success": success,
-            "created_directories": unique_dirs,
+            "created_directories": list(created_dirs),
             "report_path": report_path,
             "updated_report": report,  # Return the updated report
-            "generated_documents": unique_docs,  # Use the filtered list of existing documents
+            "generated_documents": _existing_unique_paths(generated_documents),
             "processed_templates": processed_templates,
         }
 
@@ -826,31 +626,16 @@ def create_directory_structure(request: CreateDirectoryRequest):
         print(error_msg)  # Log the error for server-side debugging
 
         # Ensure generated_documents is filtered even in case of partial success
-        unique_docs = []
-        if generated_documents:
-            for doc_path in generated_documents:
-                normalized_path = os.path.normpath(doc_path)
-                if (
-                    os.path.exists(normalized_path)
-                    and normalized_path not in unique_docs
-                ):
-                    unique_docs.append(normalized_path)
+        unique_docs = _existing_unique_paths(generated_documents)
 
         # If we got far enough to create some directories and files, return what we have
         if len(created_dirs) > 0 or len(unique_docs) > 0:
             print("Returning partial results despite error")
 
-            # Filter out duplicates and normalize paths for directories
-            unique_dirs = []
-            for dir_path in created_dirs:
-                normalized_path = os.path.normpath(dir_path)
-                if normalized_path not in unique_dirs:
-                    unique_dirs.append(normalized_path)
-
             response_data = {
                 "success": False,
                 "error": error_msg,
-                "created_directories": unique_dirs,
+                "created_directories": list(created_dirs),
                 "report_path": report_path,
                 "updated_report": report,
                 "generated_documents": unique_docs,  # Return filtered documents
@@ -864,19 +649,31 @@ def create_directory_structure(request: CreateDirectoryRequest):
             return response_data
         else:
             raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        conversion_pool.shutdown()
 
 
-def _create_section_directories(section, parent_path, created_dirs):
+def _existing_unique_paths(paths):
+    """Normalizes paths, dropping duplicates and files that do not exist."""
+    unique_paths = {}
+    for path in paths:
+        normalized_path = os.path.normpath(path)
+        if normalized_path not in unique_paths and os.path.exists(normalized_path):
+            unique_paths[normalized_path] = None
+    return list(unique_paths)
+
+
+def _plan_section_directories(section, parent_path, planned_dirs):
     """
-    Recursively create directories for a section.
+    Recursively work out the directories for a section without touching the disk.
 
     Args:
         section: Section data
         parent_path: Parent path
-        created_dirs: List to collect created directories
+        planned_dirs: Dict used as an ordered set of normalized directory paths
     """
     try:
-        # Create directory for this section if it has a base_directory
+        # Plan a directory for this section if it has a base_directory
         base_directory = section.get("base_directory")
         if (
             base_directory
@@ -887,13 +684,7 @@ def _create_section_directories(section, parent_path, created_dirs):
             safe_dir_name = base_directory.strip()
 
             # Strip any trailing slashes which could cause duplicate directory entries
-            while safe_dir_name.endswith("/") or safe_dir_name.endswith("\\"):
-                safe_dir_name = safe_dir_name[:-1]
-
-            # Log original base_directory for debugging
-            print(
-                f"Original base_directory: {base_directory} (cleaned: {safe_dir_name})"
-            )
+            safe_dir_name = safe_dir_name.rstrip("/\\")
 
             # Check if this is an absolute path (likely the root section)
             is_absolute_path = os.path.isabs(safe_dir_name)
@@ -906,7 +697,6 @@ def _create_section_directories(section, parent_path, created_dirs):
             if is_root_section:
                 # For the root section, use the directory as is
                 section_dir = safe_dir_name
-                print(f"Using root section path directly: {section_dir}")
             else:
                 # For non-root sections, handle relative paths
 
@@ -918,19 +708,14 @@ def _create_section_directories(section, parent_path, created_dirs):
                     )
                     # Get the last component (the actual directory name)
                     safe_dir_name = os.path.basename(safe_dir_name)
-                    print(f"Extracted directory name: {safe_dir_name}")
 
                 # Further clean the name for filesystem safety
                 safe_dir_name = safe_dir_name.replace("/", "_").replace("\\", "_")
-                print(f"Final safe directory name: {safe_dir_name}")
-
-                # Check if this directory would create a duplicate of the parent directory name
-                parent_dir_name = os.path.basename(parent_path)
 
                 # Skip creating this directory if it would create a duplicate level with the same name
-                if safe_dir_name == parent_dir_name:
+                if safe_dir_name == os.path.basename(parent_path):
                     print(f"Skipping duplicate directory level: {safe_dir_name}")
-                    # Don't create a new directory, but still process children with the same parent_path
+                    # Don't plan a new directory, but still process children with the same parent_path
                     section_dir = parent_path
                 else:
                     # Use section's base_directory relative to parent
@@ -938,19 +723,7 @@ def _create_section_directories(section, parent_path, created_dirs):
 
             # Normalize the path to avoid issues with slashes
             section_dir = os.path.normpath(section_dir)
-
-            print(f"Creating directory: {section_dir}")
-
-            if not os.path.exists(section_dir):
-                os.makedirs(section_dir, exist_ok=True)
-
-            # Only add to created_dirs if it's not already in the list
-            # Check using normalized paths
-            if section_dir not in [os.path.normpath(d) for d in created_dirs]:
-                created_dirs.append(section_dir)
-                print(f"Added to created_dirs: {section_dir}")
-            else:
-                print(f"Directory already in created_dirs: {section_dir}")
+            planned_dirs[section_dir] = None
 
             # Update the parent path for children
             parent_path = section_dir
@@ -960,10 +733,10 @@ def _create_section_directories(section, parent_path, created_dirs):
         if children and isinstance(children, list):
             for child in children:
                 if child and isinstance(child, dict) and child.get("type") == "Section":
-                    _create_section_directories(child, parent_path, created_dirs)
+                    _plan_section_directories(child, parent_path, planned_dirs)
     except Exception as e:
         # Log the error but continue processing other sections
-        print(f"Error creating directory for section: {str(e)}")
+        print(f"Error planning directory for section: {str(e)}")
 
 
 class FilterTemplateRequest(BaseModel):
@@ -1001,8 +774,7 @@ def filter_template(request: FilterTemplateRequest):
             )
 
         # Load template
-        with open(request.template_path, "r") as f:
-            template = json.load(f)
+        template = read_json(request.template_path)
 
         # Get method codes from extracted data
         method_codes = request.extracted_data.get("methods", [])
@@ -1016,8 +788,7 @@ def filter_template(request: FilterTemplateRequest):
         # Save to output path if provided
         if request.output_path:
             os.makedirs(os.path.dirname(request.output_path), exist_ok=True)
-            with open(request.output_path, "w") as f:
-                json.dump(filtered_template, f, indent=4)
+            write_json(request.output_path, filtered_template)
 
         return filtered_template
 
@@ -1284,6 +1055,8 @@ def get_docx_variables(request: DocxVariablesRequest):
             )
 
         # Extract variables from the DOCX
+        from buildpdf.convert_docx import get_variables_in_docx
+
         variables = get_variables_in_docx(request.docx_path)
 
         return {"variables": variables}
@@ -1292,7 +1065,46 @@ def get_docx_variables(request: DocxVariablesRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class DocxVariablesBulkRequest(BaseModel):
+    """Request model for getting variables from several DOCX files at once."""
+
+    docx_paths: list[str]
+
+
+@app.post("/get_docx_variables_bulk")
+def get_docx_variables_bulk(request: DocxVariablesBulkRequest):
+    """
+    Extract variables from several DOCX files in parallel.
+
+    Args:
+        request: DocxVariablesBulkRequest containing:
+            - docx_paths: Paths to the DOCX files
+
+    Returns:
+        Dictionary with the variables per path and an error message for every
+        path that could not be read
+    """
+    errors = {}
+    valid_paths = []
+    for docx_path in request.docx_paths:
+        if not os.path.exists(docx_path):
+            errors[docx_path] = f"File not found: {docx_path}"
+        elif not docx_path.lower().endswith(".docx"):
+            errors[docx_path] = f"File is not a DOCX: {docx_path}"
+        else:
+            valid_paths.append(docx_path)
+
+    from buildpdf.convert_docx import get_variables_in_docx_files
+
+    variables, read_errors = get_variables_in_docx_files(valid_paths)
+    errors.update(read_errors)
+
+    return {"variables": variables, "errors": errors}
+
+
 if __name__ == "__main__":
+    # Lets the frozen executable start build worker processes
+    multiprocessing.freeze_support()
     import uvicorn
 
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,139 @@
+from array import array
+from typing import List, Optional
+
+from schema import BookmarkItem
+
+NO_PARENT = -1
+NO_PAGE_END = -1
+
+_IS_TABLE_OF_CONTENTS = 1
+_INCLUDE_IN_TABLE_OF_CONTENTS = 2
+
+
+class BookmarkStore:
+    """
+    Flat, append-only store for the bookmarks of one build.
+
+    A bookmark is referred to by its integer index. Every field lives in its own
+    array, and parents are stored as the index of an earlier bookmark, so a parent
+    always comes before its children. This keeps tens of thousands of bookmarks
+    cheap to create, shift and walk. Use to_items() to get schema.BookmarkItem
+    objects where a pydantic model is needed.
+
+    Usage:
+        store = BookmarkStore()
+        section = store.add("Section", page=1)
+        store.add("Child", page=3, parent=section)
+    """
+
+    __slots__ = ("titles", "pages", "page_ends", "parents", "ids", "flags")
+
+    def __init__(self):
+        self.titles: List[str] = []
+        self.pages = array("l")
+        self.page_ends = array("l")
+        self.parents = array("l")
+        # Report ids of sections, FileTypes and files. Page-level bookmarks have None.
+        self.ids: List[Optional[str]] = []
+        self.flags = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def add(
+        self,
+        title: str,
+        page: int,
+        parent: Optional[int] = None,
+        id: Optional[str] = None,
+        is_table_of_contents: bool = False,
+        include_in_table_of_contents: bool = True,
+    ) -> int:
+        """
+        Appends a bookmark and returns its index.
+
+        :param title: The bookmark title.
+        :param page: The 1-based page the bookmark points at.
+        :param parent: The index of the parent bookmark, None for a top-level bookmark.
+        :param id: The report id the bookmark was created for, if any.
+        """
+        self.titles.append(title)
+        self.pages.append(page)
+        self.page_ends.append(NO_PAGE_END)
+        self.parents.append(NO_PARENT if parent is None else parent)
+        self.ids.append(id)
+        self.flags.append(
+            (_IS_TABLE_OF_CONTENTS if is_table_of_contents else 0)
+            | (_INCLUDE_IN_TABLE_OF_CONTENTS if include_in_table_of_contents else 0)
+        )
+        return len(self.titles) - 1
+
+    def parent(self, index: int) -> Optional[int]:
+        parent = self.parents[index]
+        return None if parent == NO_PARENT else parent
+
+    def page_end(self, index: int) -> Optional[int]:
+        page_end = self.page_ends[index]
+        return None if page_end == NO_PAGE_END else page_end
+
+    def is_table_of_contents(self, index: int) -> bool:
+        return bool(self.flags[index] & _IS_TABLE_OF_CONTENTS)
+
+    def include_in_table_of_contents(self, index: int) -> bool:
+        return bool(self.flags[index] & _INCLUDE_IN_TABLE_OF_CONTENTS)
+
+    def levels(self) -> array:
+        """Returns the nesting level of every bookmark, 0 for top-level bookmarks."""
+        levels = array("l", bytes(len(self) * array("l").itemsize))
+        for index, parent in enumerate(self.parents):
+            if parent != NO_PARENT:
+                levels[index] = levels[parent] + 1
+        return levels
+
+    def shift_pages(self, num_pages: int, from_page: int = None) -> None:
+        """
+        Moves every bookmark except the table of contents back by num_pages.
+
+        :param from_page: Only move pages and page ends from this page on, and the
+            page ends on the page just before it. Every bookmark if None.
+        """
+        pages, page_ends, flags = self.pages, self.page_ends, self.flags
+        for index in range(len(self)):
+            if flags[index] & _IS_TABLE_OF_CONTENTS:
+                continue
+            if from_page is None or pages[index] >= from_page:
+                pages[index] += num_pages
+            page_end = page_ends[index]
+            if page_end != NO_PAGE_END and (
+                from_page is None or page_end >= from_page - 1
+            ):
+                page_ends[index] += num_pages
+
+    def truncate(self, length: int) -> None:
+        """Removes every bookmark from index length on."""
+        del self.titles[length:]
+        del self.pages[length:]
+        del self.page_ends[length:]
+        del self.parents[length:]
+        del self.ids[length:]
+        del self.flags[length:]
+
+    def to_items(self) -> List[BookmarkItem]:
+        """Converts the store to linked schema.BookmarkItem objects, in the same order."""
+        items = []
+        for index in range(len(self)):
+            parent = self.parents[index]
+            items.append(
+                BookmarkItem(
+                    title=self.titles[index],
+                    page=self.pages[index],
+                    id=self.ids[index] or str(index),
+                    page_end=self.page_end(index),
+                    is_table_of_contents=self.is_table_of_contents(index),
+                    include_in_table_of_contents=self.include_in_table_of_contents(
+                        index
+                    ),
+                    parent=items[parent] if parent != NO_PARENT else None,
+                )
+            )
+        return items
@@ -1,423 +1,758 @@
+import itertools
 import os
-from typing import List, Dict, Any, Tuple, Union
+import shutil
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 from PyPDF2 import PdfWriter, PdfReader
 from buildpdf.convert_docx import convert_docx_template_to_pdf
-from buildpdf.page_level_bookmarks import get_page_level_bookmarks
-from schema import BookmarkItem
+from buildpdf.bookmarks import BookmarkStore
+from buildpdf.checkpoint import (
+    UNIT_CONVERSION,
+    UNIT_REORDERED,
+    UNIT_SCAN,
+    BuildCheckpoint,
+    file_fingerprint,
+    fingerprint,
+)
+from buildpdf.composer import PageComposer, blank_pdf
+from buildpdf.conversion_watchdog import ConversionWatchdog
+from buildpdf.memory import (
+    STAGE_READERS,
+    STAGE_REORDERED,
+    STAGE_REORDERING,
+    MemoryGovernor,
+)
+from buildpdf.optimize import optimize_writer
+from buildpdf.outline import add_outline, read_outline
+from buildpdf.output_writer import write_pdf_output
+from buildpdf.page_level_bookmarks import (
+    get_page_level_bookmarks,
+    iter_page_matches,
+    page_rule_matcher,
+)
+from buildpdf.parts import PartRenderer, get_part_worker_count
+from buildpdf.pipeline import BuildPipeline, ScannedFile
+from buildpdf.report_ir import (
+    CompiledReport,
+    FileTypeNode,
+    SectionNode,
+    compile_report,
+)
+from buildpdf.text_plan import (
+    TEXT_EXTRACT,
+    TEXT_NONE,
+    TEXT_REORDER,
+    TextPlan,
+    file_text_plan,
+    plan_text_extraction,
+    summarize_text_plan,
+)
+from buildpdf.workers import convert_file_type_docx
+from buildpdf.workspace import BuildWorkspace, WorkspaceQuotaExceeded
 from utils.reorder_metals_form1 import reorder_metals_form1
 from utils.reorder_by_datetime_manually_integrated import reorder_pdfs_by_datetime
-import uuid
-from PyPDF2.generic import IndirectObject, Destination  # Import Destination
 
 
 class PDFBuilder:
-    def __init__(self):
+    def __init__(
+        self,
+        workspace: BuildWorkspace = None,
+        part_workers: int = None,
+        checkpoint: BuildCheckpoint = None,
+    ):
+        self.workspace: BuildWorkspace = (
+            workspace or BuildWorkspace()
+        )  # build-private directory for intermediate DOCX/PDF files
+        self.scratch_dir: str = self.workspace.path
         self.writer_data: List[Dict[str, Any]] = []
-        self.bookmark_data: List[BookmarkItem] = []
+        self.bookmark_data = BookmarkStore()
         self.current_page: int = 1
         self.num_bookmarks: Union[int, None] = None
         self.table_of_contents_docx = None
-        self.page_number_offset: int = (
-            0  # used for table of contents. Adds a specified number to each page number
-        )
         self.problematic_files: List[Dict[str, Any]] = []  # Track problematic files
-        self.temporary_pdfs_created: List[str] = (
-            []
-        )  # Track temporary PDFs created by the builder
+        self.text_plans: Dict[str, TextPlan] = {}  # Which files need page text
+        self.compiled: Optional[CompiledReport] = None
+        self.composer = PageComposer()
+        # Accounts for the PDFs held in memory and spills them over its budget
+        self.memory = MemoryGovernor(self.workspace)
+        # Where expensive units are persisted for a resumed build, if anywhere
+        self.checkpoint = checkpoint
+        # Times out, kills and retries the DOCX conversions of the build
+        self.watchdog = ConversionWatchdog()
+        self._pipeline: Optional[BuildPipeline] = None
+        self._conversion_dirs = itertools.count()
+        # FileTypes with files planned so far, to drop bookmarks of sections
+        # whose DOCX files all failed to convert
+        self._file_types_with_files = 0
+        # The planned table of contents, whose pages are rendered last
+        self._table_of_contents: Optional[Dict[str, Any]] = None
+        # Writer page index the table of contents is inserted at, set by the composer
+        self._table_of_contents_index: Optional[int] = None
+        self._compose_problems: List[Dict[str, Any]] = []
+        # Worker processes composing the top-level sections as parts, 0 for none
+        self.part_workers = (
+            get_part_worker_count() if part_workers is None else part_workers
+        )
+        self._parts: Optional[PartRenderer] = None
+        # The part, one per top-level child of the report, files are planned into
+        self._part = 0
 
-    def generate_pdf(self, report: Dict[str, Any], output_path: str) -> Dict[str, Any]:
+    def generate_pdf(
+        self,
+        report: Union[Dict[str, Any], CompiledReport],
+        output_path: str,
+        optimize: bool = False,
+        convert_docx: bool = False,
+    ) -> Dict[str, Any]:
         """
         Generates a PDF from the given report data and writes it to the output path.
 
-        :param report: Dictionary containing report structure and data.
+        Conversion, scanning, planning and composition run as a pipeline, so each
+        FileType is composed as soon as the ones before it are planned. Only the table
+        of contents waits for the end, when every bookmark is known.
+
+        :param report: Dictionary containing report structure and data, or the report
+            already compiled by compile_report.
         :param output_path: Path where the generated PDF will be saved.
+        :param optimize: Whether to merge duplicate objects, drop orphaned objects and
+            compress content streams before saving.
+        :param convert_docx: Whether to convert the DOCX files of every FileType in the
+            pipeline. They must not have been converted already.
         :return: Dictionary containing success status, output path and any problematic files.
         """
-        report["bookmark_name"] = None  # Remove top-level bookmark
+        if not isinstance(report, CompiledReport):
+            report = compile_report(report, validate=False)
+        report.data["bookmark_name"] = None  # Remove top-level bookmark
+        self.compiled = report
+        self.text_plans = plan_text_extraction(report)
+        if convert_docx:
+            report.update_file_flags(pending_docx=True)
 
         def toc_filename(pdf_path: str) -> str:
             return pdf_path.replace(".pdf", "_table_of_contents.docx")
 
-        self._generate_pdf_pass_one(report)
-        self._add_page_end_to_bookmarks()
-        print("Pass one complete. Files are staged for processing. Processing files...")
-        writer = self._compose_pdf()
+        pipeline = BuildPipeline(
+            self._planned_file_types(report.root),
+            convert=self._convert_file_type if convert_docx else None,
+            scan=self._scan_file_type,
+            compose=self._compose_file_data,
+        )
+        if self.part_workers:
+            self._parts = PartRenderer(
+                self.workspace, self.part_workers, checkpoint=self.checkpoint
+            )
+        try:
+            with pipeline:
+                self._pipeline = pipeline
+                pipeline.start()
+                self._generate_pdf_pass_one(report)
+                self._add_page_end_to_bookmarks()
+                print("Pass one complete. Waiting for the composer...")
+                pipeline.finish()
+            self._pipeline = None
+            print(pipeline.summary())
+            text_summary = summarize_text_plan(self.text_plans)
+            print(
+                f"Page text needed for {text_summary[TEXT_EXTRACT]} files and "
+                f"{text_summary[TEXT_REORDER]} reordered FileTypes, skipped for "
+                f"{text_summary[TEXT_NONE]} files."
+            )
+            self.problematic_files.extend(self._compose_problems)
+            writer = self._compose_pdf()
+            reported = {p["path"] for p in self.problematic_files}
+            self.problematic_files.extend(
+                failure
+                for failure in self.watchdog.failures
+                if failure["path"] not in reported
+            )
+        finally:
+            if self._parts is not None:
+                self._parts.close()
+            self.memory.close()
         print("Pass two complete. Adding bookmarks...")
         self._add_bookmarks(writer)
+        optimization = None
+        if optimize:
+            print("Optimizing PDF...")
+            optimization = optimize_writer(writer)
+            print(
+                f"Merged {optimization['merged_objects']} duplicate objects, removed "
+                f"{optimization['removed_objects']} orphaned objects and compressed "
+                f"{optimization['compressed_streams']} streams."
+            )
         print("Bookmarks added. Saving PDF...")
-        writer.write(output_path)
+        output = write_pdf_output(writer, output_path, self.workspace)
+        print(
+            f"Saved {output['bytes']} bytes at "
+            f"{output['throughput_mb_per_second']} MB/s."
+        )
         if self.table_of_contents_docx:
             self.table_of_contents_docx.save(toc_filename(output_path))
+        memory = self.memory.summary()
+        print(
+            f"Held at most {memory['peak_bytes'] / 1024 / 1024:.1f} MB of PDFs in "
+            f"memory, spilled {memory['spilled_files']} PDFs to disk."
+        )
 
-        return {
+        result = {
             "success": True,
             "output_path": output_path,
             "problematic_files": self.problematic_files,
-            "temporary_pdfs": self.temporary_pdfs_created,  # Return the list of temp PDFs
+            "output": output,
+            "memory": memory,
         }
+        if optimization is not None:
+            result["optimization"] = optimization
+        if self.checkpoint is not None:
+            result["checkpoint"] = self.checkpoint.summary()
+            if self.checkpoint.resumed:
+                print(f"Resumed from checkpoints: {self.checkpoint.resumed}")
+            # Nothing is left to resume once the PDF is written
+            self.checkpoint.remove()
+        return result
+
+    def _planned_file_types(self, section: SectionNode) -> Iterator[FileTypeNode]:
+        """
+        Yields the FileTypes pass one will reach, in the order it reaches them.
+        Caches whether each section's directory exists so pass one agrees.
+        """
+        if section.exists is None:
+            section.exists = os.path.exists(section.directory)
+        if not section.exists:
+            return
+        for child in section.children:
+            if isinstance(child, SectionNode):
+                yield from self._planned_file_types(child)
+            else:
+                yield child
 
-    def _generate_pdf_pass_one(self, report: Dict[str, Any]) -> None:
+    def _generate_pdf_pass_one(self, report: CompiledReport) -> None:
         """
-        First pass through the report data to process and collect writer and bookmark data.
+        First pass through the report data to plan pages and bookmarks, in order.
+        Runs while the pipeline converts and scans the FileTypes ahead of it.
         """
-        self._build_pdf_data(report)
+        self._build_pdf_data(report.root)
 
     def _build_pdf_data(
         self,
-        section: Dict[str, Any],
-        base_directory: str = "./",
-        root_bookmark: BookmarkItem = None,
+        section: SectionNode,
+        root_bookmark: Optional[int] = None,
     ) -> None:
         """
         Recursively builds the PDF data from the report's sections and files.
 
-        :param section: The current section of the report.
-        :param base_directory: The base directory for resolving paths.
+        :param section: The current compiled section of the report.
         :param root_bookmark: The parent bookmark for the current section.
         """
-        base_directory = self._get_normalized_base_directory(base_directory, section)
-        if not self._directory_exists(base_directory, section):
+        if not self._directory_exists(section):
+            if section.has_files:
+                self._file_types_with_files += 1
             return
-        root_bookmark = self._create_root_bookmark_if_needed(section, root_bookmark)
-        for child in section["children"]:
-            child["variables"] = section[
-                "variables"
-            ]  # Pass variables to docx child because they are stored in section
-            self._process_child(child, base_directory, root_bookmark)
+        file_types_with_files = self._file_types_with_files
+        section_bookmark = self._create_root_bookmark_if_needed(section, root_bookmark)
+        for child in section.children:
+            if section is self.compiled.root:
+                self._part += 1
+            self._process_child(child, section_bookmark)
+        if (
+            section_bookmark != root_bookmark
+            and self._file_types_with_files == file_types_with_files
+        ):
+            # Its DOCX files failed to convert, so the section has no files after all
+            self.bookmark_data.truncate(section_bookmark)
 
     def _process_child(
-        self, child: Dict[str, Any], base_directory: str, root_bookmark: BookmarkItem
+        self, child: Union[SectionNode, FileTypeNode], root_bookmark: Optional[int]
     ) -> None:
         """
-        Processes individual children of a section, handling docxTemplates, FileTypes, and Sections.
+        Processes individual children of a section, handling FileTypes and Sections.
 
-        :param child: The child element to process.
-        :param base_directory: The base directory for resolving paths.
+        :param child: The compiled child element to process.
         :param root_bookmark: The parent bookmark for the current section.
         """
-        if child["type"] == "DocxTemplate":
-            self._process_docx_template(child, base_directory, root_bookmark)
-        elif child["type"] == "FileType":
-            self._process_file_type(child, base_directory, root_bookmark)
-        elif child["type"] == "Section":
-            self._process_section(child, base_directory, root_bookmark)
+        if isinstance(child, SectionNode):
+            self._process_section(child, root_bookmark)
+        else:
+            self._process_file_type(
+                child, root_bookmark, self._pipeline.result(child)
+            )
 
-    def _process_docx_template(
-        self, child: Dict[str, Any], base_directory: str, root_bookmark: BookmarkItem
-    ) -> None:
+    def _convert_file_type(self, file_type: FileTypeNode) -> None:
         """
-        Processes a docxTemplate child, converting it to a PDF and adding the relevant metadata.
-
-        :param child: The child element representing a docxTemplate.
-        :param base_directory: The base directory for resolving paths.
-        :param root_bookmark: The parent bookmark for the current section.
+        Conversion stage: converts the DOCX files of a FileType to PDFs. The PDFs of a
+        FileType an earlier build of the same report converted completely are reused
+        from its checkpoint.
         """
-        if child["exists"]:
-            if child["bookmark_name"]:
-                self.bookmark_data.append(
-                    BookmarkItem(
-                        title=child["bookmark_name"],
-                        page=self.current_page,
-                        parent=root_bookmark,
-                        id=child["id"],
-                        is_table_of_contents=child.get("is_table_of_contents", False),
-                    )
-                )
-
-            docx_path = os.path.normpath(
-                os.path.join(base_directory, child["docx_path"])
+        key = self._conversion_key(file_type)
+        if key is None:
+            scratch_dir = self.workspace.subdir(
+                f"convert_{next(self._conversion_dirs)}"
             )
-            _, num_pages, _, _ = convert_docx_template_to_pdf(
-                docx_path,
-                is_table_of_contents=child.get("is_table_of_contents", False),
-                page_start_col=child.get("page_start_col"),
-                page_end_col=child.get("page_end_col"),
-                bookmark_data=self.bookmark_data,
+        else:
+            saved = self.checkpoint.load(UNIT_CONVERSION, key)
+            if saved is not None:
+                file_type.data["files"] = saved["files"]
+                return
+            scratch_dir = self.checkpoint.subdir(UNIT_CONVERSION, key)
+        converted = convert_file_type_docx(
+            file_type,
+            self.workspace,
+            self.compiled,
+            scratch_dir=scratch_dir,
+            watchdog=self.watchdog,
+        )
+        if key is not None and converted:
+            files = file_type.data["files"]
+            self.checkpoint.save(
+                UNIT_CONVERSION,
+                key,
+                {"files": files},
+                [
+                    file["file_path"]
+                    for file in files
+                    if file["file_path"].startswith(scratch_dir)
+                ],
             )
-            self.page_number_offset = child.get("page_number_offset", 0)
-            docx_data = {
-                "type": "docxTemplate",
-                "id": child["id"],
-                "path": docx_path,
-                "replacements": self._map_template_variables(
-                    child.get("variables", [])
-                ),
-                "num_pages": num_pages,
-                "is_table_of_contents": child.get("is_table_of_contents", False),
-                "page_start": self.current_page,
-                "page_start_col": child.get("page_start_col"),
-                "page_end_col": child.get("page_end_col"),
-            }
-            self.writer_data.append(docx_data)
-            self.current_page += num_pages
 
-    def _process_file_type(
-        self, child: Dict[str, Any], base_directory: str, root_bookmark: BookmarkItem
-    ) -> None:
+    def _conversion_key(self, file_type: FileTypeNode) -> Optional[str]:
         """
-        Processes a FileType child, optionally reordering pages if required.
-
-        :param child: The child element representing a FileType.
-        :param base_directory: The base directory for resolving paths.
-        :param root_bookmark: The parent bookmark for the current section.
+        The checkpoint key of a FileType's conversion, None if it has nothing to
+        convert or the build has no checkpoint.
         """
-        keep_existing_bookmarks = child.get("keep_existing_bookmarks", False)
-        if child.get("reorder_pages_metals"):
-            self._process_file_type_with_reorder_metals(
-                child, base_directory, root_bookmark, keep_existing_bookmarks
-            )
-        elif child.get("reorder_pages_datetime"):
-            self._process_file_type_with_reorder_datetime(
-                child, base_directory, root_bookmark, keep_existing_bookmarks
-            )
-        else:
-            self._process_file_type_without_reorder(
-                child, base_directory, root_bookmark, keep_existing_bookmarks
+        node = file_type.data
+        docx_paths = [
+            os.path.normpath(
+                os.path.join(file_type.directory_source, file["file_path"])
             )
+            for file in node.get("files", [])
+            if isinstance(file, dict)
+            and file.get("file_path", "").lower().endswith(".docx")
+        ]
+        if self.checkpoint is None or not (file_type.docx_path or docx_paths):
+            return None
+        return fingerprint(
+            node["id"],
+            node.get("files", []),
+            file_type.docx_path and file_fingerprint(file_type.docx_path),
+            [file_fingerprint(path) for path in docx_paths],
+            file_type.replacements,
+            node.get("is_table_of_contents", False),
+            node.get("page_start_col"),
+            node.get("page_end_col"),
+        )
 
-    def _process_file_type_without_reorder(
-        self,
-        child: Dict[str, Any],
-        base_directory: str,
-        root_bookmark: BookmarkItem,
-        keep_existing_bookmarks: bool,
-    ) -> None:
+    def _scan_file_type(self, file_type: FileTypeNode) -> List[ScannedFile]:
         """
-        Processes a FileType without reordering pages, adding metadata for the PDF.
+        Scan stage: opens the PDFs of a FileType, reorders them if required and
+        evaluates its bookmark rules. Nothing here touches the bookmark store or the
+        page count, which belong to pass one.
 
-        :param child: The child element representing a FileType.
-        :param base_directory: The base directory for resolving paths.
-        :param root_bookmark: The parent bookmark for the current section.
-        :param keep_existing_bookmarks: Whether to keep existing bookmarks.
+        :return: One ScannedFile per file, or a single one for a reordered FileType.
         """
+        child = file_type.data
         if not child["files"]:
-            return  # Skip if there are no files
+            return []  # Skip if there are no files
 
-        file_type_bookmark = self._create_bookmark_if_needed(child, root_bookmark)
-        directory_source = os.path.normpath(
-            os.path.join(base_directory, child["directory_source"])
-        )
-        file_type_data = {
-            "type": "FileType",
-            "id": child["id"],
-            "directory_source": directory_source,
-            "page_start": self.current_page,
-        }
-        self.writer_data.append(file_type_data)
+        if child.get("reorder_pages_metals") or child.get("reorder_pages_datetime"):
+            if child.get("keep_existing_bookmarks", False):
+                raise ValueError(
+                    "keep_existing_bookmarks is not supported for reordering"
+                )
+            rules = self.text_plans[child["id"]].rules
+            # The reorder step reads the text of every page and evaluates the rules
+            match_page = page_rule_matcher(rules) if rules else None
+            page_matches = []
+            key = None
+            if self.checkpoint is not None:
+                key = fingerprint(
+                    bool(child.get("reorder_pages_metals")),
+                    child["files"],
+                    [
+                        file_fingerprint(
+                            os.path.join(file_type.directory_source, file["file_path"])
+                        )
+                        for file in child["files"]
+                    ],
+                    rules,
+                )
+                saved = self.checkpoint.load(UNIT_REORDERED, key)
+                if saved is not None:
+                    scanned = ScannedFile(None, saved["path"])
+                    scanned.pdf = self.memory.open_pdf(
+                        saved["pdf_path"], STAGE_REORDERED
+                    )
+                    self._restore_scan(scanned, saved)
+                    return [scanned]
+            if child.get("reorder_pages_metals"):
+                scanned = self._scan_reordered_metals(
+                    file_type, match_page, page_matches
+                )
+            else:
+                scanned = self._scan_reordered_datetime(
+                    file_type, match_page, page_matches
+                )
+            if key is not None:
+                self._save_reordered(key, scanned)
+            return [scanned]
 
+        scanned_files = []
         for file in child["files"]:
             if not file.get("bookmark_rules"):
                 file["bookmark_rules"] = child.get("bookmark_rules", [])
-            self._process_file(
-                file,
-                directory_source,
-                file_type_bookmark,
-                keep_existing_bookmarks,
+            scanned_files.append(
+                self._scan_file(
+                    file,
+                    file_type.directory_source,
+                    child.get("keep_existing_bookmarks", False),
+                )
             )
+        return scanned_files
 
-    def _process_file_type_with_reorder_metals(
-        self,
-        child: Dict[str, Any],
-        base_directory: str,
-        root_bookmark: BookmarkItem,
-        keep_existing_bookmarks: bool,
-    ) -> None:
+    def _scan_reordered_metals(
+        self, file_type: FileTypeNode, match_page, page_matches: List[List[str]]
+    ) -> ScannedFile:
         """
-        Processes a FileType with page reordering, using reorder_metals_form1.
-
-        :param child: The child element representing a FileType.
-        :param base_directory: The base directory for resolving paths.
-        :param root_bookmark: The parent bookmark for the current section.
-        :param keep_existing_bookmarks: Whether to keep existing bookmarks.
+        Scans a FileType with page reordering, using reorder_metals_form1.
         """
-        if not child["files"]:
-            return  # Skip if there are no files
-
-        if keep_existing_bookmarks:
-            raise ValueError("keep_existing_bookmarks is not supported for reordering")
-
-        file_type_bookmark = self._create_bookmark_if_needed(child, root_bookmark)
-        directory_source = os.path.normpath(
-            os.path.join(base_directory, child["directory_source"])
-        )
-
         # Construct full paths for each file
         files_with_full_paths = []
-        for file in child["files"]:
+        for file in file_type.data["files"]:
             file_with_full_path = file.copy()
             file_with_full_path["file_path"] = os.path.normpath(
-                os.path.join(directory_source, file["file_path"])
+                os.path.join(file_type.directory_source, file["file_path"])
             )
             files_with_full_paths.append(file_with_full_path)
 
-        pdf, num_pages = reorder_metals_form1(files_with_full_paths)
-
-        page_level_bookmarks = get_page_level_bookmarks(
-            pdf=pdf,
-            rules=child["bookmark_rules"],
-            parent_bookmark=file_type_bookmark,
-            parent_page_num=self.current_page,
+        scanned = ScannedFile(None, "None - Reordered")
+        scanned.pdf, scanned.num_pages = self._reorder(
+            reorder_metals_form1,
+            files_with_full_paths,
+            match_page=match_page,
+            page_matches=page_matches,
         )
-        self.bookmark_data.extend(page_level_bookmarks)
-
-        file_data = {
-            "type": "FileData",
-            "id": child["id"],
-            "path": "None - Reordered",
-            "num_pages": num_pages,
-            "pdf": pdf,
-            "page_start": self.current_page,
-        }
-        self.writer_data.append(file_data)
-        self.current_page += num_pages
+        if match_page is not None:
+            scanned.page_matches = page_matches
+        return scanned
 
-    def _process_file_type_with_reorder_datetime(
-        self,
-        child: Dict[str, Any],
-        base_directory: str,
-        root_bookmark: BookmarkItem,
-        keep_existing_bookmarks: bool,
-    ) -> None:
+    def _scan_reordered_datetime(
+        self, file_type: FileTypeNode, match_page, page_matches: List[List[str]]
+    ) -> ScannedFile:
         """
-        Processes a FileType with page reordering, using reorder_pdfs_by_datetime.
-
-        :param child: The child element representing a FileType.
-        :param base_directory: The base directory for resolving paths.
-        :param root_bookmark: The parent bookmark for the current section.
-        :param keep_existing_bookmarks: Whether to keep existing bookmarks.
+        Scans a FileType with page reordering, using reorder_pdfs_by_datetime. The
+        bookmarks of the source PDFs are carried over.
         """
-        if not child["files"]:
-            return  # Skip if there are no files
-
-        if keep_existing_bookmarks:
-            raise ValueError("keep_existing_bookmarks is not supported for reordering")
-
-        file_type_bookmark = self._create_bookmark_if_needed(child, root_bookmark)
-        directory_source = os.path.normpath(
-            os.path.join(base_directory, child["directory_source"])
-        )
         file_paths = [
-            os.path.join(directory_source, file["file_path"]) for file in child["files"]
+            os.path.join(file_type.directory_source, file["file_path"])
+            for file in file_type.data["files"]
         ]
-        pdf, num_pages = reorder_pdfs_by_datetime(file_paths)
-
-        page_level_bookmarks = get_page_level_bookmarks(
-            pdf=pdf,
-            rules=child["bookmark_rules"],
-            parent_bookmark=file_type_bookmark,
-            parent_page_num=self.current_page,
+        scanned = ScannedFile(None, "None - Reordered by datetime")
+        scanned.pdf, scanned.num_pages = self._reorder(
+            reorder_pdfs_by_datetime,
+            file_paths,
+            match_page=match_page,
+            page_matches=page_matches,
         )
-        self.bookmark_data.extend(page_level_bookmarks)
+        if match_page is not None:
+            scanned.page_matches = page_matches
+        scanned.outline, scanned.outline_error = read_outline(scanned.pdf)
+        return scanned
 
-        # Extract existing bookmarks from the PDF
-        existing_bookmarks = self._extract_existing_bookmarks(pdf, file_type_bookmark)
-        self.bookmark_data.extend(existing_bookmarks)
+    def _reorder(self, reorder, *args, **kwargs) -> Tuple[PdfReader, int]:
+        """
+        Runs a reorder function with its source PDFs opened by the memory governor,
+        and accounts for the combined PDF it returns. The sources are released as soon
+        as it is done.
+        """
+        sources = []
 
-        file_data = {
-            "type": "FileData",
-            "id": child["id"],
-            "path": "None - Reordered by datetime",
-            "num_pages": num_pages,
-            "pdf": pdf,
-            "page_start": self.current_page,
-        }
-        self.writer_data.append(file_data)
-        self.current_page += num_pages
+        def open_pdf(path: str) -> PdfReader:
+            sources.append(self.memory.open_pdf(path, STAGE_REORDERING))
+            return sources[-1]
 
-    def _process_file(
-        self,
-        file: Dict[str, Any],
-        directory_source: str,
-        parent_bookmark: BookmarkItem,
-        keep_existing_bookmarks: bool,
-    ) -> None:
+        try:
+            pdf, num_pages = reorder(*args, open_pdf=open_pdf, **kwargs)
+        finally:
+            for source in sources:
+                self.memory.release(source)
+        return self.memory.adopt(pdf, STAGE_REORDERED), num_pages
+
+    def _scan_file(
+        self, file: Dict[str, Any], directory_source: str, keep_existing_bookmarks: bool
+    ) -> ScannedFile:
         """
-        Processes an individual file within a FileType, adding its data to the writer.
+        Scans an individual file within a FileType.
 
         :param file: The file element to process.
         :param directory_source: The base directory for resolving the file path.
-        :param parent_bookmark: The parent bookmark for the file.
+        :param keep_existing_bookmarks: Whether to read the file's own outline.
         """
         file_path = os.path.normpath(os.path.join(directory_source, file["file_path"]))
-        file_bookmark = self._create_bookmark_if_needed(file, parent_bookmark)
+        scanned = ScannedFile(file, file_path)
 
         # Check if it's a DOCX file and convert to PDF first
+        if file.get("is_table_of_contents") and file_path.lower().endswith(".docx"):
+            # Planned from its estimated page count, it is only rendered once every
+            # bookmark is known
+            scanned.num_pages = file["num_pages"]
+            return scanned
         if file_path.lower().endswith(".docx"):
+            # A DOCX the conversion stage gave up on is not converted again
+            failure = self.watchdog.failure(file_path)
+            if failure is not None:
+                scanned.problems.append(failure)
+                return scanned
             try:
-                pdf, num_pages, _, modified_docx = convert_docx_template_to_pdf(
+                pdf, num_pages, created_pdf_path, _ = convert_docx_template_to_pdf(
                     docx_path=file_path,
                     replacements=self._map_template_variables(
                         file.get("variables", [])
                     ),
                     is_table_of_contents=file.get("is_table_of_contents", False),
-                    bookmark_data=self.bookmark_data,
+                    scratch_dir=self.scratch_dir,
+                    watchdog=self.watchdog,
                 )
+                self._track_intermediate(created_pdf_path)
+                pdf = self.memory.adopt(pdf, STAGE_READERS, created_pdf_path)
+            except WorkspaceQuotaExceeded:
+                raise
             except Exception as e:
                 print(f"Error converting DOCX to PDF: {str(e)}")
                 # Add to problematic files
-                self.problematic_files.append(
-                    {
+                scanned.problems.append(
+                    self.watchdog.failure(file_path)
+                    or {
                         "path": file_path,
                         "error": f"Failed to convert DOCX to PDF: {str(e)}",
                     }
                 )
-                return  # Skip this file
+                return scanned  # Skip this file
         else:
             pdf, num_pages = self._get_pdf_and_page_count(file_path)
+        scanned.pdf, scanned.num_pages = pdf, num_pages
+
+        # Files without bookmark rules never have their text extracted. Files the
+        # conversion stage added after planning are planned here.
+        text_plan = self.text_plans.get(file["id"])
+        if text_plan is None:
+            text_plan = file_text_plan(file, {})
+            self.text_plans[file["id"]] = text_plan
+
+        # Only PDFs whose outline or text is read are worth a checkpoint
+        key = None
+        if self.checkpoint is not None and (
+            keep_existing_bookmarks or text_plan.evaluates_rules
+        ):
+            key = fingerprint(
+                file_fingerprint(file_path), text_plan.rules, keep_existing_bookmarks
+            )
+            saved = self.checkpoint.load(UNIT_SCAN, key)
+            if saved is not None:
+                self._restore_scan(scanned, saved)
+                return scanned
 
-        # Extract existing bookmarks from the PDF
         if keep_existing_bookmarks:
-            existing_bookmarks = self._extract_existing_bookmarks(
-                pdf, file_bookmark, file_path
-            )
-            # Add existing bookmarks to the bookmark data
-            self.bookmark_data.extend(existing_bookmarks)
-
-        page_level_bookmarks = get_page_level_bookmarks(
-            pdf=pdf,
-            rules=file.get("bookmark_rules", []),
-            parent_bookmark=file_bookmark,
-            parent_page_num=self.current_page,
+            scanned.outline, scanned.outline_error = read_outline(pdf)
+        if text_plan.evaluates_rules:
+            scanned.page_matches = [
+                titles for _, titles in iter_page_matches(pdf, text_plan.rules)
+            ]
+        if key is not None:
+            self.checkpoint.save(UNIT_SCAN, key, self._scan_result(scanned))
+        return scanned
+
+    def _scan_result(self, scanned: ScannedFile) -> Dict[str, Any]:
+        """What a checkpoint keeps of a scanned PDF, apart from the PDF itself."""
+        return {
+            "path": scanned.path,
+            "num_pages": scanned.num_pages,
+            "page_matches": scanned.page_matches,
+            "outline": scanned.outline,
+            "outline_error": scanned.outline_error,
+        }
+
+    def _restore_scan(self, scanned: ScannedFile, saved: Dict[str, Any]) -> None:
+        scanned.num_pages = saved["num_pages"]
+        scanned.page_matches = saved["page_matches"]
+        if saved["outline"] is not None:
+            scanned.outline = [tuple(item) for item in saved["outline"]]
+        scanned.outline_error = saved["outline_error"]
+
+    def _save_reordered(self, key: str, scanned: ScannedFile) -> None:
+        """Checkpoints the combined PDF of a reordered FileType and its scan results."""
+        pdf_path = os.path.join(
+            self.checkpoint.subdir(UNIT_REORDERED, key), "reordered.pdf"
         )
-        self.bookmark_data.extend(page_level_bookmarks)
+        stream = scanned.pdf.stream
+        stream.seek(0)
+        with open(pdf_path, "wb") as f:
+            shutil.copyfileobj(stream, f)
+        result = self._scan_result(scanned)
+        result["pdf_path"] = pdf_path
+        self.checkpoint.save(UNIT_REORDERED, key, result, [pdf_path])
+
+    def _process_file_type(
+        self,
+        file_type: FileTypeNode,
+        root_bookmark: Optional[int],
+        scanned_files: List[ScannedFile],
+    ) -> None:
+        """
+        Plans a scanned FileType, optionally with its pages reordered.
+
+        :param file_type: The compiled FileType.
+        :param root_bookmark: The parent bookmark for the current section.
+        :param scanned_files: What the scan stage made of its files.
+        """
+        child = file_type.data
+        if not child["files"]:
+            return  # Skip if there are no files
+        self._file_types_with_files += 1
+
+        if child.get("reorder_pages_metals") or child.get("reorder_pages_datetime"):
+            self._process_reordered_file_type(
+                child, root_bookmark, scanned_files[0]
+            )
+            return
+
+        file_type_bookmark = self._create_bookmark_if_needed(child, root_bookmark)
+        file_type_data = {
+            "type": "FileType",
+            "id": child["id"],
+            "directory_source": file_type.directory_source,
+            "page_start": self.current_page,
+        }
+        self.writer_data.append(file_type_data)
+
+        for scanned in scanned_files:
+            self._process_file(file_type, scanned, file_type_bookmark)
+
+    def _process_reordered_file_type(
+        self,
+        child: Dict[str, Any],
+        root_bookmark: Optional[int],
+        scanned: ScannedFile,
+    ) -> None:
+        """
+        Plans the combined PDF of a FileType whose pages were reordered.
+
+        :param child: The child element representing a FileType.
+        :param root_bookmark: The parent bookmark for the current section.
+        :param scanned: The reordered PDF.
+        """
+        file_type_bookmark = self._create_bookmark_if_needed(child, root_bookmark)
+
+        if scanned.page_matches is not None:
+            get_page_level_bookmarks(
+                pdf=scanned.pdf,
+                rules=child["bookmark_rules"],
+                bookmark_store=self.bookmark_data,
+                parent_bookmark=file_type_bookmark,
+                parent_page_num=self.current_page,
+                page_matches=scanned.page_matches,
+            )
+
+        # Bookmarks carried over from the source PDFs
+        if scanned.outline is not None:
+            self._extract_existing_bookmarks(scanned, file_type_bookmark)
+
+        file_data = {
+            "type": "FileData",
+            "id": child["id"],
+            "path": scanned.path,
+            "num_pages": scanned.num_pages,
+            "pdf": scanned.pdf,
+            "page_start": self.current_page,
+        }
+        self._add_file_data(file_data)
+
+    def _process_file(
+        self,
+        file_type: FileTypeNode,
+        scanned: ScannedFile,
+        parent_bookmark: Optional[int],
+    ) -> None:
+        """
+        Plans an individual scanned file within a FileType and hands it to the composer.
+
+        :param file_type: The FileType the file belongs to.
+        :param scanned: The scanned file.
+        :param parent_bookmark: The parent bookmark for the file.
+        """
+        file = scanned.file
+        file_bookmark = self._create_bookmark_if_needed(file, parent_bookmark)
+        self.problematic_files.extend(scanned.problems)
+        if scanned.pdf is None and not scanned.num_pages:
+            return  # Skip this file
+
+        # Extract existing bookmarks from the PDF
+        if scanned.outline is not None:
+            self._extract_existing_bookmarks(scanned, file_bookmark, scanned.path)
+
+        if scanned.page_matches is not None:
+            get_page_level_bookmarks(
+                pdf=scanned.pdf,
+                rules=file["bookmark_rules"],
+                bookmark_store=self.bookmark_data,
+                parent_bookmark=file_bookmark,
+                parent_page_num=self.current_page,
+                page_matches=scanned.page_matches,
+            )
 
         file_data = {
             "type": "FileData",
             "id": file["id"],
-            "path": file_path,
-            "num_pages": num_pages,
-            "pdf": pdf,
+            "path": scanned.path,
+            "num_pages": scanned.num_pages,
+            "pdf": scanned.pdf,
             "page_start": self.current_page,
         }
+        if (
+            file.get("is_table_of_contents")
+            and self._table_of_contents is None
+            and scanned.num_pages > 0
+            and file_type.docx_path
+        ):
+            # Rendered again once every bookmark is known, until then only its
+            # page count is used
+            file_data["is_table_of_contents"] = True
+            self._table_of_contents = {
+                "file_type": file_type,
+                "placeholder": file_data,
+            }
+        self._add_file_data(file_data)
+
+    def _add_file_data(self, file_data: Dict[str, Any]) -> None:
+        """Hands a planned file to the composer and moves past its pages."""
+        file_data["part"] = self._part
         self.writer_data.append(file_data)
-        self.current_page += num_pages
+        self._pipeline.compose(file_data)
+        self.current_page += file_data["num_pages"]
 
     def _process_section(
-        self, child: Dict[str, Any], base_directory: str, root_bookmark: BookmarkItem
+        self, child: SectionNode, root_bookmark: Optional[int]
     ) -> None:
         """
         Processes a Section child, building PDF data recursively.
 
-        :param child: The child element representing a Section.
-        :param base_directory: The base directory for resolving paths.
+        :param child: The compiled child element representing a Section.
         :param root_bookmark: The parent bookmark for the current section.
         """
         section_data = {
             "type": "Section",
-            "id": child["id"],
+            "id": child.data["id"],
             "page_start": self.current_page,
         }
         self.writer_data.append(section_data)
-        self._build_pdf_data(child, base_directory, root_bookmark)
+        self._build_pdf_data(child, root_bookmark)
 
     def _get_pdf_and_page_count(self, file_path: str) -> Tuple[PdfReader, int]:
         """
-        Reads a PDF file and returns the PdfReader object and the number of pages.
+        Reads a PDF file and returns the PdfReader object and the number of pages. The
+        file is only loaded into memory whole while the build is under its budget.
 
         :param file_path: Path to the PDF file.
         :return: Tuple containing PdfReader object and number of pages.
         """
-        pdf = PdfReader(file_path)
+        pdf = self.memory.open_pdf(file_path)
         return pdf, len(pdf.pages)
 
     def _map_template_variables(
@@ -431,73 +766,46 @@ class PDFBuilder:
         """
         return {var["template_text"]: var["constant_value"] for var in variables}
 
-    def _get_normalized_base_directory(
-        self, base_directory: str, section: Dict[str, Any]
-    ) -> str:
-        """
-        Normalizes the base directory path.
-
-        :param base_directory: The base directory for resolving paths.
-        :param section: The section containing a base_directory key.
-        :return: Normalized base directory path.
-        """
-        return os.path.normpath(os.path.join(base_directory, section["base_directory"]))
-
-    def _directory_exists(self, base_directory: str, section: Dict[str, Any]) -> bool:
+    def _directory_exists(self, section: SectionNode) -> bool:
         """
-        Checks if a directory exists.
+        Checks if a section's directory exists, reusing the result of validation if available.
 
-        :param base_directory: The directory to check.
-        :param section: The section being processed.
+        :param section: The compiled section being processed.
         :return: True if the directory exists, False otherwise.
         """
-        if not os.path.exists(base_directory):
+        exists = section.exists
+        if exists is None:
+            exists = os.path.exists(section.directory)
+        if not exists:
             print(
-                f"Directory {base_directory} does not exist. Skipping section {section.get('id', '')}"
+                f"Directory {section.directory} does not exist. Skipping section {section.data.get('id', '')}"
             )
             return False
         return True
 
     def _create_root_bookmark_if_needed(
-        self, section: Dict[str, Any], root_bookmark: BookmarkItem = None
-    ) -> BookmarkItem:
+        self, section_node: SectionNode, root_bookmark: Optional[int] = None
+    ) -> Optional[int]:
         """
         Creates a root bookmark if the section has a bookmark_name and contains files.
 
-        :param section: The section to create a bookmark for.
+        :param section_node: The compiled section to create a bookmark for.
         :param root_bookmark: The parent bookmark, if any.
         :return: The newly created or existing root bookmark.
         """
-        if section.get("bookmark_name") and self._section_has_files(section):
-            new_bookmark = BookmarkItem(
-                title=section["bookmark_name"],
-                page=self.current_page,
+        section = section_node.data
+        if section.get("bookmark_name") and section_node.has_files:
+            return self.bookmark_data.add(
+                section["bookmark_name"],
+                self.current_page,
                 parent=root_bookmark,
                 id=section["id"] if section.get("id") else "root",
             )
-            self.bookmark_data.append(new_bookmark)
-            return new_bookmark
         return root_bookmark
 
-    def _section_has_files(self, section: Dict[str, Any]) -> bool:
-        """
-        Checks if a section contains files to process.
-
-        :param section: The section to check.
-        :return: True if the section contains files, False otherwise.
-        """
-        for child in section["children"]:
-            if child["type"] == "docxTemplate" and child["exists"]:
-                return True
-            if child["type"] == "FileType" and len(child["files"]) > 0:
-                return True
-            if child["type"] == "Section" and self._section_has_files(child):
-                return True
-        return False
-
     def _create_bookmark_if_needed(
-        self, item: Dict[str, Any], root_bookmark: BookmarkItem
-    ) -> BookmarkItem:
+        self, item: Dict[str, Any], root_bookmark: Optional[int]
+    ) -> Optional[int]:
         """
         Creates a bookmark if the item has a bookmark_name.
 
@@ -506,293 +814,207 @@ class PDFBuilder:
         :return: The newly created or existing root bookmark.
         """
         if item["bookmark_name"]:
-            bookmark = BookmarkItem(
-                title=item["bookmark_name"],
-                page=self.current_page,
+            return self.bookmark_data.add(
+                item["bookmark_name"],
+                self.current_page,
                 parent=root_bookmark,
                 id=item["id"],
             )
-            self.bookmark_data.append(bookmark)
-            return bookmark
         return root_bookmark
 
+    def _compose_file_data(self, data: Dict[str, Any]) -> None:
+        """
+        Composition stage: copies the pages of one planned file into the output, or
+        adds them to their part when parts are composed by worker processes. The
+        table of contents only marks where its pages go.
+        """
+        if data.get("is_table_of_contents"):
+            self._table_of_contents_index = (
+                len(self.composer.writer.pages)
+                if self._parts is None
+                else self._parts.num_pages
+            )
+        elif data["pdf"] and self._parts is not None:
+            self._parts.add(data["part"], data["pdf"], data["path"], data["num_pages"])
+            self.memory.release(data["pdf"])
+        elif data["pdf"]:  # Ensure pdf reader exists
+            self.composer.add_pages(data["pdf"])
+            self.memory.release(data["pdf"])
+        else:
+            print(
+                f"Warning: Skipping append for {data['path']} as PDF reader is missing."
+            )
+            if not any(p["path"] == data["path"] for p in self.problematic_files):
+                self._compose_problems.append(
+                    {
+                        "path": data["path"],
+                        "error": "PDF object missing for file during composition phase.",
+                    }
+                )
+
     def _compose_pdf(self) -> PdfWriter:
         """
-        Composes the final PDF using the writer data and bookmark data.
+        Finishes the composed PDF once the pipeline is done. Parts rendered by worker
+        processes are stitched together in order, then the table of contents is
+        rendered with the final bookmarks into the pages reserved for it.
 
         :return: PdfWriter object containing the composed PDF.
         """
-        writer = PdfWriter()
-        for data in self.writer_data:
-            if data["type"] == "docxTemplate":
-                pdf, num_pages, created_pdf_path, modified_docx = (
-                    convert_docx_template_to_pdf(
-                        data["path"],
-                        replacements=data["replacements"],
-                        page_start_col=data.get("page_start_col"),
-                        page_end_col=data.get("page_end_col"),
-                        is_table_of_contents=data.get("is_table_of_contents", False),
-                        bookmark_data=self.bookmark_data,
-                        page_number_offset=self.page_number_offset,
-                    )
+        deduplicated_objects = 0
+        if self._parts is not None:
+            print("Stitching parts...")
+            self._parts.stitch(self.composer)
+            deduplicated_objects += self._parts.deduplicated_objects
+        if self._table_of_contents is not None:
+            self._backfill_table_of_contents()
+        deduplicated_objects += self.composer.deduplicated_objects
+        if deduplicated_objects:
+            print(f"Reused {deduplicated_objects} shared resources across files.")
+        return self.composer.writer
+
+    def _backfill_table_of_contents(self) -> None:
+        """
+        Renders the table of contents with every bookmark and inserts it where pass
+        one reserved its placeholder pages. If it turns out longer or shorter than the
+        placeholder, the bookmarks after it are moved and it is rendered once more.
+        """
+        file_type = self._table_of_contents["file_type"]
+        placeholder = self._table_of_contents["placeholder"]
+        node = file_type.data
+
+        def render():
+            pdf, num_pages, created_pdf_path, modified_docx = (
+                convert_docx_template_to_pdf(
+                    file_type.docx_path,
+                    replacements=file_type.replacements,
+                    page_start_col=node.get("page_start_col"),
+                    page_end_col=node.get("page_end_col"),
+                    is_table_of_contents=True,
+                    bookmark_data=self.bookmark_data,
+                    page_number_offset=node.get("page_number_offset", 0),
+                    scratch_dir=self.scratch_dir,
+                    watchdog=self.watchdog,
                 )
-                if data.get("is_table_of_contents"):
-                    self._shift_bookmarks(num_pages - data["num_pages"])
-
-                    pdf, num_pages, toc_pdf_path, _ = convert_docx_template_to_pdf(
-                        data["path"],
-                        is_table_of_contents=True,
-                        bookmark_data=self.bookmark_data,
-                    )
-                    if toc_pdf_path and os.path.exists(toc_pdf_path):
-                        self.temporary_pdfs_created.append(toc_pdf_path)
-
-                    self.table_of_contents_docx = modified_docx
-                elif created_pdf_path and os.path.exists(
-                    created_pdf_path
-                ):  # Check if a PDF was created
-                    self.temporary_pdfs_created.append(created_pdf_path)  # Track it
-
-                if pdf:  # Ensure pdf reader is valid before appending
-                    writer.append(pdf, import_outline=False)
-                else:
-                    print(
-                        f"Warning: Skipping append for {data['path']} due to conversion issue."
-                    )
-                    self.problematic_files.append(
-                        {
-                            "path": data["path"],
-                            "error": "Failed to convert DOCX template during composition phase.",
-                        }
-                    )
-
-            if data["type"] == "FileData":
-                # Check if the file path points to a DOCX file that might have been converted earlier
-                # (The conversion in _process_file might create a PDF)
-                file_path = data["path"]
-                if file_path.lower().endswith(".docx"):
-                    potential_pdf_path = os.path.splitext(file_path)[0] + ".pdf"
-                    if (
-                        potential_pdf_path not in self.temporary_pdfs_created
-                        and os.path.exists(potential_pdf_path)
-                    ):
-                        # This PDF was likely created during _process_file
-                        # We should ensure it gets cleaned up if it wasn't added elsewhere
-                        # Let's add it to the main list in api.py via problematic_files for now
-                        # A cleaner way might involve passing the initial temp list here
-                        # but this avoids changing the method signature significantly.
-                        print(
-                            f"Tracking potential temporary PDF for cleanup: {potential_pdf_path}"
-                        )
-                        self.temporary_pdfs_created.append(potential_pdf_path)
+            )
+            self._track_intermediate(created_pdf_path)
+            return pdf, num_pages, modified_docx
+
+        pdf, num_pages, modified_docx = render()
+        if pdf and num_pages != placeholder["num_pages"]:
+            self._shift_bookmarks(
+                num_pages - placeholder["num_pages"],
+                from_page=placeholder["page_start"] + placeholder["num_pages"],
+            )
+            self.current_page += num_pages - placeholder["num_pages"]
+            pdf, num_pages, modified_docx = render()
+        self.table_of_contents_docx = modified_docx
 
-                if data["pdf"]:  # Ensure pdf reader exists
-                    writer.append(data["pdf"], import_outline=False)
-                else:
-                    print(
-                        f"Warning: Skipping append for {data['path']} as PDF reader is missing."
-                    )
-                    if not any(
-                        p["path"] == data["path"] for p in self.problematic_files
-                    ):
-                        self.problematic_files.append(
-                            {
-                                "path": data["path"],
-                                "error": "PDF object missing for file during composition phase.",
-                            }
-                        )
+        if not pdf:
+            fallback = "without page numbers" if placeholder["pdf"] else "as blank pages"
+            print(
+                f"Warning: Using the table of contents {fallback} for "
+                f"{file_type.docx_path} due to conversion issue."
+            )
+            self.problematic_files.append(
+                {
+                    "path": file_type.docx_path,
+                    "error": "Failed to convert DOCX template during composition phase.",
+                }
+            )
+            # A table of contents planned from its estimate was never converted, so
+            # blank pages keep its place
+            pdf = placeholder["pdf"] or blank_pdf(placeholder["num_pages"])
+        self.composer.add_pages(pdf, index=self._table_of_contents_index)
 
-        return writer
+    def _track_intermediate(self, path: str) -> None:
+        """
+        Accounts for an intermediate file written into the build workspace.
+        """
+        if path:
+            self.workspace.track(path)
 
-    def _shift_bookmarks(self, num_pages: int) -> None:
+    def _shift_bookmarks(self, num_pages: int, from_page: int = None) -> None:
         """
         Shifts the page numbers of bookmarks by the specified number of pages.
         """
-        for bookmark in self.bookmark_data:
-            if not bookmark.is_table_of_contents:
-                bookmark.page += num_pages
-                if bookmark.page_end is not None:
-                    bookmark.page_end += num_pages
+        self.bookmark_data.shift_pages(num_pages, from_page=from_page)
 
     def _add_bookmarks(self, writer: PdfWriter) -> None:
         """
-        Adds bookmarks to the PDF writer hierarchically using direct parent references.
+        Adds bookmarks to the PDF writer hierarchically, building the whole outline tree in one pass.
 
         :param writer: The PdfWriter object where the bookmarks will be added.
         """
-        # Maps BookmarkItem IDs (UUID strings) to their corresponding PyPDF2 outline item reference
-        outline_elements = {}
-
-        # Recursive function to add a bookmark and its descendants
-        def add_bookmark_recursive(bookmark_item):
-            # Use the bookmark's unique ID as the key
-            bookmark_id = bookmark_item.id
-
-            # Base case: If already processed, return its outline element
-            if bookmark_id in outline_elements:
-                return outline_elements[bookmark_id]
-
-            # Ensure parent is processed first to get its outline element
-            parent_outline_element = None
-            if bookmark_item.parent:
-                # Recursively process the parent
-                # This ensures the parent exists in outline_elements before the child is added
-                parent_outline_element = add_bookmark_recursive(bookmark_item.parent)
-
-            # Add the current bookmark to the writer
-            current_outline_element = writer.add_outline_item(
-                bookmark_item.title,
-                bookmark_item.page - 1,  # PyPDF2 is 0-indexed
-                parent_outline_element,  # This is the object returned by the parent's add_outline_item call
-            )
-
-            # Store the created outline element using the bookmark ID as the key
-            outline_elements[bookmark_id] = current_outline_element
-            # Optionally store on the item itself if needed elsewhere
-            bookmark_item.outline_element = current_outline_element
-
-            return current_outline_element
-
-        # Iterate through all bookmarks in the flat list
-        # The recursive function will handle the hierarchy
-        for bookmark in self.bookmark_data:
-            # If a bookmark hasn't been processed yet (identified by its ID)
-            # start the recursive process from it.
-            if bookmark.id not in outline_elements:
-                add_bookmark_recursive(bookmark)
+        add_outline(writer, self.bookmark_data)
 
     def _add_page_end_to_bookmarks(self) -> None:
         """
         Adds the end page number to each bookmark.
+
+        A bookmark ends on the page before the next bookmark at the same or a higher
+        level, or on the last page of the document.
         """
         total_pages = (
             self.current_page - 1
         )  # Assuming current_page is the next page after the last
 
-        # Precompute levels for each bookmark
-        bookmark_levels = []
-        for bookmark in self.bookmark_data:
-            level = 0
-            parent = bookmark.parent
-            while parent is not None:
-                level += 1
-                parent = parent.parent
-            bookmark_levels.append(level)
-
-        # Compute page_end for each bookmark
-        for i in range(len(self.bookmark_data)):
-            level_i = bookmark_levels[i]
-            page_end = total_pages  # Default to the end of the document
-            for j in range(i + 1, len(self.bookmark_data)):
-                level_j = bookmark_levels[j]
-                if level_j <= level_i:
-                    page_end = self.bookmark_data[j].page - 1
-                    break
-            self.bookmark_data[i].page_end = page_end
+        bookmarks = self.bookmark_data
+        levels = bookmarks.levels()
+        # Bookmarks still waiting for their end page, with increasing levels
+        open_bookmarks = []
+        for index in range(len(bookmarks)):
+            while open_bookmarks and levels[open_bookmarks[-1]] >= levels[index]:
+                bookmarks.page_ends[open_bookmarks.pop()] = bookmarks.pages[index] - 1
+            open_bookmarks.append(index)
+        for index in open_bookmarks:
+            bookmarks.page_ends[index] = total_pages
 
     def _extract_existing_bookmarks(
-        self, pdf: PdfReader, parent_bookmark: BookmarkItem, file_path: str = None
-    ) -> List[BookmarkItem]:
+        self,
+        scanned: ScannedFile,
+        parent_bookmark: Optional[int],
+        file_path: str = None,
+    ) -> List[int]:
         """
-        Extracts existing bookmarks from a PDF and returns them as a list of BookmarkItems.
-        Handles malformed bookmarks gracefully and tracks problematic files.
+        Adds the existing bookmarks read from a PDF by the scan stage to the bookmark
+        store. Handles malformed bookmarks gracefully and tracks problematic files.
 
-        :param pdf: The PdfReader object of the PDF.
+        :param scanned: The scanned PDF, with its outline read.
         :param parent_bookmark: The parent bookmark for these bookmarks.
         :param file_path: The path to the PDF file being processed.
-        :return: List of BookmarkItems representing the existing bookmarks.
+        :return: Indices of the added bookmarks.
         """
         existing_bookmarks = []
         problematic_count = 0
 
         # If file_path is not provided, try to get it from the pdf stream
+        pdf = scanned.pdf
         if file_path is None and hasattr(pdf, "stream") and hasattr(pdf.stream, "name"):
             file_path = pdf.stream.name
         else:
             file_path = file_path or "Unknown PDF"
 
-        def process_outline_item(outline_item, parent_bookmark):
-            nonlocal problematic_count
-            try:
-                if isinstance(outline_item, Destination):
-                    # Extract page number
-                    if not hasattr(outline_item, "page") or outline_item.page is None:
-                        problematic_count += 1
-                        return None
-
-                    page_number = (
-                        pdf.get_page_number(outline_item.page)
-                        if isinstance(outline_item.page, IndirectObject)
-                        else outline_item.page
-                    )
-
-                    if page_number is None or page_number < 0:
-                        problematic_count += 1
-                        return None
-
-                    # Create bookmark
-                    bookmark = BookmarkItem(
-                        title=(
-                            outline_item.title
-                            if hasattr(outline_item, "title")
-                            else "Untitled Bookmark"
-                        ),
-                        page=page_number + self.current_page,  # Adjust page number
-                        parent=parent_bookmark,
-                        id=str(uuid.uuid4()),
-                        include_in_table_of_contents=False,
-                    )
-                    existing_bookmarks.append(bookmark)
-                    return bookmark
-                else:
-                    problematic_count += 1
-                    return None
-            except Exception as e:
+        # Parent of the items at each depth. Children of an item that couldn't be
+        # added go under that item's parent instead.
+        parents = [parent_bookmark]
+        for depth, title, page_number in scanned.outline:
+            del parents[depth + 1 :]
+            bookmark = None
+            if page_number >= 0:
+                bookmark = self.bookmark_data.add(
+                    title,
+                    page_number + self.current_page,  # Adjust page number
+                    parent=parents[depth],
+                    include_in_table_of_contents=False,
+                )
+                existing_bookmarks.append(bookmark)
+            else:
                 problematic_count += 1
-                print(f"Error processing bookmark: {str(e)}")
-                return None
-
-        def process_outline(outline, parent_bookmark):
-            nonlocal problematic_count
-            current_parent = parent_bookmark
-
-            i = 0
-            while i < len(outline):
-                item = outline[i]
-
-                if isinstance(item, Destination):
-                    # Process a bookmark destination
-                    current_bookmark = process_outline_item(item, current_parent)
-
-                    # Check if the next item is a nested list (children)
-                    if i + 1 < len(outline) and isinstance(outline[i + 1], list):
-                        # Process children with this bookmark as their parent
-                        if current_bookmark:
-                            process_outline(outline[i + 1], current_bookmark)
-                        else:
-                            # If current bookmark failed to process, use the same parent
-                            process_outline(outline[i + 1], current_parent)
-                        i += 2  # Skip the nested list
-                    else:
-                        i += 1  # Move to next item
-                elif isinstance(item, list):
-                    # Process a nested list with the same parent
-                    process_outline(item, current_parent)
-                    i += 1
-                else:
-                    # Skip unknown item types
-                    problematic_count += 1
-                    i += 1
-
-        try:
-            if hasattr(pdf, "outline") and pdf.outline:
-                if isinstance(pdf.outline, list):
-                    process_outline(pdf.outline, parent_bookmark)
-                else:
-                    # Handle non-list outline (could be a single Destination)
-                    process_outline_item(pdf.outline, parent_bookmark)
-        except Exception as e:
-            print(f"Error processing PDF outline in {file_path}: {str(e)}")
+            parents.append(parents[depth] if bookmark is None else bookmark)
+        if scanned.outline_error is not None:
+            print(
+                f"Error processing PDF outline in {file_path}: {scanned.outline_error}"
+            )
             problematic_count += 1
 
         if problematic_count > 0:
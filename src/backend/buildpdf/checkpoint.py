@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+import uuid
+from typing import IO, Any, Dict, Iterable, List, Optional
+
+IS_WINDOWS = platform.system() == "Windows"
+if IS_WINDOWS:
+    import msvcrt
+else:
+    import fcntl
+
+from buildpdf.workspace import CHECKPOINT_PREFIX, get_scratch_root
+from utils.report_io import read_json, write_json
+
+# Whether builds persist checkpoints a later build with resume can pick up from.
+# A build with resume always does.
+CHECKPOINTS_ENV = "PDFBUILDER_CHECKPOINTS"
+# Held by the build using a checkpoint directory, released when its process exits
+LOCK_FILENAME = ".lock"
+
+# Kinds of units a build checkpoints
+UNIT_CONVERSION = "conversion"  # The DOCX files of a FileType converted to PDFs
+UNIT_SCAN = "scan"  # The page count, rule matches and outline of a PDF
+UNIT_REORDERED = "reordered"  # The combined PDF of a reordered FileType
+UNIT_PART = "part"  # A part composed by a part worker
+
+
+def get_checkpoints_enabled() -> bool:
+    return os.environ.get(CHECKPOINTS_ENV, "0") == "1"
+
+
+def file_fingerprint(path: str) -> Optional[List[Any]]:
+    """The path, size and modification time of a file, None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.normcase(os.path.abspath(path)), stat.st_size, stat.st_mtime_ns]
+
+
+def fingerprint(*inputs: Any) -> str:
+    """A digest of JSON-serializable inputs, used as the key of a unit."""
+    encoded = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def _try_lock(path: str) -> Optional[IO[bytes]]:
+    """Locks a file exclusively without waiting. None if another build holds it."""
+    handle = open(path, "a+b")
+    try:
+        handle.seek(0)
+        if IS_WINDOWS:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class BuildCheckpoint:
+    """
+    Persists the results of the expensive units of a build, so a build of the same
+    report that crashed or was cancelled can resume where it stopped.
+
+    Every build checkpoints into a directory of its own under the scratch root,
+    outside the build workspace, so it outlives a failed build. The build holds a
+    lock on the directory while it runs, so builds of the same output path running
+    at the same time never share or remove each other's checkpoints. A resumed
+    build takes over the most recent directory of its output path that no running
+    build holds. Directories nobody resumed are removed with stale workspaces. Each
+    unit is stored under a fingerprint of its inputs, including the size and
+    modification time of its source files, so a unit whose sources changed is
+    simply not found and is redone. Files a unit produced are checked before they
+    are reused. A successful build removes its checkpoints.
+
+    The checkpoint is shared by the threads of a pipelined build.
+
+    Usage:
+        checkpoint = BuildCheckpoint(output_path, resume=True)
+        key = fingerprint(file_fingerprint(path), rules)
+        saved = checkpoint.load(UNIT_SCAN, key)
+        if saved is None:
+            saved = scan(path)
+            checkpoint.save(UNIT_SCAN, key, saved)
+        ...
+        checkpoint.remove()  # once the PDF is written, or close() if it failed
+    """
+
+    def __init__(self, output_path: str, resume: bool = False, root: str = None):
+        """
+        :param output_path: The path of the PDF the build writes.
+        :param resume: Whether to reuse the checkpoints of the most recent earlier
+            build of the same output path. Otherwise the build starts from scratch
+            and leaves earlier checkpoints alone.
+        :param root: Where checkpoint directories are created. Defaults to the
+            scratch root.
+        """
+        root = root or get_scratch_root()
+        output_key = fingerprint(os.path.normcase(os.path.abspath(output_path)))
+        prefix = f"{CHECKPOINT_PREFIX}{output_key[:16]}_"
+        self.resume = resume
+        self.path = None
+        self._lock_file = None
+        if resume:
+            self._take_over(root, prefix)
+        if self.path is None:
+            # Named by start time first, so the most recent build sorts last
+            self.path = os.path.join(
+                root, f"{prefix}{time.time_ns():020d}_{uuid.uuid4().hex[:8]}"
+            )
+            os.makedirs(self.path)
+            self._lock_file = _try_lock(os.path.join(self.path, LOCK_FILENAME))
+        # Units reused and saved, by kind
+        self.resumed: Dict[str, int] = {}
+        self.saved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _take_over(self, root: str, prefix: str) -> None:
+        """Locks the most recent checkpoint directory no running build holds."""
+        names = sorted(
+            (name for name in os.listdir(root) if name.startswith(prefix)),
+            reverse=True,
+        )
+        for name in names:
+            path = os.path.join(root, name)
+            if not os.path.isdir(path):
+                continue
+            lock_file = _try_lock(os.path.join(path, LOCK_FILENAME))
+            if lock_file is not None:
+                # Resumed, so it isn't cleaned up as stale
+                os.utime(path)
+                self.path, self._lock_file = path, lock_file
+                return
+
+    def subdir(self, kind: str, key: str) -> str:
+        """A directory for the files of one unit."""
+        path = os.path.join(self.path, kind, key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def load(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the saved result of a unit, or None if it was not saved by an earlier
+        build, isn't resumed, or a file it produced is missing or changed.
+        """
+        if not self.resume:
+            return None
+        try:
+            saved = read_json(self._manifest_path(kind, key))
+        except (OSError, ValueError):
+            return None
+        for path, size in saved["files"]:
+            try:
+                if os.path.getsize(path) != size:
+                    return None
+            except OSError:
+                return None
+        with self._lock:
+            self.resumed[kind] = self.resumed.get(kind, 0) + 1
+        return saved["result"]
+
+    def save(
+        self,
+        kind: str,
+        key: str,
+        result: Dict[str, Any],
+        files: Iterable[str] = (),
+    ) -> None:
+        """
+        Saves the result of a unit once it is complete.
+
+        :param result: JSON-serializable result of the unit.
+        :param files: Files the unit produced, which must still be there to reuse it.
+        """
+        manifest_path = self._manifest_path(kind, key)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        saved = {
+            "result": result,
+            "files": [[path, os.path.getsize(path)] for path in files],
+        }
+        # Written under another name first, so a crash never leaves half a manifest
+        partial_path = manifest_path + ".partial"
+        write_json(partial_path, saved, compact=True)
+        os.replace(partial_path, manifest_path)
+        with self._lock:
+            self.saved[kind] = self.saved.get(kind, 0) + 1
+
+    def close(self) -> None:
+        """Releases the directory, so a later build can resume from it."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def remove(self) -> None:
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "resumed": dict(self.resumed),
+            "saved": dict(self.saved),
+        }
+
+    def _manifest_path(self, kind: str, key: str) -> str:
+        return os.path.join(self.path, kind, f"{key}.json")
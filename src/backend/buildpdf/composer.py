@@ -0,0 +1,211 @@
+import hashlib
+import io
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+)
+
+# Page keys PdfWriter.append does not clone directly. Annotations are re-inserted
+# with their page links remapped, and article beads are not carried over.
+EXCLUDED_PAGE_KEYS = ["/B", "/Annots"]
+
+# US Letter in points, the size of pages that stand in for a missing document
+BLANK_PAGE_WIDTH = 612
+BLANK_PAGE_HEIGHT = 792
+
+
+def blank_pdf(num_pages: int) -> PdfReader:
+    """A PDF of blank pages that holds the place of a document that wasn't rendered."""
+    writer = PdfWriter()
+    for _ in range(num_pages):
+        writer.add_blank_page(BLANK_PAGE_WIDTH, BLANK_PAGE_HEIGHT)
+    stream = io.BytesIO()
+    writer.write(stream)
+    return PdfReader(stream)
+
+
+class PageComposer:
+    """
+    Copies pages from source PDFs into one PdfWriter without duplicating shared resources.
+
+    Only the requested pages and the objects they reference are cloned. Before a page
+    is cloned, every indirect object reachable from its /Resources (fonts, font files,
+    images, form XObjects, color profiles) is hashed by content. Objects identical to
+    one an earlier page already brought into the writer are mapped onto that copy, so
+    a font embedded by hundreds of source PDFs is written once.
+
+    Usage:
+        composer = PageComposer()
+        composer.add_pages(reader)              # every page
+        composer.add_pages(other, range(2, 5))  # pages 3 to 5
+        composer.writer.write(output_path)
+    """
+
+    def __init__(self, writer: PdfWriter = None):
+        self.writer = writer or PdfWriter()
+        self.deduplicated_objects = 0
+        # Content digest -> object number of the copy already in the writer
+        self._object_by_digest: Dict[bytes, int] = {}
+        # (id(reader), object number) -> content digest, None if it can't be hashed
+        self._digests: Dict[Tuple[int, int], Optional[bytes]] = {}
+        # PyPDF2 and the digests above key sources by id(reader), so every source is kept
+        # alive until the composer is done to stop a new reader from reusing an id.
+        self._readers: List[PdfReader] = []
+
+    def add_pages(
+        self, reader: PdfReader, pages: Iterable[int] = None, index: int = None
+    ) -> int:
+        """
+        Appends pages of reader to the writer, like PdfWriter.append without the outline.
+
+        :param reader: The source PDF. Its pages are copied into the writer before
+            this returns, so its stream may be closed afterwards. The reader object
+            itself is kept until the composer is done.
+        :param pages: 0-based indices of the pages to copy, all pages if None.
+        :param index: Insert the pages before this 0-based page of the writer instead
+            of appending them.
+        :return: The number of pages added.
+        """
+        if pages is None:
+            pages = range(len(reader.pages))
+        self._readers.append(reader)
+
+        writer = self.writer
+        added_pages = {}
+        for page_index in pages:
+            page = reader.pages[page_index]
+            resources = page.raw_get("/Resources") if "/Resources" in page else None
+            cloned_references = self._reuse_shared_resources(reader, resources)
+            if index is None:
+                new_page = writer.add_page(page, EXCLUDED_PAGE_KEYS)
+            else:
+                new_page = writer.insert_page(
+                    page, index + len(added_pages), EXCLUDED_PAGE_KEYS
+                )
+            new_page.original_page = page
+            added_pages[page.indirect_reference.idnum] = new_page
+            self._remember_copies(reader, cloned_references)
+
+        self._add_named_destinations(reader, added_pages)
+        for new_page in added_pages.values():
+            annotations = writer._insert_filtered_annotations(
+                new_page.original_page.get("/Annots", ()), new_page, added_pages, reader
+            )
+            if len(annotations) > 0:
+                new_page[NameObject("/Annots")] = annotations
+            writer.clean_page(new_page)
+        return len(added_pages)
+
+    def _add_named_destinations(self, reader: PdfReader, added_pages: dict) -> None:
+        root = reader.trailer["/Root"]
+        names = root["/Names"] if "/Names" in root else {}
+        if "/Dests" not in root and "/Dests" not in names:
+            return  # Most sources have none, so skip the name tree walk
+        for destination in reader.named_destinations.values():
+            page = destination["/Page"]
+            if isinstance(page, NullObject):
+                continue
+            if page.indirect_reference.idnum in added_pages:
+                array = destination.dest_array
+                array[NumberObject(0)] = added_pages[
+                    page.indirect_reference.idnum
+                ].indirect_reference
+                self.writer.add_named_destination_array(destination["/Title"], array)
+
+    def _reuse_shared_resources(self, reader: PdfReader, resources) -> List[int]:
+        """
+        Points the clone map of reader at existing copies of objects identical to the
+        ones reachable from a page's resources.
+
+        :return: Object numbers of the resources the page clone will copy.
+        """
+        translated = self.writer._id_translated.setdefault(id(reader), {})
+        to_clone = []
+        seen = set()
+        pending = [resources]
+        while pending:
+            obj = pending.pop()
+            if isinstance(obj, IndirectObject):
+                if obj.idnum in seen or obj.idnum in translated:
+                    continue  # Already in the writer together with everything below it
+                seen.add(obj.idnum)
+                digest = self._digest(reader, obj, set())
+                if digest is not None and digest in self._object_by_digest:
+                    translated[obj.idnum] = self._object_by_digest[digest]
+                    self.deduplicated_objects += 1
+                    continue
+                to_clone.append(obj.idnum)
+                obj = obj.get_object()
+            if isinstance(obj, DictionaryObject):
+                pending.extend(
+                    value for key, value in obj.items() if key != "/Parent"
+                )
+            elif isinstance(obj, ArrayObject):
+                pending.extend(obj)
+        return to_clone
+
+    def _remember_copies(self, reader: PdfReader, object_numbers: List[int]) -> None:
+        """Records the copies a page clone brought into the writer by content digest."""
+        translated = self.writer._id_translated.get(id(reader), {})
+        for idnum in object_numbers:
+            digest = self._digests.get((id(reader), idnum))
+            if (
+                digest is not None
+                and digest not in self._object_by_digest
+                and idnum in translated
+            ):
+                self._object_by_digest[digest] = translated[idnum]
+
+    def _digest(
+        self, reader: PdfReader, reference: IndirectObject, in_progress: set
+    ) -> Optional[bytes]:
+        key = (id(reader), reference.idnum)
+        if key in self._digests:
+            return self._digests[key]
+        if reference.idnum in in_progress:
+            return None  # Reference cycle, leave these objects alone
+        in_progress.add(reference.idnum)
+        hasher = hashlib.sha1()
+        hashable = self._hash_value(reader, reference.get_object(), hasher, in_progress)
+        in_progress.discard(reference.idnum)
+        digest = hasher.digest() if hashable else None
+        self._digests[key] = digest
+        return digest
+
+    def _hash_value(self, reader: PdfReader, obj, hasher, in_progress: set) -> bool:
+        if isinstance(obj, IndirectObject):
+            digest = self._digest(reader, obj, in_progress)
+            if digest is None:
+                return False
+            hasher.update(b"R" + digest)
+        elif isinstance(obj, DictionaryObject):
+            hasher.update(b"<<")
+            for key in sorted(obj.keys()):
+                if key == "/Parent":
+                    return False  # Part of a tree, not a self-contained resource
+                hasher.update(key.encode("utf-8", "surrogatepass"))
+                if not self._hash_value(reader, obj.raw_get(key), hasher, in_progress):
+                    return False
+            hasher.update(b">>")
+            if isinstance(obj, StreamObject):
+                data = obj._data
+                hasher.update(b"stream")
+                hasher.update(data if isinstance(data, bytes) else str(data).encode())
+        elif isinstance(obj, ArrayObject):
+            hasher.update(b"[")
+            for item in obj:
+                if not self._hash_value(reader, item, hasher, in_progress):
+                    return False
+            hasher.update(b"]")
+        else:
+            hasher.update(type(obj).__name__.encode())
+            hasher.update(repr(obj).encode("utf-8", "surrogatepass"))
+        return True
@@ -0,0 +1,64 @@
+import platform
+from concurrent.futures import ThreadPoolExecutor
+
+# Conditionally import pythoncom on Windows
+if platform.system() == "Windows":
+    import pythoncom
+else:
+    pythoncom = None
+
+DEFAULT_MAX_WORKERS = 3
+
+
+def _run_with_com(func, *args, **kwargs):
+    """
+    Runs func on a pool thread. Conversions drive Word through COM, which has to be
+    initialized on every thread that uses it, not just the request thread.
+    """
+    if pythoncom is not None:
+        pythoncom.CoInitialize()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if pythoncom is not None:
+            pythoncom.CoUninitialize()
+
+
+class ConversionPool:
+    """
+    Small thread pool for running DOCX replace-and-convert jobs concurrently.
+
+    Everything a job does runs concurrently: replacing variables, updating the table
+    of contents and saving the DOCX, and exporting it to PDF. Every export starts a
+    Word instance of its own (see convert_docx.convert), so jobs never share or quit
+    each other's Word.
+
+    Usage:
+        with ConversionPool() as pool:
+            future = pool.submit(convert_docx_template_to_pdf, docx_path, ...)
+            result = future.result()
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        return False
+
+    def submit(self, func, *args, **kwargs):
+        # Threads are only started once there is something to convert
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="docx-convert"
+            )
+        return self._executor.submit(_run_with_com, func, *args, **kwargs)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,269 @@
+import multiprocessing
+import os
+import platform
+import signal
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Seconds a single DOCX to PDF conversion may take. 0 runs conversions without the
+# watchdog, in the calling thread.
+CONVERSION_TIMEOUT_ENV = "PDFBUILDER_CONVERSION_TIMEOUT"
+DEFAULT_CONVERSION_TIMEOUT = 300
+# How often a conversion that failed or timed out is tried again
+CONVERSION_RETRIES_ENV = "PDFBUILDER_CONVERSION_RETRIES"
+DEFAULT_CONVERSION_RETRIES = 2
+# Wait before the first retry, doubled before every further one
+RETRY_BACKOFF_SECONDS = 2.0
+# How long a killed converter process gets to go away
+KILL_WAIT_SECONDS = 10
+
+IS_WINDOWS = platform.system() == "Windows"
+
+# Set in a converter process to pass the Word instances it starts to the watchdog
+_word_process_reporter: Optional[Callable[[int], None]] = None
+
+
+class ConversionTimeout(Exception):
+    pass
+
+
+def get_conversion_timeout() -> float:
+    try:
+        timeout = float(
+            os.environ.get(CONVERSION_TIMEOUT_ENV, DEFAULT_CONVERSION_TIMEOUT)
+        )
+    except ValueError:
+        return DEFAULT_CONVERSION_TIMEOUT
+    return max(timeout, 0)
+
+
+def get_conversion_retries() -> int:
+    try:
+        retries = int(
+            os.environ.get(CONVERSION_RETRIES_ENV, DEFAULT_CONVERSION_RETRIES)
+        )
+    except ValueError:
+        return DEFAULT_CONVERSION_RETRIES
+    return max(retries, 0)
+
+
+def _default_converter() -> Callable[[str, str], Any]:
+    # Looked up on every conversion, so replacing convert_docx.convert swaps it out
+    from buildpdf import convert_docx
+
+    return convert_docx.convert
+
+
+def report_word_process(pid: int) -> None:
+    """
+    Tells the watchdog about a Word instance the converter started. COM starts Word
+    outside the converter's process tree, so a timed out conversion kills it by its
+    PID. Does nothing outside a converter process.
+    """
+    if _word_process_reporter is not None:
+        _word_process_reporter(pid)
+
+
+def _run_converter(converter, docx_path: str, pdf_path: str, connection) -> None:
+    """
+    Runs one conversion in the converter process and reports how it went, as
+    ("word", pid) for every Word instance started and then ("done", None) or
+    ("error", message).
+    """
+    global _word_process_reporter
+
+    def report(pid: int) -> None:
+        connection.send(("word", pid))
+
+    _word_process_reporter = report
+    if not IS_WINDOWS:
+        # Lead a process group of its own, so helpers it starts are killed with it
+        os.setsid()
+    pythoncom = None
+    if IS_WINDOWS:
+        import pythoncom
+
+        pythoncom.CoInitialize()
+    try:
+        converter(docx_path, pdf_path)
+        connection.send(("done", None))
+    except BaseException as e:
+        # Only the message is sent, the exception itself may not pickle
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+        if pythoncom is not None:
+            pythoncom.CoUninitialize()
+
+
+def kill_process_tree(pid: int) -> None:
+    """Kills a converter process and every process it started."""
+    try:
+        if IS_WINDOWS:
+            subprocess.run(
+                ["taskkill", "/PID", str(pid), "/T", "/F"],
+                capture_output=True,
+                timeout=KILL_WAIT_SECONDS,
+            )
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Could not kill converter process {pid}: {e}")
+
+
+def kill_process(pid: int) -> None:
+    """Kills a single process, such as the Word instance of a converter."""
+    try:
+        if IS_WINDOWS:
+            subprocess.run(
+                ["taskkill", "/PID", str(pid), "/F"],
+                capture_output=True,
+                timeout=KILL_WAIT_SECONDS,
+            )
+        else:
+            os.kill(pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Could not kill process {pid}: {e}")
+
+
+class ConversionWatchdog:
+    """
+    Runs DOCX to PDF conversions in a converter process under a timeout.
+
+    A conversion that takes longer than the timeout has its converter process tree
+    killed, together with the Word instance it reported with report_word_process.
+    Word instances of other conversions running at the same time are left alone,
+    as are those the user opened. Conversions
+    that time out or fail are tried again after a growing pause, up to the retry
+    limit. The last failure of every document is kept in failures, in the form of
+    problematic_files entries, and raised to the caller.
+
+    The converter is called with the DOCX and PDF paths in a spawned process, so it
+    must be importable by name. A watchdog is shared by the conversion threads of
+    a build.
+
+    Usage:
+        watchdog = ConversionWatchdog()
+        watchdog.convert("cover.docx", "cover.pdf")
+        problematic_files.extend(watchdog.failures)
+    """
+
+    def __init__(
+        self,
+        converter: Callable[[str, str], Any] = None,
+        timeout: float = None,
+        retries: int = None,
+        backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+    ):
+        """
+        :param converter: Converts a DOCX file to a PDF file. Defaults to
+            convert_docx.convert, which drives Word.
+        :param timeout: Seconds one attempt may take. Defaults to the
+            PDFBUILDER_CONVERSION_TIMEOUT environment variable.
+        :param retries: Attempts after the first one. Defaults to the
+            PDFBUILDER_CONVERSION_RETRIES environment variable.
+        :param backoff_seconds: Wait before the first retry.
+        """
+        self.converter = converter
+        self.timeout = get_conversion_timeout() if timeout is None else timeout
+        self.retries = get_conversion_retries() if retries is None else retries
+        self.backoff_seconds = backoff_seconds
+        self.failures: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def convert(self, docx_path: str, pdf_path: str, source_path: str = None) -> None:
+        """
+        Converts docx_path to pdf_path, retrying failed attempts.
+
+        :param source_path: The document reported in failures, if docx_path is a
+            modified copy of it.
+        :raises ConversionTimeout: If the last attempt timed out.
+        :raises RuntimeError: If the last attempt failed.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                self._attempt(docx_path, pdf_path)
+                return
+            except (ConversionTimeout, RuntimeError) as e:
+                if attempt == self.retries:
+                    with self._lock:
+                        self.failures.append(
+                            {
+                                "path": source_path or docx_path,
+                                "error": f"Failed to convert DOCX to PDF after "
+                                f"{attempt + 1} attempts: {e}",
+                            }
+                        )
+                    raise
+                delay = self.backoff_seconds * 2**attempt
+                print(
+                    f"Conversion attempt {attempt + 1} of {docx_path} failed: {e}. "
+                    f"Retrying in {delay:.0f}s."
+                )
+                time.sleep(delay)
+
+    def failure(self, path: str) -> Optional[Dict[str, Any]]:
+        """The failure of path if its conversion already failed for good."""
+        with self._lock:
+            for failure in self.failures:
+                if failure["path"] == path:
+                    return failure
+        return None
+
+    def _attempt(self, docx_path: str, pdf_path: str) -> None:
+        converter = self.converter or _default_converter()
+        if not self.timeout:
+            try:
+                converter(docx_path, pdf_path)
+            except Exception as e:
+                raise RuntimeError(f"{type(e).__name__}: {e}") from e
+            return
+
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_converter,
+            args=(converter, docx_path, pdf_path, sender),
+            name="docx-converter",
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+        deadline = time.monotonic() + self.timeout
+        word_pids = []
+        status = None
+        try:
+            while status is None:
+                if not receiver.poll(max(deadline - time.monotonic(), 0)):
+                    print(
+                        f"Conversion of {docx_path} did not finish within "
+                        f"{self.timeout:g}s. Killing the converter."
+                    )
+                    kill_process_tree(process.pid)
+                    # In case it was killed before it had a process group of its own
+                    process.kill()
+                    raise ConversionTimeout(
+                        f"Conversion did not finish within {self.timeout:g} seconds"
+                    )
+                try:
+                    status, value = receiver.recv()
+                except EOFError:
+                    process.join(KILL_WAIT_SECONDS)
+                    status = "error"
+                    value = (
+                        f"The converter process exited with code {process.exitcode}"
+                    )
+                if status == "word":
+                    word_pids.append(value)
+                    status = None
+        finally:
+            receiver.close()
+            process.join(KILL_WAIT_SECONDS)
+            if status != "done":
+                # A Word instance whose converter is gone is never quit otherwise
+                for pid in word_pids:
+                    kill_process(pid)
+        if status == "error":
+            raise RuntimeError(value)
@@ -2,16 +2,89 @@
 import os
 from docx import Document
 from python_docx_replace import docx_replace, docx_get_keys
-from docx2pdf import convert
+from docx2pdf import convert as docx2pdf_convert
 from PyPDF2 import PdfReader
+import platform
 import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # from buildpdf.table_entries.table_entries import TableEntry, TableEntryData
 from buildpdf.table_entries.table_document import TableDocument, TableEntry
-from schema import BookmarkItem
+from buildpdf.docx_scanner import scan_docx_keys
+from buildpdf.bookmarks import BookmarkStore
+from buildpdf.conversion_watchdog import ConversionWatchdog, report_word_process
 
 
-def get_variables_in_docx(docx_path):
+# Maps a normalized DOCX path to (mtime_ns, size, keys) so repeat lookups of an
+# unchanged template skip parsing entirely
+_docx_variables_cache = {}
+_docx_variables_cache_lock = threading.Lock()
+DOCX_VARIABLES_CACHE_SIZE = 256
+
+IS_WINDOWS = platform.system() == "Windows"
+# Word's WdSaveFormat for PDF
+WD_FORMAT_PDF = 17
+
+
+def convert(docx_path, pdf_path):
+    """Converts a DOCX file to PDF with Word.
+
+    docx2pdf attaches to the shared Word automation server with Dispatch and quits it
+    when it is done, which tears down the documents of every other conversion running
+    at the same time. On Windows each call therefore starts a Word instance of its own
+    with DispatchEx and quits only that one, so conversions can run concurrently.
+    Its PID is reported to the conversion watchdog, which kills only that instance
+    if the conversion hangs. Elsewhere docx2pdf's converter is used.
+    """
+    if not IS_WINDOWS:
+        docx2pdf_convert(docx_path, pdf_path)
+        return
+
+    import win32com.client
+
+    word = win32com.client.DispatchEx("Word.Application")
+    try:
+        word.Visible = False
+        word.DisplayAlerts = 0
+        pid = _word_process_id(word)
+        if pid is not None:
+            report_word_process(pid)
+        document = word.Documents.Open(os.path.abspath(docx_path), ReadOnly=True)
+        try:
+            document.SaveAs(os.path.abspath(pdf_path), FileFormat=WD_FORMAT_PDF)
+        finally:
+            document.Close(0)
+    finally:
+        word.Quit()
+
+
+def _word_process_id(word):
+    """Finds the PID of a Word instance by giving its hidden window a unique caption."""
+    import win32gui
+    import win32process
+
+    try:
+        caption = f"pdfbuilder-{uuid.uuid4()}"
+        word.Caption = caption
+        window = win32gui.FindWindow("OpusApp", caption)
+        if not window:
+            return None
+        return win32process.GetWindowThreadProcessId(window)[1]
+    except Exception as e:
+        print(f"Could not find the process of the Word instance: {e}")
+        return None
+
+
+def _read_variables_in_docx(docx_path):
+    # Stream the XML parts directly. This is much faster than loading the document
+    # model and is all that is needed to list the keys.
+    try:
+        return scan_docx_keys(docx_path), True
+    except Exception as e:
+        print(f"Fast scan of '{docx_path}' failed, falling back to python-docx: {e}")
+
     # Create an object of the Document class
     document = Document(docx_path)
 
@@ -19,10 +92,55 @@ def get_variables_in_docx(docx_path):
     try:
         keys = docx_get_keys(document)
     except Exception as e:
-        keys = [f"Error: {e}"]
+        return [f"Error: {e}"], False
+    return keys, True
+
+
+def get_variables_in_docx(docx_path):
+    cache_key = os.path.normcase(os.path.abspath(docx_path))
+    stat = os.stat(docx_path)
+    with _docx_variables_cache_lock:
+        cached = _docx_variables_cache.get(cache_key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return list(cached[2])
+
+    keys, cacheable = _read_variables_in_docx(docx_path)
+    if cacheable:
+        with _docx_variables_cache_lock:
+            _docx_variables_cache.pop(cache_key, None)
+            if len(_docx_variables_cache) >= DOCX_VARIABLES_CACHE_SIZE:
+                # Evict the oldest entry
+                del _docx_variables_cache[next(iter(_docx_variables_cache))]
+            _docx_variables_cache[cache_key] = (
+                stat.st_mtime_ns,
+                stat.st_size,
+                tuple(keys),
+            )
     return keys
 
 
+def get_variables_in_docx_files(docx_paths, max_workers=4):
+    """Extracts the variables of several DOCX files in parallel.
+
+    Returns:
+        tuple: (variables, errors), both dicts keyed by the requested path.
+    """
+    variables = {}
+    errors = {}
+    unique_paths = list(dict.fromkeys(docx_paths))
+    if not unique_paths:
+        return variables, errors
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_paths))) as pool:
+        futures = {path: pool.submit(get_variables_in_docx, path) for path in unique_paths}
+        for path, future in futures.items():
+            try:
+                variables[path] = future.result()
+            except Exception as e:
+                errors[path] = str(e)
+    return variables, errors
+
+
 def replace_text_in_docx(docx_path, replacements, output_path=None):
     # Create an object of the Document class
     document = Document(docx_path)
@@ -39,23 +157,33 @@ def replace_text_in_docx(docx_path, replacements, output_path=None):
     return modified_docx_path
 
 
-def convert_docx_to_pdf(docx_path):
+def convert_docx_to_pdf(
+    docx_path, output_dir=None, watchdog=None, source_path=None
+):
     """Converts a DOCX file to PDF and returns the path to the PDF.
-    Ensures the PDF file is saved with a .pdf extension.
+    Ensures the PDF file is saved with a .pdf extension. The PDF is written to
+    output_dir when given, otherwise next to the DOCX.
+
+    The conversion runs under watchdog, or a new ConversionWatchdog, which times it
+    out and retries it. A failure is reported for source_path when it is given.
     """
     # Ensure the output path has a .pdf extension
     pdf_path = os.path.splitext(docx_path)[0] + ".pdf"
+    if output_dir:
+        pdf_path = os.path.join(output_dir, os.path.basename(pdf_path))
 
     print(f"Converting {docx_path} to {pdf_path}")
     try:
-        convert(docx_path, pdf_path)
+        (watchdog or ConversionWatchdog()).convert(docx_path, pdf_path, source_path)
         if not os.path.exists(pdf_path):
             print(
                 f"Warning: PDF conversion seemed successful but file not found at {pdf_path}"
             )
             # Try the default path provided by docx2pdf if our path failed
+            # (only when converting in place, so an unrelated PDF next to the
+            # source is never picked up)
             default_pdf_path = docx_path.replace(".docx", ".pdf")
-            if os.path.exists(default_pdf_path):
+            if not output_dir and os.path.exists(default_pdf_path):
                 print(
                     f"Found PDF at default location: {default_pdf_path}. Moving to target: {pdf_path}"
                 )
@@ -73,7 +201,7 @@ def convert_docx_to_pdf(docx_path):
         # If the error means no PDF was created, returning None might be best
         # If conversion library creates pdf at different path, try to find it
         alt_path = docx_path.replace(".docx", ".pdf")
-        if os.path.exists(alt_path):
+        if not output_dir and os.path.exists(alt_path):
             print(
                 f"Conversion failed but found PDF at alternative path: {alt_path}. Moving."
             )
@@ -107,26 +235,20 @@ def update_table_of_contents(
 
 
 def convert_bookmark_data_to_table_entries(
-    bookmark_data: list[BookmarkItem],
+    bookmark_data: BookmarkStore,
 ) -> list[TableEntry]:
-    def get_level(bookmark: BookmarkItem, level: int = 0) -> int:
-        if bookmark.parent is None:
-            return level
-        return get_level(bookmark.parent, level + 1)
+    levels = bookmark_data.levels()
 
     table_entries = []
-    for bookmark in bookmark_data:
-        if bookmark.include_in_table_of_contents:
-            level = get_level(bookmark)
+    for index in range(len(bookmark_data)):
+        if bookmark_data.include_in_table_of_contents(index):
+            page = bookmark_data.pages[index]
+            page_end = bookmark_data.page_end(index)
             table_entry = TableEntry(
-                title=bookmark.title,
-                page_start=bookmark.page,
-                page_end=(
-                    bookmark.page_end
-                    if bookmark.page_end is not None
-                    else bookmark.page
-                ),
-                level=level,
+                title=bookmark_data.titles[index],
+                page_start=page,
+                page_end=page_end if page_end is not None else page,
+                level=levels[index],
             )
             table_entries.append(table_entry)
     return table_entries
@@ -142,70 +264,62 @@ def convert_docx_template_to_pdf(
     is_table_of_contents=False,
     bookmark_data=None,
     save_modified_to=None,  # Path to save the modified docx
+    scratch_dir=None,
+    watchdog=None,
 ):
     """Processes a DOCX template: applies replacements, updates TOC if needed, converts to PDF.
 
+    The template is loaded once. Replacements and the TOC update are applied to the
+    in-memory document, which is then saved a single time before conversion.
+
     Args:
         docx_path (str): Path to the original DOCX template.
         replacements (dict, optional): Key-value pairs for text replacement.
-        save_modified_to (str, optional): If provided, save the modified DOCX to this path.
-                                        Otherwise, an intermediate file is used and deleted.
+        save_modified_to (str, optional): If provided, save the modified DOCX to this path
+                                        and create the PDF next to it.
+        scratch_dir (str, optional): Build-private directory for the intermediate DOCX
+                                   and the PDF. Required when save_modified_to is not
+                                   given, so every file lands somewhere its owner
+                                   cleans up.
         is_table_of_contents (bool): Flag indicating if the DOCX is a table of contents.
-        bookmark_data (list, optional): Data needed to update the table of contents.
+        bookmark_data (BookmarkStore, optional): Data needed to update the table of contents.
         page_start_col, page_end_col, page_number_offset, total_pages: TOC related args.
+        watchdog (ConversionWatchdog, optional): Times out and retries the conversion,
+                                                and records it if it fails for good.
 
     Returns:
         tuple: (pdf_reader, num_pages, created_pdf_path, created_docx_path)
                Returns paths to the successfully created files (PDF and modified DOCX).
                Returns None for paths if creation failed or wasn't applicable.
+
+    Raises:
+        ValueError: If neither save_modified_to nor scratch_dir is given.
     """
-    intermediate_files = []
-    current_docx_path = docx_path
+    if not save_modified_to and not scratch_dir:
+        raise ValueError("Either save_modified_to or scratch_dir is required")
     created_docx_path = None
     created_pdf_path = None
+    document = None
 
     # --- Step 1: Handle Replacements ---
+    if replacements or is_table_of_contents or save_modified_to:
+        document = Document(docx_path)
+
     if replacements:
         try:
-            # Determine the output path for the modified DOCX
-            if save_modified_to:
-                modified_docx_path = save_modified_to
-                created_docx_path = save_modified_to  # This is the final intended path
-            else:
-                # Create a temporary path for the intermediate modified file
-                temp_modified_path = current_docx_path.replace(
-                    ".docx", "_modified_temp.docx"
-                )
-                modified_docx_path = temp_modified_path
-                intermediate_files.append(temp_modified_path)
-
-            # Perform replacements and save to the determined path
-            replace_text_in_docx(current_docx_path, replacements, modified_docx_path)
-
-            # Update the path to use for the next steps
-            current_docx_path = modified_docx_path
-
-            # Verify creation only if it's the final intended path
-            if save_modified_to and not os.path.exists(created_docx_path):
-                print(
-                    f"Warning: Modified DOCX specified path {created_docx_path} not found after replacement."
-                )
-                created_docx_path = None  # Mark as not created
-
+            docx_replace(document, **replacements)
         except Exception as e:
             print(f"Error replacing text in DOCX '{docx_path}': {str(e)}")
-            # If replacements fail, we might want to stop or proceed with original?
-            # For now, proceed with the current_docx_path (which might be original)
-            # but ensure created_docx_path is None if save_modified_to was provided
-            if save_modified_to:
-                created_docx_path = None
+            # Proceed with the unmodified template
+            document = Document(docx_path)
 
     # --- Step 2: Handle Table of Contents ---
     if is_table_of_contents:
         try:
-            # Use the current state of the DOCX (original or modified)
+            # Reuse the already loaded (and possibly modified) document
             table_doc = TableDocument(
-                docx_path=current_docx_path,
+                docx_path=docx_path,
+                document=document,
                 page_start_col=page_start_col,
                 page_end_col=page_end_col,
                 skiprows=2,
@@ -215,76 +329,73 @@ def convert_docx_template_to_pdf(
                 table_entries = convert_bookmark_data_to_table_entries(bookmark_data)
                 table_doc.set_table_entries(table_entries)
                 table_doc.adjust_num_rows()
+        except Exception as e:
+            print(f"Error updating table of contents for '{docx_path}': {str(e)}")
+            # If TOC update fails, proceed with the document for PDF conversion
 
-            # Save the TOC updates.
-            # If we already have a final modified path, save there.
-            # Otherwise, create a new intermediate file.
-            if created_docx_path:
-                toc_updated_path = created_docx_path
-            else:
-                toc_updated_path = current_docx_path.replace(
-                    ".docx", "_toc_updated_temp.docx"
-                )
-                if toc_updated_path not in intermediate_files:
-                    intermediate_files.append(toc_updated_path)
-
-            table_doc.save(output_path=toc_updated_path)
-            current_docx_path = toc_updated_path  # Update path for PDF conversion
-
-            # If we intended to save the final docx, verify TOC update saved correctly
-            if save_modified_to and not os.path.exists(created_docx_path):
-                print(
-                    f"Warning: Modified DOCX with TOC specified path {created_docx_path} not found."
-                )
-                created_docx_path = None
-
+    # --- Step 3: Serialize once ---
+    if save_modified_to:
+        output_dir = os.path.dirname(save_modified_to) or "."
+        try:
+            document.save(save_modified_to)
+            created_docx_path = save_modified_to
+            current_docx_path = save_modified_to
         except Exception as e:
-            print(
-                f"Error updating table of contents for '{current_docx_path}': {str(e)}"
+            print(f"Error saving modified DOCX to '{save_modified_to}': {str(e)}")
+            current_docx_path = None
+    else:
+        output_dir = scratch_dir
+        if document is None:
+            # Nothing to modify, convert the template as it is
+            current_docx_path = docx_path
+        else:
+            # A unique name keeps templates that share a filename apart
+            base_filename = os.path.splitext(os.path.basename(docx_path))[0]
+            current_docx_path = os.path.join(
+                scratch_dir, f"{base_filename}_{uuid.uuid4().hex[:8]}.docx"
             )
-            # If TOC update fails, proceed with the current DOCX for PDF conversion
-            # If we intended to save the final docx, mark as failed
-            if save_modified_to:
-                created_docx_path = None
+            try:
+                document.save(current_docx_path)
+            except Exception as e:
+                print(f"Error saving DOCX to '{current_docx_path}': {str(e)}")
+                current_docx_path = None
 
-    # --- Step 3: Convert to PDF ---
+    # --- Step 4: Convert to PDF ---
     pdf_reader = None
     num_pages = 0
-    try:
-        # Convert the final state of the DOCX to PDF
-        created_pdf_path = convert_docx_to_pdf(current_docx_path)
-
-        # Read the generated PDF
-        if created_pdf_path and os.path.exists(created_pdf_path):
-            pdf_reader = PdfReader(created_pdf_path)
-            num_pages = len(pdf_reader.pages)
-            print(f"Successfully created and read PDF: {created_pdf_path}")
-        else:
-            print(
-                f"PDF conversion failed or file not found for DOCX: {current_docx_path}"
+    if current_docx_path:
+        try:
+            # Convert the final state of the DOCX to PDF
+            created_pdf_path = convert_docx_to_pdf(
+                current_docx_path, output_dir, watchdog=watchdog, source_path=docx_path
             )
-            created_pdf_path = None  # Ensure path is None if creation failed
 
-    except Exception as e:
-        print(f"Error converting DOCX '{current_docx_path}' to PDF: {str(e)}")
-        created_pdf_path = None  # Mark PDF as not created on error
+            # Read the generated PDF
+            if created_pdf_path and os.path.exists(created_pdf_path):
+                pdf_reader = PdfReader(created_pdf_path)
+                num_pages = len(pdf_reader.pages)
+                print(f"Successfully created and read PDF: {created_pdf_path}")
+            else:
+                print(
+                    f"PDF conversion failed or file not found for DOCX: {current_docx_path}"
+                )
+                created_pdf_path = None  # Ensure path is None if creation failed
 
-    # --- Step 4: Clean up Intermediate Files ---
-    for file_path in intermediate_files:
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"Cleaned up intermediate file: {file_path}")
-            except Exception as e:
-                print(f"Error removing intermediate file {file_path}: {str(e)}")
-
-    # --- Step 5: Return Results ---
-    # Ensure created_docx_path is None if the file doesn't actually exist
-    if created_docx_path and not os.path.exists(created_docx_path):
-        print(
-            f"Final check: Modified DOCX path {created_docx_path} does not exist. Setting path to None."
-        )
-        created_docx_path = None
+        except Exception as e:
+            print(f"Error converting DOCX '{current_docx_path}' to PDF: {str(e)}")
+            created_pdf_path = None  # Mark PDF as not created on error
+
+    # --- Step 5: Clean up the intermediate DOCX ---
+    if (
+        current_docx_path
+        and current_docx_path != docx_path
+        and current_docx_path != created_docx_path
+        and os.path.exists(current_docx_path)
+    ):
+        try:
+            os.remove(current_docx_path)
+        except Exception as e:
+            print(f"Error removing intermediate file {current_docx_path}: {str(e)}")
 
     # Return the PDF reader, page count, and paths to the final created files
     return (pdf_reader, num_pages, created_pdf_path, created_docx_path)
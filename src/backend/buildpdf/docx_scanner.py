@@ -0,0 +1,288 @@
+import posixpath
+import re
+import zipfile
+from typing import Any, Dict, Optional
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_P = f"{{{W_NS}}}p"
+_T = f"{{{W_NS}}}t"
+_TAB = f"{{{W_NS}}}tab"
+_BR = f"{{{W_NS}}}br"
+_CR = f"{{{W_NS}}}cr"
+_TR = f"{{{W_NS}}}tr"
+_TC = f"{{{W_NS}}}tc"
+_SECT_PR = f"{{{W_NS}}}sectPr"
+_TYPE = f"{{{W_NS}}}type"
+_VAL = f"{{{W_NS}}}val"
+_PAGE_BREAK_BEFORE = f"{{{W_NS}}}pageBreakBefore"
+_LAST_RENDERED_PAGE_BREAK = f"{{{W_NS}}}lastRenderedPageBreak"
+
+EP_NS = "http://schemas.openxmlformats.org/officeDocument/2006/extended-properties"
+_PAGES = f"{{{EP_NS}}}Pages"
+_CHARACTERS = f"{{{EP_NS}}}Characters"
+
+# How much the text may differ from the character count Word saved with its page
+# count before the page count is considered out of date
+CHARACTERS_TOLERANCE = 0.05
+MIN_CHARACTERS_TOLERANCE = 20
+
+# How far a page count estimate can be trusted
+CONFIDENCE_HIGH = "high"  # Word's page count, saved with the current text
+CONFIDENCE_MEDIUM = "medium"  # A page count or page breaks of an earlier layout
+CONFIDENCE_LOW = "low"  # Counted from explicit page and section breaks
+
+# Same placeholder format as python_docx_replace: ${key}
+KEY_PATTERN = re.compile(r"\$\{([^{}]+)\}")
+
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_DOCUMENT = f"{{{W_NS}}}document"
+_BODY = f"{{{W_NS}}}body"
+_R = f"{{{W_NS}}}r"
+_HYPERLINK = f"{{{W_NS}}}hyperlink"
+_TBL = f"{{{W_NS}}}tbl"
+_TC_PR = f"{{{W_NS}}}tcPr"
+_V_MERGE = f"{{{W_NS}}}vMerge"
+_PTAB = f"{{{W_NS}}}ptab"
+_NO_BREAK_HYPHEN = f"{{{W_NS}}}noBreakHyphen"
+_HEADER_REFERENCE = f"{{{W_NS}}}headerReference"
+_FOOTER_REFERENCE = f"{{{W_NS}}}footerReference"
+_ID = f"{{{R_NS}}}id"
+_RELATIONSHIP = f"{{{PKG_REL_NS}}}Relationship"
+
+# Text of the run content python-docx's Run.text reads, w:t and w:br aside
+_RUN_TEXT = {_TAB: "\t", _PTAB: "\t", _CR: "\n", _NO_BREAK_HYPHEN: "-"}
+# Paths from the story element to the paragraphs python_docx_replace reads: those
+# of the story itself and of the cells of its tables, but not of nested tables,
+# text boxes or content controls
+_READ_PARAGRAPHS = ((_P,), (_TBL, _TR, _TC, _P))
+# Paths from a read paragraph to the runs whose text Paragraph.text joins
+_READ_RUNS = ((_R,), (_HYPERLINK, _R))
+_VERTICAL_MERGE = (_TBL, _TR, _TC, _TC_PR, _V_MERGE)
+
+
+def _scan_part(part, keys: dict, references: list = None) -> None:
+    """
+    Streams one story part, the document body, a header or a footer, and adds the
+    placeholder keys it contains to keys.
+
+    Only the text python_docx_replace reads is scanned: Paragraph.get_all covers the
+    paragraphs of the story and of its tables' cells, and Paragraph.text joins the
+    text of their runs and hyperlinks. Keys in nested tables or text boxes are not
+    replaced by docx_replace, so they are not reported. Text is collected per
+    paragraph, so placeholders that Word split across several runs are stitched back
+    together before matching. Rows and top-level elements are discarded as soon as
+    they are processed, which keeps memory flat regardless of document size.
+
+    :param references: If given, the relationship ids of the default headers and
+        footers of the document's sections are added to it.
+    """
+    path = []
+    base = 1
+    # Text of the paragraph being read and the length of path inside it
+    paragraph_text = None
+    paragraph_depth = 0
+    merged_cell = False
+    for event, elem in etree.iterparse(part, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            path.append(tag)
+            if tag == _BODY and len(path) == 2 and path[0] == _DOCUMENT:
+                base = 2
+            elif tag == _TC and tuple(path[base:]) == (_TBL, _TR, _TC):
+                merged_cell = False
+            elif (
+                tag == _P
+                and paragraph_text is None
+                and not merged_cell
+                and tuple(path[base:]) in _READ_PARAGRAPHS
+            ):
+                paragraph_text = []
+                paragraph_depth = len(path)
+            continue
+
+        if tuple(path[base:]) == _VERTICAL_MERGE:
+            # A continued vertical merge reads as the cell it continues
+            merged_cell = elem.get(_VAL, "continue") == "continue"
+        path.pop()
+        if paragraph_text is not None:
+            if len(path) < paragraph_depth:
+                text = "".join(paragraph_text)
+                for match in KEY_PATTERN.finditer(text):
+                    keys[match.group(1)] = None
+                paragraph_text = None
+            elif tuple(path[paragraph_depth:]) in _READ_RUNS:
+                if tag == _T:
+                    paragraph_text.append(elem.text or "")
+                elif tag == _BR:
+                    if elem.get(_TYPE, "textWrapping") == "textWrapping":
+                        paragraph_text.append("\n")
+                elif tag in _RUN_TEXT:
+                    paragraph_text.append(_RUN_TEXT[tag])
+        if references is not None and tag in (_HEADER_REFERENCE, _FOOTER_REFERENCE):
+            if elem.get(_TYPE) == "default":
+                references.append(elem.get(_ID))
+        if len(path) == base or tuple(path[base:]) == (_TBL,):
+            elem.clear()
+            # Drop already processed siblings so the tree never grows
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+
+def _part_names(package: zipfile.ZipFile, references: list) -> list:
+    """The names of the document parts the relationship ids refer to."""
+    try:
+        relationships = etree.fromstring(package.read("word/_rels/document.xml.rels"))
+    except KeyError:
+        return []
+    targets = {
+        relationship.get("Id"): relationship.get("Target")
+        for relationship in relationships.iter(_RELATIONSHIP)
+    }
+    names = []
+    for reference in references:
+        target = targets.get(reference)
+        if target is None:
+            continue
+        if target.startswith("/"):
+            name = target[1:]
+        else:
+            name = posixpath.normpath(posixpath.join("word", target))
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def scan_docx_keys(docx_path: str) -> list[str]:
+    """
+    Returns the placeholder keys of a DOCX without building a python-docx Document.
+
+    Only the document part and the default headers and footers of its sections are
+    read, like python-docx's section.header and section.footer; embedded media is
+    never touched. The result contains the same keys as
+    python_docx_replace.docx_get_keys, in the order they first appear.
+    """
+    keys = {}
+    references = []
+    with zipfile.ZipFile(docx_path) as package:
+        with package.open("word/document.xml") as part:
+            _scan_part(part, keys, references)
+        for name in _part_names(package, references):
+            with package.open(name) as part:
+                _scan_part(part, keys)
+    return list(keys)
+
+
+def _count_breaks(part) -> Dict[str, int]:
+    """
+    Streams the main document part and counts its page breaks and text.
+
+    rendered counts the page breaks Word recorded when it last laid the document out.
+    A table row that spans pages carries them in every cell, so a row counts those of
+    its fullest cell. explicit counts page breaks, paragraphs that start a page and
+    sections that start on a new page.
+    """
+    counts = {"rendered": 0, "explicit": 0, "characters": 0}
+    sections = 0
+    row_depth = 0
+    row_breaks = 0
+    cell_breaks = 0
+    for event, elem in etree.iterparse(
+        part,
+        events=("start", "end"),
+        tag=(_P, _T, _BR, _TR, _TC, _SECT_PR, _PAGE_BREAK_BEFORE),
+    ):
+        if event == "start":
+            if elem.tag == _TR:
+                row_depth += 1
+                if row_depth == 1:
+                    row_breaks = 0
+            elif elem.tag == _TC and row_depth == 1:
+                cell_breaks = 0
+            continue
+
+        if elem.tag == _P:
+            rendered = sum(1 for _ in elem.iter(_LAST_RENDERED_PAGE_BREAK))
+            if row_depth:
+                cell_breaks += rendered
+            else:
+                counts["rendered"] += rendered
+            elem.clear()
+            # Drop already processed siblings so the tree never grows
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+        elif elem.tag == _T:
+            counts["characters"] += len("".join((elem.text or "").split()))
+        elif elem.tag == _BR:
+            if elem.get(_TYPE) == "page":
+                counts["explicit"] += 1
+        elif elem.tag == _PAGE_BREAK_BEFORE:
+            if elem.get(_VAL, "true") not in ("0", "false", "off"):
+                counts["explicit"] += 1
+        elif elem.tag == _SECT_PR:
+            # A section's type says how it starts, so the first one starts no page
+            section_type = elem.find(_TYPE)
+            if sections and (
+                section_type is None or section_type.get(_VAL) != "continuous"
+            ):
+                counts["explicit"] += 1
+            sections += 1
+        elif elem.tag == _TC and row_depth == 1:
+            row_breaks = max(row_breaks, cell_breaks)
+        elif elem.tag == _TR:
+            if row_depth == 1:
+                counts["rendered"] += row_breaks
+            row_depth -= 1
+    return counts
+
+
+def _read_int(properties, tag: str) -> Optional[int]:
+    element = properties.find(tag)
+    try:
+        return int(element.text)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def estimate_docx_pages(docx_path: str) -> Dict[str, Any]:
+    """
+    Estimates the page count of a DOCX without converting it.
+
+    Word saves the page count in docProps/app.xml, together with the number of
+    characters the document had. If the text still has about as many characters, the
+    page count is current and taken as is. Otherwise, like for documents generated
+    from a template by python-docx, the page breaks Word recorded at its last layout
+    are counted, or failing that, the explicit page and section breaks, which only
+    give a lower bound.
+
+    Replacing template variables can change the page count, so a conversion remains
+    the only exact answer.
+
+    :return: The estimated num_pages and its confidence, one of CONFIDENCE_HIGH,
+        CONFIDENCE_MEDIUM and CONFIDENCE_LOW.
+    """
+    with zipfile.ZipFile(docx_path) as package:
+        with package.open("word/document.xml") as part:
+            counts = _count_breaks(part)
+        pages = characters = None
+        if "docProps/app.xml" in package.namelist():
+            properties = etree.fromstring(package.read("docProps/app.xml"))
+            pages = _read_int(properties, _PAGES)
+            characters = _read_int(properties, _CHARACTERS)
+
+    min_pages = counts["explicit"] + 1
+    if pages is not None and pages >= min_pages:
+        if characters is None:
+            return {"num_pages": pages, "confidence": CONFIDENCE_MEDIUM}
+        tolerance = max(characters * CHARACTERS_TOLERANCE, MIN_CHARACTERS_TOLERANCE)
+        if abs(counts["characters"] - characters) <= tolerance:
+            return {"num_pages": pages, "confidence": CONFIDENCE_HIGH}
+    num_pages = max(counts["rendered"] + 1, min_pages)
+    if pages is None and counts["rendered"]:
+        return {"num_pages": num_pages, "confidence": CONFIDENCE_MEDIUM}
+    return {"num_pages": num_pages, "confidence": CONFIDENCE_LOW}
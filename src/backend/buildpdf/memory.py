@@ -0,0 +1,174 @@
+import io
+import os
+import threading
+from typing import Any, BinaryIO, Dict, Tuple
+
+from PyPDF2 import PdfReader
+
+from buildpdf.workspace import BuildWorkspace
+
+# Approximate number of megabytes of PDF data a build may hold in memory. 0 disables
+# the budget.
+MEMORY_BUDGET_ENV = "PDFBUILDER_MEMORY_BUDGET_MB"
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+# What memory is held for
+STAGE_READERS = "readers"  # PDFs opened for planning and composition
+STAGE_REORDERING = "reordering"  # Source PDFs of a FileType while it is reordered
+STAGE_REORDERED = "reordered"  # The combined PDFs of reordered FileTypes
+
+
+def get_memory_budget_bytes() -> int:
+    try:
+        budget_mb = int(os.environ.get(MEMORY_BUDGET_ENV, DEFAULT_MEMORY_BUDGET_MB))
+    except ValueError:
+        budget_mb = DEFAULT_MEMORY_BUDGET_MB
+    return max(budget_mb, 0) * 1024 * 1024
+
+
+def _buffer_size(pdf: PdfReader) -> int:
+    """The bytes of the PDF held in memory by its stream, 0 if it is read from a file."""
+    stream = pdf.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getbuffer().nbytes
+    return 0
+
+
+class MemoryGovernor:
+    """
+    Keeps an approximate count of the PDF data a build holds in memory, per stage,
+    against a budget.
+
+    PyPDF2 reads a whole PDF into memory when it is opened by path. While the build is
+    under its budget, that is what happens. A PDF that would take it over the budget
+    is read lazily from its file instead, and one that only exists in memory, like a
+    reordered FileType, is spilled to the build workspace first and read lazily from
+    there. Lazily read PDFs keep their file open until they are released.
+
+    The governor is shared by the threads of a pipelined build.
+
+    Usage:
+        governor = MemoryGovernor(workspace)
+        pdf = governor.open_pdf(path)
+        reordered = governor.adopt(reordered, STAGE_REORDERED)
+        ...
+        governor.release(pdf)  # once its pages are composed
+        result["memory"] = governor.summary()
+    """
+
+    def __init__(self, workspace: BuildWorkspace, budget_bytes: int = None):
+        self.workspace = workspace
+        self.budget_bytes = (
+            get_memory_budget_bytes() if budget_bytes is None else budget_bytes
+        )
+        self.used_bytes = 0
+        self.peak_bytes = 0
+        self.used_by_stage: Dict[str, int] = {}
+        self.peak_by_stage: Dict[str, int] = {}
+        self.spilled_files = 0
+        self.spilled_bytes = 0
+        # id(pdf) -> (stage, bytes held for it)
+        self._held: Dict[int, Tuple[str, int]] = {}
+        # Files lazily read PDFs were opened with, by id(pdf)
+        self._open_files: Dict[int, BinaryIO] = {}
+        self._lock = threading.Lock()
+
+    def open_pdf(self, path: str, stage: str = STAGE_READERS) -> PdfReader:
+        """
+        Opens a PDF, reading it lazily from its file if loading it whole would exceed
+        the budget.
+        """
+        size = os.path.getsize(path)
+        if not self._reserve(size):
+            return self._open_lazily(path, size, stage)
+        try:
+            pdf = PdfReader(path)
+        except BaseException:
+            self._unreserve(size)
+            raise
+        self._hold(pdf, stage, size)
+        return pdf
+
+    def adopt(self, pdf: PdfReader, stage: str, path: str = None) -> PdfReader:
+        """
+        Accounts for a PDF opened elsewhere. If it takes the build over its budget, it
+        is replaced by a lazily read copy.
+
+        :param path: The file pdf was read from. If None, a copy of its data is
+            spilled to the workspace when needed.
+        :return: pdf, or the lazily read PDF that replaces it.
+        """
+        size = _buffer_size(pdf)
+        if self._reserve(size):
+            self._hold(pdf, stage, size)
+            return pdf
+        if path is None:
+            path = self.workspace.new_path(f"spilled_{stage}.pdf")
+            with open(path, "wb") as f:
+                f.write(pdf.stream.getbuffer())
+            self.workspace.track(path)
+        pdf.stream.close()
+        return self._open_lazily(path, size, stage)
+
+    def release(self, pdf: PdfReader) -> None:
+        """
+        Frees the data of a PDF that is no longer read from, like one whose pages were
+        composed, and closes its file. Objects already read from it stay usable.
+        """
+        with self._lock:
+            stage, size = self._held.pop(id(pdf), (None, 0))
+            self._open_files.pop(id(pdf), None)
+            if stage is not None:
+                self.used_bytes -= size
+                self.used_by_stage[stage] -= size
+        pdf.stream.close()
+
+    def close(self) -> None:
+        """Closes the files of every lazily read PDF that was not released."""
+        with self._lock:
+            files, self._open_files = list(self._open_files.values()), {}
+        for file in files:
+            file.close()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "peak_bytes": self.peak_bytes,
+            "peak_bytes_by_stage": dict(self.peak_by_stage),
+            "spilled_files": self.spilled_files,
+            "spilled_bytes": self.spilled_bytes,
+        }
+
+    def _reserve(self, size: int) -> bool:
+        """Counts size as used if it fits in the budget."""
+        with self._lock:
+            if self.budget_bytes and self.used_bytes + size > self.budget_bytes:
+                return False
+            self.used_bytes += size
+            self.peak_bytes = max(self.peak_bytes, self.used_bytes)
+            return True
+
+    def _unreserve(self, size: int) -> None:
+        with self._lock:
+            self.used_bytes -= size
+
+    def _hold(self, pdf: PdfReader, stage: str, size: int) -> None:
+        with self._lock:
+            self._held[id(pdf)] = (stage, size)
+            used = self.used_by_stage.get(stage, 0) + size
+            self.used_by_stage[stage] = used
+            self.peak_by_stage[stage] = max(self.peak_by_stage.get(stage, 0), used)
+
+    def _open_lazily(self, path: str, size: int, stage: str) -> PdfReader:
+        file = open(path, "rb")
+        try:
+            pdf = PdfReader(file)
+        except BaseException:
+            file.close()
+            raise
+        with self._lock:
+            self._open_files[id(pdf)] = file
+            self.spilled_files += 1
+            self.spilled_bytes += size
+        self._hold(pdf, stage, 0)
+        return pdf
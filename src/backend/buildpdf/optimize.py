@@ -0,0 +1,243 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from PyPDF2 import PdfWriter
+from PyPDF2.filters import FlateDecode
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+
+# Objects with these keys are linked into a tree or list and are never merged
+_STRUCTURAL_KEYS = ("/Parent", "/Kids", "/First", "/Last", "/Next", "/Prev", "/P")
+_STRUCTURAL_TYPES = ("/Catalog", "/Pages", "/Page", "/Outlines")
+
+# Streams smaller than this are not worth the FlateDecode overhead
+MIN_COMPRESS_BYTES = 64
+
+
+def optimize_writer(writer: PdfWriter, compress_streams: bool = True) -> Dict[str, int]:
+    """
+    Shrinks a composed PdfWriter in place before it is written.
+
+    1. Objects with identical content (fonts, images, ICC profiles, form XObjects and
+       everything they reference) are merged into one copy.
+    2. Objects no longer reachable from the document catalog or info dictionary are
+       dropped, and the remaining objects are renumbered.
+    3. If compress_streams is set, unfiltered streams such as page content streams are
+       FlateDecode compressed when that makes them smaller.
+
+    Pages, the page tree and the outline are never merged, so the output has the same
+    pages and bookmarks. PyPDF2 3.0.1 cannot write compressed object streams, so
+    objects are still written one by one.
+
+    :param writer: The writer to optimize. Call this after all pages and bookmarks are added.
+    :param compress_streams: Whether to compress unfiltered streams.
+    :return: Counts of merged, removed and compressed objects.
+    """
+    objects_before = len(writer._objects)
+    roots = [writer._root] + ([writer._info] if writer._info is not None else [])
+
+    canonical = _find_duplicates(writer, roots)
+    reachable = _reachable_objects(writer, roots, canonical)
+    removed_objects = objects_before - len(reachable) - len(canonical)
+    _renumber(writer, reachable, canonical)
+
+    compressed_streams = 0
+    if compress_streams:
+        compressed_streams = _compress_streams(writer)
+
+    return {
+        "objects_before": objects_before,
+        "objects_after": len(writer._objects),
+        "merged_objects": len(canonical),
+        "removed_objects": removed_objects,
+        "compressed_streams": compressed_streams,
+    }
+
+
+def _references(obj: Any) -> List[IndirectObject]:
+    """Returns the indirect references directly inside obj, including nested direct containers."""
+    references = []
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, IndirectObject):
+            references.append(item)
+        elif isinstance(item, DictionaryObject):
+            pending.extend(item.values())
+        elif isinstance(item, ArrayObject):
+            pending.extend(item)
+    return references
+
+
+def _is_structural(obj: Any) -> bool:
+    if not isinstance(obj, DictionaryObject):
+        return False
+    if obj.get("/Type") in _STRUCTURAL_TYPES:
+        return True
+    return any(key in obj for key in _STRUCTURAL_KEYS)
+
+
+def _find_duplicates(writer: PdfWriter, roots: List[IndirectObject]) -> Dict[int, int]:
+    """
+    Hashes every reachable object by content and maps each duplicate's object number
+    to the number of the first object with the same content.
+    """
+    digests: Dict[int, Optional[bytes]] = {}
+    in_progress = set()
+
+    def digest_of(idnum: int) -> Optional[bytes]:
+        if idnum in digests:
+            return digests[idnum]
+        if idnum in in_progress:
+            return None  # Reference cycle, leave these objects alone
+        obj = writer._objects[idnum - 1]
+        if obj is None or _is_structural(obj):
+            # Identity only, so objects pointing at different pages stay different
+            digest = b"#%d" % idnum
+        else:
+            in_progress.add(idnum)
+            hasher = hashlib.sha1()
+            digest = hasher.digest() if hash_value(obj, hasher) else None
+            in_progress.discard(idnum)
+        digests[idnum] = digest
+        return digest
+
+    def hash_value(obj: Any, hasher) -> bool:
+        if isinstance(obj, IndirectObject):
+            if obj.pdf is not writer:
+                return False
+            digest = digest_of(obj.idnum)
+            if digest is None:
+                return False
+            hasher.update(b"R" + digest)
+        elif isinstance(obj, DictionaryObject):
+            hasher.update(b"<<")
+            for key in sorted(obj.keys()):
+                hasher.update(key.encode("utf-8", "surrogatepass"))
+                if not hash_value(obj.raw_get(key), hasher):
+                    return False
+            hasher.update(b">>")
+            if isinstance(obj, StreamObject):
+                data = obj._data
+                hasher.update(b"stream")
+                hasher.update(data if isinstance(data, bytes) else str(data).encode())
+        elif isinstance(obj, ArrayObject):
+            hasher.update(b"[")
+            for item in obj:
+                if not hash_value(item, hasher):
+                    return False
+            hasher.update(b"]")
+        else:
+            hasher.update(type(obj).__name__.encode())
+            hasher.update(repr(obj).encode("utf-8", "surrogatepass"))
+        return True
+
+    canonical = {}
+    first_by_digest: Dict[bytes, int] = {}
+    for idnum in _reachable_objects(writer, roots, {}):
+        digest = digest_of(idnum)
+        if digest is None:
+            continue
+        if digest in first_by_digest:
+            canonical[idnum] = first_by_digest[digest]
+        else:
+            first_by_digest[digest] = idnum
+    return canonical
+
+
+def _reachable_objects(
+    writer: PdfWriter, roots: List[IndirectObject], canonical: Dict[int, int]
+) -> List[int]:
+    """Returns the numbers of the objects reachable from roots, in object number order."""
+    seen = set()
+    pending = list(roots)
+    while pending:
+        reference = pending.pop()
+        if reference.pdf is not writer:
+            continue
+        idnum = canonical.get(reference.idnum, reference.idnum)
+        if idnum in seen:
+            continue
+        seen.add(idnum)
+        obj = writer._objects[idnum - 1]
+        if obj is not None:
+            pending.extend(_references(obj))
+    return sorted(seen)
+
+
+def _renumber(
+    writer: PdfWriter, reachable: List[int], canonical: Dict[int, int]
+) -> None:
+    new_numbers = {idnum: number for number, idnum in enumerate(reachable, start=1)}
+    new_references = {
+        idnum: IndirectObject(number, 0, writer) for idnum, number in new_numbers.items()
+    }
+    for duplicate, original in canonical.items():
+        new_references[duplicate] = new_references[original]
+
+    def rewrite(container: Any) -> None:
+        pending = [container]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, DictionaryObject):
+                for key in list(item.keys()):
+                    value = item.raw_get(key)
+                    if isinstance(value, IndirectObject):
+                        if value.pdf is writer and value.idnum in new_references:
+                            item[key] = new_references[value.idnum]
+                    elif isinstance(value, (DictionaryObject, ArrayObject)):
+                        pending.append(value)
+            elif isinstance(item, ArrayObject):
+                for index, value in enumerate(item):
+                    if isinstance(value, IndirectObject):
+                        if value.pdf is writer and value.idnum in new_references:
+                            item[index] = new_references[value.idnum]
+                    elif isinstance(value, (DictionaryObject, ArrayObject)):
+                        pending.append(value)
+
+    objects = []
+    for idnum in reachable:
+        obj = writer._objects[idnum - 1]
+        rewrite(obj)
+        obj.indirect_reference = new_references[idnum]
+        objects.append(obj)
+
+    writer._objects = objects
+    writer._root = new_references[writer._root.idnum]
+    writer._pages = new_references[writer._pages.idnum]
+    if writer._info is not None:
+        writer._info = new_references[writer._info.idnum]
+    # Both maps refer to the old object numbers
+    writer._id_translated = {}
+    writer._idnum_hash = {}
+
+
+def _compress_streams(writer: PdfWriter) -> int:
+    compressed = 0
+    for index, obj in enumerate(writer._objects):
+        if (
+            not isinstance(obj, StreamObject)
+            or "/Filter" in obj
+            or not isinstance(obj._data, bytes)
+            or len(obj._data) < MIN_COMPRESS_BYTES
+        ):
+            continue
+        data = FlateDecode.encode(obj._data)
+        if len(data) >= len(obj._data):
+            continue
+        encoded = EncodedStreamObject()
+        for key, value in obj.items():
+            if key != "/Length":
+                encoded[key] = value
+        encoded[NameObject("/Filter")] = NameObject("/FlateDecode")
+        encoded._data = data
+        encoded.indirect_reference = obj.indirect_reference
+        writer._objects[index] = encoded
+        compressed += 1
+    return compressed
@@ -0,0 +1,203 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    TreeObject,
+    create_string_object,
+)
+
+from buildpdf.bookmarks import NO_PARENT, BookmarkStore
+
+
+def add_outline(writer: PdfWriter, bookmarks: BookmarkStore) -> List[IndirectObject]:
+    """
+    Writes every bookmark of the store into the writer's /Outlines tree in one pass.
+
+    This produces the same objects as calling writer.add_outline_item for each
+    bookmark in order: a /GoTo action to the page with /Fit, and items linked through
+    /Parent, /First, /Last, /Next and /Prev with open /Count totals. The difference
+    is that the links and counts are computed in a single linear pass instead of
+    being updated up the parent chain for every item. Bookmarks are appended after
+    any outline items the writer already has.
+
+    :param writer: The writer whose pages the bookmarks point at.
+    :param bookmarks: The bookmarks to write. Parents must come before their children.
+    :return: The outline item reference of every bookmark, by index.
+    """
+    count = len(bookmarks)
+    outline_root = writer.get_outline_root()
+    root_ref = outline_root.indirect_reference
+    page_refs = [page.indirect_reference for page in writer.pages]
+    titles, pages, parents = bookmarks.titles, bookmarks.pages, bookmarks.parents
+
+    fit = NameObject("/Fit")
+    go_to = NameObject("/GoTo")
+    key_action, key_dest, key_type = NameObject("/A"), NameObject("/D"), NameObject("/S")
+    key_title, key_parent = NameObject("/Title"), NameObject("/Parent")
+    key_first, key_last = NameObject("/First"), NameObject("/Last")
+    key_next, key_prev = NameObject("/Next"), NameObject("/Prev")
+    key_count = NameObject("/Count")
+
+    items: List[TreeObject] = []
+    refs: List[IndirectObject] = []
+    # First and last child of every bookmark. The outline root uses the extra last slot.
+    first_child = array("l", [NO_PARENT]) * (count + 1)
+    last_child = array("l", [NO_PARENT]) * (count + 1)
+    root_slot = count
+
+    for index in range(count):
+        page_index = pages[index] - 1  # PyPDF2 is 0-indexed
+        if 0 <= page_index < len(page_refs):
+            page_ref = page_refs[page_index]
+        else:
+            page_ref = NumberObject(page_index)
+        action = DictionaryObject(
+            {key_dest: ArrayObject([page_ref, fit]), key_type: go_to}
+        )
+
+        item = TreeObject()
+        item[key_action] = writer._add_object(action)
+        item[key_title] = create_string_object(titles[index])
+        ref = writer._add_object(item)
+        items.append(item)
+        refs.append(ref)
+
+        parent = parents[index]
+        slot = root_slot if parent == NO_PARENT else parent
+        item[key_parent] = root_ref if parent == NO_PARENT else refs[parent]
+        previous = last_child[slot]
+        if previous == NO_PARENT:
+            first_child[slot] = index
+        else:
+            items[previous][key_next] = ref
+            item[key_prev] = refs[previous]
+        last_child[slot] = index
+
+    # Number of open descendants of every bookmark. Children come after their
+    # parents, so walking backwards finishes every child before its parent.
+    descendants = array("l", [0]) * (count + 1)
+    for index in range(count - 1, -1, -1):
+        parent = parents[index]
+        slot = root_slot if parent == NO_PARENT else parent
+        descendants[slot] += descendants[index] + 1
+
+    for index in range(count):
+        if first_child[index] != NO_PARENT:
+            items[index][key_first] = refs[first_child[index]]
+            items[index][key_last] = refs[last_child[index]]
+            items[index][key_count] = NumberObject(descendants[index])
+
+    if first_child[root_slot] != NO_PARENT:
+        first_ref = refs[first_child[root_slot]]
+        if key_first in outline_root:
+            # Link after the items that are already in the outline
+            existing_last = outline_root[key_last]
+            existing_last[key_next] = first_ref
+            items[first_child[root_slot]][key_prev] = existing_last.indirect_reference
+        else:
+            outline_root[key_first] = first_ref
+        outline_root[key_last] = refs[last_child[root_slot]]
+        outline_root[key_count] = NumberObject(
+            outline_root.get(key_count, 0) + descendants[root_slot]
+        )
+
+    return refs
+
+
+def page_index_map(reader: PdfReader) -> Dict[int, int]:
+    """Maps the object number of every page of reader to its 0-based page index."""
+    return {
+        page.indirect_reference.idnum: index for index, page in enumerate(reader.pages)
+    }
+
+
+def read_outline(
+    reader: PdfReader, page_indices: Dict[int, int] = None
+) -> Tuple[List[Tuple[int, str, int]], Optional[str]]:
+    """
+    Collects walk_outline(reader) into a list.
+
+    :return: The items read, and the error that stopped the walk or None. Items
+        before a malformed entry are still returned.
+    """
+    items = []
+    try:
+        for item in walk_outline(reader, page_indices):
+            items.append(item)
+    except Exception as e:
+        return items, str(e)
+    return items, None
+
+
+def walk_outline(
+    reader: PdfReader, page_indices: Dict[int, int] = None
+) -> Iterator[Tuple[int, str, int]]:
+    """
+    Walks the outline of reader depth first, in document order, without recursion.
+
+    Unlike PdfReader.outline, this reads the outline dictionaries directly instead of
+    building a Destination for every item, and looks pages up in one page index map,
+    so outlines with thousands of items and deep nesting are cheap to read.
+
+    :param reader: The PDF whose outline is read.
+    :param page_indices: The result of page_index_map(reader), built if not given.
+    :return: (depth, title, page index) for every outline item. Top-level items have
+        depth 0. The page index is -1 if the item has no destination or points at a
+        page that isn't in reader.
+    """
+    root = reader.trailer["/Root"]
+    outlines = root["/Outlines"] if "/Outlines" in root else None
+    if not isinstance(outlines, DictionaryObject) or "/First" not in outlines:
+        return
+    if page_indices is None:
+        page_indices = page_index_map(reader)
+    named_destinations = None
+
+    seen = set()
+    # Next sibling of every open level, with the child to visit on top
+    pending = [(outlines.raw_get("/First"), 0)]
+    while pending:
+        reference, depth = pending.pop()
+        if isinstance(reference, IndirectObject):
+            if reference.idnum in seen:
+                continue  # Malformed outline that links back into itself
+            seen.add(reference.idnum)
+        node = reference.get_object()
+        if not isinstance(node, DictionaryObject):
+            continue
+
+        destination = None
+        if "/A" in node:
+            action = node["/A"]
+            if isinstance(action, DictionaryObject) and action.get("/S") == "/GoTo":
+                destination = action["/D"] if "/D" in action else None
+        elif "/Dest" in node:
+            destination = node["/Dest"]
+            if isinstance(destination, DictionaryObject) and "/D" in destination:
+                destination = destination["/D"]
+        if isinstance(destination, str):
+            if named_destinations is None:
+                named_destinations = reader.named_destinations
+            named = named_destinations.get(destination)
+            destination = [named.raw_get("/Page")] if named is not None else None
+
+        page_index = -1
+        if isinstance(destination, (ArrayObject, list)) and len(destination) > 0:
+            page = destination[0]
+            if isinstance(page, IndirectObject):
+                page_index = page_indices.get(page.idnum, -1)
+            elif isinstance(page, int):
+                page_index = int(page)
+
+        yield depth, node["/Title"] if "/Title" in node else "", page_index
+
+        if "/Next" in node:
+            pending.append((node.raw_get("/Next"), depth))
+        if "/First" in node:
+            pending.append((node.raw_get("/First"), depth + 1))
@@ -0,0 +1,90 @@
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict
+
+from PyPDF2 import PdfWriter
+
+from buildpdf.workspace import BuildWorkspace
+
+# Set to 0 to skip flushing the output to disk before it is renamed into place
+OUTPUT_FSYNC_ENV = "PDFBUILDER_OUTPUT_FSYNC"
+# PyPDF2 writes every object with many small writes, so they are gathered locally first
+WRITE_BUFFER_BYTES = 8 * 1024 * 1024
+
+
+def fsync_enabled() -> bool:
+    return os.environ.get(OUTPUT_FSYNC_ENV, "1").strip().lower() not in (
+        "0",
+        "false",
+        "no",
+    )
+
+
+def write_pdf_output(
+    writer: PdfWriter,
+    output_path: str,
+    workspace: BuildWorkspace,
+    fsync: bool = None,
+) -> Dict[str, Any]:
+    """
+    Writes the PDF to output_path without leaving a truncated file behind.
+
+    The PDF is first written to the build workspace through a large buffer. It is
+    then copied to a temporary file next to output_path in one sequential transfer,
+    optionally flushed to disk, and renamed over output_path. The rename is atomic,
+    so readers of output_path see the old file or the complete new one.
+
+    :param writer: The composed PDF.
+    :param output_path: Where the PDF is saved, usually on a network share.
+    :param workspace: The build workspace the local copy is written to.
+    :param fsync: Whether to flush the copy to disk before the rename. Defaults to
+        the PDFBUILDER_OUTPUT_FSYNC environment variable, which defaults to on.
+    :return: The byte count and timings of the write.
+    """
+    if fsync is None:
+        fsync = fsync_enabled()
+
+    local_path = workspace.new_path(os.path.basename(output_path))
+    start = time.perf_counter()
+    with open(local_path, "wb", buffering=WRITE_BUFFER_BYTES) as local_file:
+        writer.write(local_file)
+    workspace.track(local_path)
+    num_bytes = os.path.getsize(local_path)
+    written = time.perf_counter()
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    partial_path = os.path.join(
+        output_dir, f".{os.path.basename(output_path)}.{uuid.uuid4().hex[:8]}.partial"
+    )
+    try:
+        # copyfile uses the platform's fast copy path (CopyFile2, sendfile) when it can
+        shutil.copyfile(local_path, partial_path)
+        if fsync:
+            fd = os.open(partial_path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        workspace.release(local_path)
+    copied = time.perf_counter()
+
+    copy_seconds = copied - written
+    return {
+        "bytes": num_bytes,
+        "write_seconds": round(written - start, 3),
+        "copy_seconds": round(copy_seconds, 3),
+        "throughput_mb_per_second": (
+            round(num_bytes / (1024 * 1024) / copy_seconds, 1) if copy_seconds else None
+        ),
+        "fsync": fsync,
+    }
@@ -1,17 +1,20 @@
+from typing import Callable, Iterator, List, Optional, Tuple
+
 from PyPDF2 import PdfReader
-from schema import BookmarkItem
+from buildpdf.bookmarks import BookmarkStore
+from buildpdf.text_scan import iter_page_texts
 from utils.qualify_filename import qualify_filename
 import re
-import uuid
 
 
 def remove_consecutive_bookmarks(bookmarks):
+    """Drops bookmarks whose title repeats the previous one. Bookmarks are (title, page) tuples."""
     new_bookmarks = []
+    previous_title = None
     for i, bookmark in enumerate(bookmarks):
-        if i == 0:
-            new_bookmarks.append(bookmark)
-        elif bookmark.title != bookmarks[i - 1].title:
+        if i == 0 or bookmark[0] != previous_title:
             new_bookmarks.append(bookmark)
+        previous_title = bookmark[0]
     return new_bookmarks
 
 
@@ -36,64 +39,109 @@ def convert_sample_id_forms(text):
     return text
 
 
+# Merit Sample ID, but not in "Report ID: S12345.67" or as part of a longer ID
+_MERIT_SAMPLE_ID = re.compile(r"(?<!-)(?<!Report ID: )(S\d{5}\.\d{2})(?!-)")
+
+
+def page_sort_key(text: str) -> Tuple[str, str]:
+    """The (Lab Sample ID, Data Set ID) pages are reordered by."""
+    lab_sample_id = re.search(r"Lab Sample ID: (\S+)", text)
+    data_set_id = re.search(r"Data Set ID: (\S+)", text)
+    return (
+        lab_sample_id.group(1) if lab_sample_id else "",
+        data_set_id.group(1) if data_set_id else "",
+    )
+
+
+def match_page_rules(text: str, rules) -> List[str]:
+    """
+    Returns the titles of the bookmarks rules add to a page.
+
+    :param text: The page text, after convert_sample_id_forms.
+    """
+    # Skip pages with bottle preservation check text
+    if "merit laboratories bottle preservation check" in text.lower():
+        return []
+
+    titles = []
+    for rule in rules:
+        if (rule["rule"] == "SAMPLEID") and (rule["bookmark_name"] == "SAMPLEID"):
+            matches = _MERIT_SAMPLE_ID.findall(text)
+            if matches and len(set(matches)) == 1:  # Ensure all matches are the same
+                titles.append(matches[0])
+        elif qualify_filename(rule["rule"], text):
+            titles.append(rule["bookmark_name"])
+    return titles
+
+
+def page_rule_matcher(rules) -> Callable[[str], List[str]]:
+    """
+    Returns a function from the raw text of a page to the titles rules bookmark
+    on it, for reorder steps that read the text anyway. See get_page_level_bookmarks.
+    """
+    return lambda text: match_page_rules(convert_sample_id_forms(text), rules)
+
+
+def iter_page_matches(
+    pdf, rules, reorder_pages=False
+) -> Iterator[Tuple[Optional[Tuple[str, str]], List[str]]]:
+    """
+    Yields the sort key (or None if reorder_pages is off) and the matched
+    bookmark titles of every page of pdf, reading the text of one page at a time.
+    """
+    for text in iter_page_texts(pdf):
+        text = convert_sample_id_forms(text)
+        yield (
+            page_sort_key(text) if reorder_pages else None,
+            match_page_rules(text, rules),
+        )
+
+
 def get_page_level_bookmarks(
-    pdf, rules, parent_bookmark, parent_page_num, reorder_pages=False
+    pdf,
+    rules,
+    bookmark_store: BookmarkStore,
+    parent_bookmark,
+    parent_page_num,
+    reorder_pages=False,
+    page_matches=None,
 ):
-    bookmarks = []
-    page_data = []
-
-    for page in range(len(pdf.pages)):
-        text = pdf.pages[page].extract_text()
-        text = convert_sample_id_forms(text)
-        lab_sample_id = re.search(r"Lab Sample ID: (\S+)", text)
-        data_set_id = re.search(r"Data Set ID: (\S+)", text)
-        page_data.append(
-            (
-                page,
-                lab_sample_id.group(1) if lab_sample_id else "",
-                data_set_id.group(1) if data_set_id else "",
-                text,
-            )
+    """
+    Adds the bookmarks that rules match on the pages of pdf to bookmark_store.
+
+    Pages are streamed: each page's text is extracted, matched and dropped before
+    the next one is read, so only the matched titles (and sort keys when
+    reordering) of the file are held at once.
+
+    :param parent_bookmark: Index of the parent bookmark in bookmark_store, or None.
+    :param page_matches: The matched titles of every page of pdf, if a reorder step
+        already evaluated the rules with page_rule_matcher.
+    :return: The indices of the added bookmarks.
+    """
+    if page_matches is not None:
+        pages = enumerate(page_matches)
+    elif not rules and not reorder_pages:
+        return []  # Nothing would read the text
+    elif reorder_pages:
+        keyed = sorted(
+            (key, page, titles)
+            for page, (key, titles) in enumerate(iter_page_matches(pdf, rules, True))
         )
+        pages = ((page, titles) for _, page, titles in keyed)
+    else:
+        pages = (
+            (page, titles)
+            for page, (_, titles) in enumerate(iter_page_matches(pdf, rules))
+        )
+
+    bookmarks = remove_consecutive_bookmarks(
+        (title, parent_page_num + page) for page, titles in pages for title in titles
+    )
 
-    if reorder_pages:
-        page_data.sort(key=lambda x: (x[1], x[2]))
-
-    for page, lab_sample_id, data_set_id, text in page_data:
-        # Skip pages with bottle preservation check text
-        if "merit laboratories bottle preservation check" in text.lower():
-            continue
-
-        for rule in rules:
-            if (rule["rule"] == "SAMPLEID") and (rule["bookmark_name"] == "SAMPLEID"):
-                # Look for the standard Merit Sample ID format
-                expression_standard = re.compile(
-                    r"(?<!-)(?<!Report ID: )(S\d{5}\.\d{2})(?!-)"
-                )  # Negative lookbehind to exclude "Report Id: S12345.67"
-
-                matches = expression_standard.findall(text)
-                if (
-                    matches and len(set(matches)) == 1
-                ):  # Ensure all matches are the same
-                    bookmark = BookmarkItem(
-                        title=matches[0],
-                        page=parent_page_num + page,
-                        parent=parent_bookmark,
-                        id=str(uuid.uuid4()),
-                    )
-                    bookmarks.append(bookmark)
-            elif qualify_filename(rule["rule"], text):
-                bookmark = BookmarkItem(
-                    title=rule["bookmark_name"],
-                    page=parent_page_num + page,
-                    parent=parent_bookmark,
-                    id=str(uuid.uuid4()),
-                )
-                bookmarks.append(bookmark)
-
-    bookmarks = remove_consecutive_bookmarks(bookmarks)
-
-    return bookmarks
+    return [
+        bookmark_store.add(title, page, parent=parent_bookmark)
+        for title, page in bookmarks
+    ]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from buildpdf.checkpoint import (
+    UNIT_PART,
+    BuildCheckpoint,
+    file_fingerprint,
+    fingerprint,
+)
+from buildpdf.composer import PageComposer
+from buildpdf.workspace import BuildWorkspace
+
+# Number of worker processes that compose the parts of a build. 0 composes the whole
+# PDF in the build process.
+PART_WORKERS_ENV = "PDFBUILDER_PART_WORKERS"
+DEFAULT_PART_WORKERS = 0
+
+
+def get_part_worker_count() -> int:
+    try:
+        return max(int(os.environ.get(PART_WORKERS_ENV, DEFAULT_PART_WORKERS)), 0)
+    except ValueError:
+        return DEFAULT_PART_WORKERS
+
+
+def render_part(part_path: str, source_paths: List[str]) -> Dict[str, int]:
+    """
+    Composes every page of the source PDFs, in order, into one PDF. Runs in a part
+    worker process.
+
+    :param part_path: Where the part is written.
+    :param source_paths: The PDFs the part consists of.
+    :return: The number of pages of the part and of shared resources it reused.
+    """
+    composer = PageComposer()
+    for path in source_paths:
+        composer.add_pages(PdfReader(path))
+    with open(part_path, "wb") as f:
+        composer.writer.write(f)
+    return {
+        "num_pages": len(composer.writer.pages),
+        "deduplicated_objects": composer.deduplicated_objects,
+    }
+
+
+class PartRenderer:
+    """
+    Composes a build in parts, each in a worker process, and stitches them together.
+
+    Planned files are added with the number of the part they belong to. A part is
+    handed to a worker as soon as the first file of the next part arrives, so parts
+    render while later ones are still being planned. Parts carry no outline: pass one
+    plans every bookmark with its final page number, and the outline is added once
+    after stitching. With a checkpoint, rendered parts are kept for a resumed build,
+    and parts whose sources haven't changed are not rendered again.
+
+    Usage:
+        with PartRenderer(workspace, max_workers=4) as parts:
+            parts.add(0, pdf, "qc.pdf", 3)
+            parts.add(1, other, "metals.pdf", 12)
+            parts.stitch(composer)
+    """
+
+    def __init__(
+        self,
+        workspace: BuildWorkspace,
+        max_workers: int,
+        checkpoint: BuildCheckpoint = None,
+    ):
+        self.workspace = workspace
+        self.max_workers = max_workers
+        self.checkpoint = checkpoint
+        # Pages added so far, which is also the writer index of the next page
+        self.num_pages = 0
+        self.deduplicated_objects = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._part: Any = None
+        self._sources: List[str] = []
+        # Fingerprints of the sources of the current part, for its checkpoint key
+        self._source_keys: List[Any] = []
+        # (path, rendering, checkpoint key if it is to be saved) of every part
+        self._rendering: List[Tuple[str, Future, Optional[str]]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def add(self, part: Any, pdf: PdfReader, path: str, num_pages: int) -> None:
+        """
+        Adds every page of a planned PDF to the end of a part.
+
+        :param part: The part the PDF belongs to. Parts must be added one after another.
+        :param pdf: The opened PDF. Only written to the workspace if path isn't a file,
+            like the combined PDF of a reordered FileType.
+        :param path: The path the PDF was read from.
+        :param num_pages: The number of pages of the PDF.
+        """
+        if part != self._part:
+            self._submit()
+            self._part = part
+        if os.path.isfile(path):
+            self._source_keys.append(file_fingerprint(path))
+        else:
+            path = self.workspace.new_path("part_source.pdf")
+            pdf.stream.seek(0)
+            data = pdf.stream.read()
+            with open(path, "wb") as f:
+                f.write(data)
+            self.workspace.track(path)
+            self._source_keys.append(hashlib.sha1(data).hexdigest())
+        self._sources.append(path)
+        self.num_pages += num_pages
+
+    def stitch(self, composer: PageComposer) -> None:
+        """
+        Appends the parts to the composer in order, each as soon as it is rendered.
+
+        :raises: The exception rendering a part raised.
+        """
+        self._submit()
+        for part_path, future, key in self._rendering:
+            rendered = future.result()
+            self.deduplicated_objects += rendered["deduplicated_objects"]
+            if self.checkpoint is None:
+                self.workspace.track(part_path)
+                # The reader holds the whole file in memory, so the part can go now
+                composer.add_pages(PdfReader(part_path))
+                self.workspace.release(part_path)
+                continue
+            if key is not None:
+                self.checkpoint.save(UNIT_PART, key, rendered, [part_path])
+            composer.add_pages(PdfReader(part_path))
+        self._rendering = []
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _submit(self) -> None:
+        if not self._sources:
+            return
+        sources, self._sources = self._sources, []
+        source_keys, self._source_keys = self._source_keys, []
+        key = None
+        if self.checkpoint is None:
+            part_path = self.workspace.new_path(f"part_{len(self._rendering)}.pdf")
+        else:
+            key = fingerprint(source_keys)
+            part_path = os.path.join(self.checkpoint.subdir(UNIT_PART, key), "part.pdf")
+            saved = self.checkpoint.load(UNIT_PART, key)
+            if saved is not None:
+                rendered = Future()
+                rendered.set_result(saved)
+                self._rendering.append((part_path, rendered, None))
+                return
+        # Workers are only started once there is a part to render
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._rendering.append(
+            (part_path, self._executor.submit(render_part, part_path, sources), key)
+        )
@@ -0,0 +1,283 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from PyPDF2 import PdfReader
+
+from buildpdf.conversion_pool import ConversionPool
+
+# Number of FileTypes each stage may run ahead of the next one
+PIPELINE_DEPTH_ENV = "PDFBUILDER_PIPELINE_DEPTH"
+DEFAULT_PIPELINE_DEPTH = 4
+
+# Marks the end of a stage's output
+_DONE = object()
+# How often threads blocked on a full or empty queue check whether the build stopped
+_POLL_SECONDS = 0.1
+
+
+def get_pipeline_depth() -> int:
+    try:
+        return max(int(os.environ.get(PIPELINE_DEPTH_ENV, DEFAULT_PIPELINE_DEPTH)), 1)
+    except ValueError:
+        return DEFAULT_PIPELINE_DEPTH
+
+
+class ScannedFile:
+    """
+    One source PDF of a FileType after the scan stage, ready to be planned.
+
+    :param file: The report file, None for the combined PDF of a reordered FileType.
+    :param path: The path of the PDF, or a label for a reordered FileType.
+    :param pdf: The opened PDF, None if it could not be converted or is a table of
+        contents planned from its estimated page count.
+    :param page_matches: The bookmark titles the rules matched on every page, None
+        if the file has no rules.
+    :param outline: The (depth, title, page index) items of its existing outline,
+        None if the existing bookmarks are not kept.
+    :param outline_error: Why reading the outline stopped early, if it did.
+    :param problems: Entries for problematic_files found while scanning.
+    """
+
+    __slots__ = (
+        "file",
+        "path",
+        "pdf",
+        "num_pages",
+        "page_matches",
+        "outline",
+        "outline_error",
+        "problems",
+    )
+
+    def __init__(self, file: Optional[Dict[str, Any]], path: str):
+        self.file = file
+        self.path = path
+        self.pdf: Optional[PdfReader] = None
+        self.num_pages = 0
+        self.page_matches: Optional[List[List[str]]] = None
+        self.outline: Optional[List[Tuple[int, str, int]]] = None
+        self.outline_error: Optional[str] = None
+        self.problems: List[Dict[str, Any]] = []
+
+
+class BuildPipeline:
+    """
+    Runs the stages of a build concurrently, connected by bounded queues.
+
+    Leaves (FileTypes) flow in report order through three stages:
+
+    1. conversion: convert(leaf) converts its DOCX files, several leaves at once on
+       a ConversionPool.
+    2. scanning: scan(leaf) opens its PDFs and evaluates the bookmark rules on a
+       scan thread.
+    3. planning: the caller takes the scanned leaves in order with result(leaf),
+       assigns page numbers and bookmarks, and passes each composed item to
+       compose(item).
+
+    compose runs on a composer thread that writes the items in order while later
+    leaves are still being converted and scanned. Each stage is at most depth
+    leaves ahead of the next, so memory stays bounded. Errors of the background
+    stages are raised in the planning thread when it reaches the failed leaf.
+
+    Usage:
+        with BuildPipeline(leaves, convert, scan, compose) as pipeline:
+            pipeline.start()
+            for leaf in leaves:
+                scanned = pipeline.result(leaf)
+                pipeline.compose(...)
+            pipeline.finish()
+    """
+
+    def __init__(
+        self,
+        leaves: Sequence[Any],
+        convert: Optional[Callable[[Any], None]],
+        scan: Callable[[Any], Any],
+        compose: Callable[[Any], None],
+        depth: int = None,
+    ):
+        """
+        :param leaves: The leaves in the order the planning thread takes them.
+        :param convert: Converts the DOCX files of a leaf in place, None to skip the
+            conversion stage.
+        :param scan: Returns the scanned form of a converted leaf.
+        :param compose: Writes one planned item into the output.
+        :param depth: How far each stage may run ahead. Defaults to the
+            PDFBUILDER_PIPELINE_DEPTH environment variable.
+        """
+        self.leaves = list(leaves)
+        self.convert = convert
+        self.scan = scan
+        self._compose = compose
+        self.depth = depth or get_pipeline_depth()
+        # Seconds each stage spent working. Conversion is summed over its threads.
+        self.busy = {"conversion": 0.0, "scanning": 0.0, "composition": 0.0}
+        self._scan_queue: queue.Queue = queue.Queue(maxsize=self.depth)
+        self._result_queue: queue.Queue = queue.Queue(maxsize=self.depth)
+        self._compose_queue: queue.Queue = queue.Queue(maxsize=self.depth)
+        self._stopped = threading.Event()
+        self._compose_error: Optional[BaseException] = None
+        self._threads: List[threading.Thread] = []
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._busy_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        for name, target in (
+            ("build-convert", self._run_conversion),
+            ("build-scan", self._run_scan),
+            ("build-compose", self._run_composition),
+        ):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def result(self, leaf: Any) -> Any:
+        """
+        Waits for the scanned form of leaf, the next leaf in order.
+
+        :raises: The exception the conversion or scan of leaf raised.
+        """
+        entry = self._get(self._result_queue)
+        if entry is _DONE:
+            if self._compose_error is not None:
+                raise self._compose_error
+            raise RuntimeError("The build pipeline stopped before planning finished")
+        scanned_leaf, scanned, error = entry
+        if scanned_leaf is not leaf:
+            raise RuntimeError("Leaves were planned in a different order than scanned")
+        if error is not None:
+            raise error
+        return scanned
+
+    def compose(self, item: Any) -> None:
+        """Queues item for the composer thread, after every item queued before it."""
+        self._put(self._compose_queue, item)
+        if self._compose_error is not None:
+            raise self._compose_error
+
+    def finish(self) -> None:
+        """
+        Waits until every queued item is composed.
+
+        :raises: The exception compose raised, if any.
+        """
+        self._put(self._compose_queue, _DONE)
+        for thread in self._threads:
+            thread.join()
+        self._finished_at = time.perf_counter()
+        if self._compose_error is not None:
+            raise self._compose_error
+
+    def close(self) -> None:
+        """Stops every stage. Does nothing after finish()."""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+    def summary(self) -> str:
+        wall = (self._finished_at or time.perf_counter()) - (self._started_at or 0.0)
+        stages = ", ".join(
+            f"{name} {seconds:.1f}s" for name, seconds in self.busy.items()
+        )
+        return f"Pipeline stages busy: {stages}; wall clock {wall:.1f}s"
+
+    def _timed(self, stage: str, func: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._busy_lock:
+                self.busy[stage] += time.perf_counter() - started
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        while not self._stopped.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        while not self._stopped.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _run_conversion(self) -> None:
+        if self.convert is None:
+            for leaf in self.leaves:
+                if not self._put(self._scan_queue, (leaf, None)):
+                    return
+            self._put(self._scan_queue, _DONE)
+            return
+
+        with ConversionPool() as pool:
+            # Conversions run concurrently but are handed on in report order
+            pending = deque()
+            for leaf in self.leaves:
+                if self._stopped.is_set():
+                    return
+                pending.append(
+                    (leaf, pool.submit(self._timed, "conversion", self.convert, leaf))
+                )
+                if len(pending) >= self.depth and not self._forward(*pending.popleft()):
+                    return
+            while pending:
+                if not self._forward(*pending.popleft()):
+                    return
+        self._put(self._scan_queue, _DONE)
+
+    def _forward(self, leaf: Any, future) -> bool:
+        while not self._stopped.is_set():
+            try:
+                error = future.exception(timeout=_POLL_SECONDS)
+            except FutureTimeoutError:
+                continue
+            return self._put(self._scan_queue, (leaf, error))
+        return False
+
+    def _run_scan(self) -> None:
+        while True:
+            entry = self._get(self._scan_queue)
+            if entry is _DONE:
+                self._put(self._result_queue, _DONE)
+                return
+            leaf, error = entry
+            scanned = None
+            if error is None:
+                try:
+                    scanned = self._timed("scanning", self.scan, leaf)
+                except Exception as e:
+                    error = e
+            if not self._put(self._result_queue, (leaf, scanned, error)):
+                return
+
+    def _run_composition(self) -> None:
+        while True:
+            item = self._get(self._compose_queue)
+            if item is _DONE:
+                return
+            try:
+                self._timed("composition", self._compose, item)
+            except Exception as e:
+                # The planning thread raises it on its next call, the other stages stop
+                self._compose_error = e
+                self._stopped.set()
+                return
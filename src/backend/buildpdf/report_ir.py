@@ -0,0 +1,213 @@
+import os
+from typing import Any, Dict, List, Optional, Union
+
+from validate import file_type_paths, file_type_problems, stat_paths
+
+MULTIPLE_TOC_ERROR = "Error: There is more than one table of contents"
+
+
+def docx_template_to_file_type(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts a legacy DocxTemplate node to the equivalent FileType node.
+    """
+    return {
+        "type": "FileType",
+        "id": data["id"],
+        "bookmark_name": data.get("bookmark_name"),
+        "directory_source": os.path.dirname(data["docx_path"]) or "./",
+        "filename_text_to_match": os.path.basename(data["docx_path"]),
+        "will_have_page_numbers": data.get("will_have_page_numbers", True),
+        "files": [],
+        "variables_in_doc": data.get("variables_in_doc", []),
+        "is_table_of_contents": data.get("is_table_of_contents", False),
+        "page_number_offset": data.get("page_number_offset", 0),
+        "page_start_col": data.get("page_start_col", 3),
+        "page_end_col": data.get("page_end_col"),
+        "docx_path": data["docx_path"],  # Keep original path for compatibility
+        "exists": data.get("exists", False),
+        "needs_update": data.get("needs_update", False),
+        "bookmark_rules": [],
+    }
+
+
+class SectionNode:
+    """
+    A Section of the report with its directory already resolved.
+
+    children holds SectionNode and FileTypeNode objects in report order.
+    has_files is filled in by CompiledReport.update_file_flags(). exists is
+    filled in when the report is validated and is None otherwise.
+    """
+
+    __slots__ = ("data", "directory", "children", "has_files", "exists")
+
+    def __init__(self, data: Dict[str, Any], directory: str):
+        self.data = data
+        self.directory = directory
+        self.children: List[Union["SectionNode", "FileTypeNode"]] = []
+        self.has_files = False
+        self.exists: Optional[bool] = None
+
+
+class FileTypeNode:
+    """
+    A FileType of the report with its source directory, template path and
+    variable replacements already resolved.
+    """
+
+    __slots__ = ("data", "section", "directory_source", "docx_path", "replacements")
+
+    def __init__(self, data: Dict[str, Any], section: SectionNode):
+        self.data = data
+        self.section = section
+        self.directory_source = os.path.normpath(
+            os.path.join(section.directory, data.get("directory_source", ""))
+        )
+        self.docx_path = None
+        if data.get("docx_path"):
+            self.docx_path = os.path.normpath(
+                os.path.join(section.directory, data["docx_path"])
+            )
+        self.replacements = _collect_replacements(data, section.data)
+
+
+class CompiledReport:
+    """
+    The report after one normalization pass, ready to be consumed by every later build stage.
+
+    :param root: The root section.
+    :param sections: Every section, parents before their children.
+    :param file_types: Every FileType, in report order.
+    :param errors: Validation problems found while compiling, in report order.
+    :param stats: os.stat results of every validated path, None for missing paths.
+    """
+
+    def __init__(self, root: SectionNode):
+        self.root = root
+        self.sections: List[SectionNode] = []
+        self.file_types: List[FileTypeNode] = []
+        self.errors: List[str] = []
+        self.stats: Dict[str, Optional[os.stat_result]] = {}
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self.root.data
+
+    def path_exists(self, path: str) -> bool:
+        """Answers from the validation stats when possible instead of stat'ing again."""
+        if path in self.stats:
+            return self.stats[path] is not None
+        return os.path.exists(path)
+
+    def update_file_flags(self, pending_docx: bool = False) -> None:
+        """
+        Recomputes SectionNode.has_files bottom-up in a single pass. Call it again
+        after a stage changes the files of a FileType, e.g. DOCX conversion.
+
+        :param pending_docx: Count FileTypes whose DOCX template is still to be
+            converted as having files.
+        """
+        for section in reversed(self.sections):
+            section.has_files = any(
+                child.has_files
+                if isinstance(child, SectionNode)
+                else bool(child.data.get("files"))
+                or (pending_docx and bool(child.docx_path))
+                for child in section.children
+            )
+
+
+def _collect_replacements(
+    file_type: Dict[str, Any], section: Dict[str, Any]
+) -> Dict[str, str]:
+    replacements = {}
+    if file_type.get("variable_replacements"):
+        replacements.update(file_type["variable_replacements"])
+    for var in section.get("variables") or []:
+        if var.get("template_text") and var.get("constant_value"):
+            replacements[var["template_text"]] = var["constant_value"]
+    return replacements
+
+
+def compile_report(
+    report: Dict[str, Any], validate: bool = True, cwd: str = ""
+) -> CompiledReport:
+    """
+    Normalizes, resolves and validates a report in a single walk over its sections.
+
+    The walk converts legacy DocxTemplate children to FileType, adds missing section
+    variables, passes section variables down to their FileTypes and resolves every
+    directory the same way PDFBuilder does. If validate is set, every path is then
+    stat'ed once, concurrently, and all path and table of contents problems are
+    collected instead of stopping at the first one.
+
+    :param report: The root section. It is normalized in place.
+    :param validate: Whether to check paths on disk.
+    :param cwd: The directory relative base directories are resolved against.
+    :return: The compiled report.
+    """
+    root = SectionNode(report, _section_directory(cwd, report))
+    compiled = CompiledReport(root)
+    _compile_section(root, compiled)
+    if validate:
+        _validate(compiled)
+    compiled.update_file_flags()
+    return compiled
+
+
+def _validate(compiled: CompiledReport) -> None:
+    paths = [section.directory for section in compiled.sections]
+    for file_type in compiled.file_types:
+        paths.extend(file_type_paths(file_type.data, file_type.section.directory))
+    compiled.stats = stat_paths(paths)
+
+    for section in compiled.sections:
+        section.exists = compiled.stats[section.directory] is not None
+    for file_type in compiled.file_types:
+        compiled.errors.extend(
+            file_type_problems(
+                file_type.data, file_type.section.directory, compiled.stats
+            )
+        )
+
+    # Like validate_table, only the top level of the report is checked
+    table_of_contents_count = sum(
+        1
+        for child in compiled.root.children
+        if isinstance(child, FileTypeNode)
+        and child.data.get("is_table_of_contents", False)
+    )
+    if table_of_contents_count > 1:
+        compiled.errors.append(MULTIPLE_TOC_ERROR)
+
+
+def _section_directory(parent_directory: str, section: Dict[str, Any]) -> str:
+    return os.path.normpath(
+        os.path.join(parent_directory, section.get("base_directory", ""))
+    )
+
+
+def _compile_section(node: SectionNode, compiled: CompiledReport) -> None:
+    section = node.data
+    if "variables" not in section:
+        section["variables"] = []
+    compiled.sections.append(node)
+
+    children = section.get("children", [])
+    for index, child in enumerate(children):
+        if not isinstance(child, dict):
+            continue
+        if child.get("type") == "DocxTemplate":
+            child = children[index] = docx_template_to_file_type(child)
+
+        if child.get("type") == "Section":
+            child_node = SectionNode(child, _section_directory(node.directory, child))
+            node.children.append(child_node)
+            _compile_section(child_node, compiled)
+        elif child.get("type") == "FileType":
+            child["will_have_page_numbers"] = False
+            # Variables are stored on the section but used by its FileTypes
+            child["variables"] = section["variables"]
+            file_type = FileTypeNode(child, node)
+            node.children.append(file_type)
+            compiled.file_types.append(file_type)
@@ -4,6 +4,7 @@ from docx2pdf import convert
 from PyPDF2 import PdfReader, PdfWriter
 import os
 import re
+import tempfile
 
 
 class TableEntry(BaseModel):
@@ -22,9 +23,10 @@ class TableDocument:
         page_end_col: int | None = None,
         skiprows: int = 2,
         page_number_offset: int = 0,
+        document=None,  # an already loaded Document to edit instead of docx_path
     ):
         self.docx_path = docx_path
-        self.doc = Document(docx_path)
+        self.doc = document if document is not None else Document(docx_path)
         self.table = self.doc.tables[0]
         self.table_entries: list[TableEntry] = []
         self.set_page_start_col(page_start_col)
@@ -163,15 +165,15 @@ class TableDocument:
         lines.append(indentation + text_without_indent)
         return "\n".join(lines)
 
-    def to_pdf(self) -> PdfReader:
-        temp_path_docx = "intermediate.docx"
-        temp_path_pdf = "intermediate.pdf"
-        self.doc.save(temp_path_docx)
-        convert(temp_path_docx, temp_path_pdf)
-        reader = PdfReader(temp_path_pdf)
-        os.remove(temp_path_docx)
-        os.remove(temp_path_pdf)
-        return reader
+    def to_pdf(self, scratch_dir: str | None = None) -> PdfReader:
+        # Intermediates go to a private directory (inside the build workspace when
+        # given) rather than the current working directory
+        with tempfile.TemporaryDirectory(dir=scratch_dir) as temp_dir:
+            temp_path_docx = os.path.join(temp_dir, "intermediate.docx")
+            temp_path_pdf = os.path.join(temp_dir, "intermediate.pdf")
+            self.doc.save(temp_path_docx)
+            convert(temp_path_docx, temp_path_pdf)
+            return PdfReader(temp_path_pdf)
 
     def save(self):
         path = "output.docx"
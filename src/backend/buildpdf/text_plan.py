@@ -0,0 +1,62 @@
+from typing import Any, Dict, List
+
+from buildpdf.report_ir import CompiledReport
+
+# Where the page text of a file, or of a reordered FileType, comes from
+TEXT_NONE = "none"  # Nothing reads the text, so it is never extracted
+TEXT_EXTRACT = "extract"  # Extracted once for the bookmark rules
+TEXT_REORDER = "reorder"  # Read by the reorder step, which also evaluates the rules
+
+
+class TextPlan:
+    """
+    The page text one file or reordered FileType needs during pass one.
+
+    Text is only needed to evaluate bookmark rules and to find reorder keys. The
+    bottle preservation check only decides which pages rules are applied to, so it
+    never needs text on its own.
+    """
+
+    __slots__ = ("source", "rules")
+
+    def __init__(self, source: str, rules: List[Dict[str, Any]]):
+        self.source = source
+        self.rules = rules
+
+    @property
+    def evaluates_rules(self) -> bool:
+        return bool(self.rules)
+
+
+def file_text_plan(file: Dict[str, Any], file_type: Dict[str, Any]) -> TextPlan:
+    """Plans a file of a FileType that is not reordered. Its own rules win over the FileType's."""
+    rules = file.get("bookmark_rules") or file_type.get("bookmark_rules") or []
+    return TextPlan(TEXT_EXTRACT if rules else TEXT_NONE, rules)
+
+
+def plan_text_extraction(compiled: CompiledReport) -> Dict[str, TextPlan]:
+    """
+    Works out, before the pipeline starts, which files need their page text and why.
+
+    :param compiled: The compiled report. Files its DOCX conversion adds later are
+        planned by the scan stage with file_text_plan.
+    :return: The plan of every reordered FileType by FileType id, and of every file
+        of the other FileTypes by file id.
+    """
+    plans = {}
+    for file_type in compiled.file_types:
+        data = file_type.data
+        if data.get("reorder_pages_metals") or data.get("reorder_pages_datetime"):
+            plans[data["id"]] = TextPlan(TEXT_REORDER, data.get("bookmark_rules") or [])
+            continue
+        for file in data.get("files", []):
+            if isinstance(file, dict) and "id" in file:
+                plans[file["id"]] = file_text_plan(file, data)
+    return plans
+
+
+def summarize_text_plan(plans: Dict[str, TextPlan]) -> Dict[str, int]:
+    summary = {TEXT_NONE: 0, TEXT_EXTRACT: 0, TEXT_REORDER: 0}
+    for plan in plans.values():
+        summary[plan.source] += 1
+    return summary
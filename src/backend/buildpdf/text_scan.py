@@ -0,0 +1,412 @@
+import math
+import os
+import re
+from typing import Dict, Iterator, List, Optional
+
+from PyPDF2 import PageObject
+from PyPDF2._cmap import build_char_map, unknown_char_map
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+
+# Set to 0 to always use PyPDF2's extract_text for bookmark rules
+TEXT_SCAN_ENV = "PDFBUILDER_TEXT_SCAN"
+# Only scan this many bytes of each page's content streams. 0 scans everything.
+TEXT_SCAN_MAX_BYTES_ENV = "PDFBUILDER_TEXT_SCAN_MAX_BYTES"
+
+# Same as the space_width default of PageObject.extract_text
+_SPACE_WIDTH = 200.0
+
+_TOKEN = re.compile(
+    rb"\((?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*\)"  # literal string, one nesting level
+    rb"|<[0-9A-Fa-f\s]*>"  # hex string
+    rb"|/[^\s/\[\]()<>{}%]*"  # name
+    rb"|[+-]?(?:\d+\.?\d*|\.\d+)"  # number
+    rb"|[A-Za-z'\"*]+|\[|\]",  # operator or array bracket
+    re.S,
+)
+_OPERAND_START = frozenset(b"(</+-.0123456789")
+_STRING_START = frozenset(b"(<")
+_ESCAPE = re.compile(rb"\\([nrtbf()\\]|[0-7]{1,3}|\r\n|\r|\n)")
+_ESCAPES = {
+    b"n": b"\n",
+    b"r": b"\r",
+    b"t": b"\t",
+    b"b": b"\b",
+    b"f": b"\f",
+    b"(": b"(",
+    b")": b")",
+    b"\\": b"\\",
+}
+_RIGHT_TO_LEFT = re.compile("[\u0590-\u08ff\ufb1d-\ufdff\ufe70-\ufeff]")
+_IDENTITY = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+
+
+class UnsupportedContent(Exception):
+    """The page needs PyPDF2's full text extraction."""
+
+
+def text_scan_enabled() -> bool:
+    return os.environ.get(TEXT_SCAN_ENV, "1").strip().lower() not in (
+        "0",
+        "false",
+        "no",
+    )
+
+
+def text_scan_max_bytes() -> Optional[int]:
+    try:
+        max_bytes = int(os.environ.get(TEXT_SCAN_MAX_BYTES_ENV, "0"))
+    except ValueError:
+        return None
+    return max_bytes if max_bytes > 0 else None
+
+
+def _unescape(raw: bytes) -> bytes:
+    if b"\\" not in raw:
+        return raw
+
+    def replace(match):
+        escape = match.group(1)
+        if escape in _ESCAPES:
+            return _ESCAPES[escape]
+        if escape[:1] in (b"\r", b"\n"):
+            return b""  # Line continuation
+        return bytes((int(escape, 8) & 0xFF,))
+
+    return _ESCAPE.sub(replace, raw)
+
+
+def _string(token: bytes) -> bytes:
+    if token[0] == 40:  # (
+        return _unescape(token[1:-1])
+    hex_digits = re.sub(rb"\s", b"", token[1:-1])
+    if len(hex_digits) % 2:
+        hex_digits += b"0"
+    return bytes.fromhex(hex_digits.decode("ascii"))
+
+
+def _mult(m: List[float], n: List[float]) -> List[float]:
+    return [
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+class _Font:
+    """A font's space width and a decoder from shown strings to text."""
+
+    __slots__ = ("space_width", "encoding", "table", "undecodable")
+
+    def __init__(self, space_width: float, encoding, char_map: Dict):
+        self.space_width = space_width
+        self.encoding = encoding
+        # char_map applied with str.translate. With a byte encoding, the encoding
+        # is folded into the same table, indexed by byte.
+        if isinstance(encoding, str):
+            self.table = {
+                ord(c): t
+                for c, t in char_map.items()
+                if isinstance(c, str) and len(c) == 1
+            }
+            self.undecodable = None
+        else:
+            self.table = {}
+            undecodable = []
+            for byte in range(256):
+                if byte in encoding:
+                    text = encoding[byte]
+                elif byte < 128:
+                    text = chr(byte)
+                else:
+                    undecodable.append(byte)
+                    continue
+                self.table[byte] = "".join(char_map.get(c, c) for c in text)
+            self.undecodable = (
+                re.compile(b"[" + b"".join(b"\\x%02x" % b for b in undecodable) + b"]")
+                if undecodable
+                else None
+            )
+
+    def decode(self, raw: bytes) -> str:
+        encoding = self.encoding
+        if self.undecodable is None and isinstance(encoding, str):
+            try:
+                text = raw.decode(encoding, "surrogatepass")
+            except Exception:
+                try:
+                    text = raw.decode(
+                        "utf-16-be" if encoding == "charmap" else "charmap",
+                        "surrogatepass",
+                    )
+                except Exception:
+                    raise UnsupportedContent()
+        elif self.undecodable is not None and self.undecodable.search(raw):
+            raise UnsupportedContent()
+        else:
+            text = raw.decode("latin-1")
+        text = text.translate(self.table)
+        if _RIGHT_TO_LEFT.search(text):
+            raise UnsupportedContent()
+        return text
+
+
+_DEFAULT_FONT = _Font(500.0, "charmap", {})
+
+
+class PageTextScanner:
+    """
+    Extracts page text for bookmark rules by scanning content streams directly.
+
+    PageObject.extract_text parses every content stream into PyPDF2 objects and
+    rebuilds the character map of every font on every page. The scanner tokenizes
+    the decoded content streams with one regular expression, keeps only the text
+    state and text-show operators, and builds each font's character map once per
+    source PDF. Line breaks and spaces follow the same rules as extract_text, so
+    rules see the same text.
+
+    Pages with rotated or right-to-left text, inline images, or text inside form
+    XObjects are handed to extract_text instead.
+
+    Usage:
+        scanner = PageTextScanner()
+        texts = [scanner.page_text(page) for page in reader.pages]
+    """
+
+    def __init__(self, max_bytes: int = None, enabled: bool = None):
+        """
+        :param max_bytes: Only scan this many bytes of each page's content. Text
+            shown after that is not returned. None scans everything.
+        :param enabled: Whether to scan at all, or always use extract_text. Defaults
+            to the PDFBUILDER_TEXT_SCAN environment variable, which defaults to on.
+        """
+        self.max_bytes = max_bytes
+        self.enabled = text_scan_enabled() if enabled is None else enabled
+        self.scanned_pages = 0
+        self.extracted_pages = 0
+        # Font object number -> font
+        self._fonts: Dict[int, _Font] = {}
+
+    def page_text(self, page: PageObject) -> str:
+        """Returns the text of page, scanned if possible and extracted otherwise."""
+        if self.enabled:
+            try:
+                text = self.scan(page)
+                self.scanned_pages += 1
+                return text
+            except UnsupportedContent:
+                pass
+        self.extracted_pages += 1
+        return page.extract_text()
+
+    def scan(self, page: PageObject) -> str:
+        """
+        Returns the text of page from its content streams.
+
+        :raises UnsupportedContent: If the page needs extract_text.
+        """
+        resources = page
+        while "/Resources" not in resources:
+            if "/Parent" not in resources:
+                return ""  # No resources means no fonts, so no text
+            resources = resources["/Parent"].get_object()
+        resources = resources["/Resources"]
+        if "/Contents" not in page:
+            return ""
+        data = self._content_data(page["/Contents"])
+        return self._scan(page, resources, data)
+
+    def _content_data(self, contents) -> bytes:
+        if not isinstance(contents, ArrayObject):
+            contents = [contents]
+        data = b"\n".join(stream.get_object().get_data() for stream in contents)
+        if self.max_bytes is not None:
+            data = data[: self.max_bytes]
+        return data
+
+    def _font(self, page: PageObject, fonts, name: str) -> _Font:
+        reference = fonts.raw_get(name) if name in fonts else None
+        if reference is None:
+            return _Font(*unknown_char_map[1:4])
+        key = reference.idnum if isinstance(reference, IndirectObject) else None
+        if key is not None and key in self._fonts:
+            return self._fonts[key]
+        try:
+            _, space_width, encoding, char_map, _ = build_char_map(
+                name, _SPACE_WIDTH, page
+            )
+        except Exception:
+            raise UnsupportedContent()
+        font = _Font(space_width, encoding, char_map)
+        if key is not None:
+            self._fonts[key] = font
+        return font
+
+    def _scan(self, page: PageObject, resources: DictionaryObject, data: bytes) -> str:
+        fonts = resources["/Font"] if "/Font" in resources else DictionaryObject()
+        xobjects = resources["/XObject"] if "/XObject" in resources else None
+
+        output: List[str] = []
+        last = ""  # Last character of output
+        segment = False  # Whether text was shown since the last flush of extract_text
+        cm = list(_IDENTITY)
+        cm_stack = []
+        tm = list(_IDENTITY)
+        tm_prev = list(_IDENTITY)
+        font = _DEFAULT_FONT
+        space_width = font.space_width
+        leading = 0.0
+        font_size = 12.0
+
+        def moved():
+            """Adds the line break or space extract_text adds when the position moves."""
+            nonlocal last, segment, tm_prev
+            m = _mult(tm, cm)
+            if m[3] <= 1e-6:
+                raise UnsupportedContent()  # Rotated or upside down text
+            delta_x = m[4] - tm_prev[4]
+            delta_y = m[5] - tm_prev[5]
+            f = font_size * math.sqrt(abs(m[0] * m[3]) + abs(m[1] * m[2]))
+            tm_prev = m
+            if delta_y < -0.8 * f:
+                if last and last != "\n":
+                    output.append("\n")
+                    last, segment = "\n", False
+            elif abs(delta_y) < f * 0.3 and abs(delta_x) > space_width / 1000 * f * 15:
+                if last and last != " ":
+                    output.append(" ")
+                    last, segment = " ", True
+
+        operands: List[bytes] = []
+        array: Optional[List[bytes]] = None
+        dirty = True  # Whether the text position may have changed since moved()
+        tokens = _TOKEN.findall(data)
+        if b"ID" in tokens:
+            raise UnsupportedContent()  # Inline image data can look like anything
+
+        for token in tokens:
+            first = token[0]
+            if first in _OPERAND_START:
+                (operands if array is None else array).append(token)
+                continue
+            if first == 91:  # [
+                array = []
+                continue
+            if first == 93:  # ]
+                if array is not None:
+                    operands.append(array)
+                    array = None
+                continue
+
+            # An operator. The text and its position are handled like extract_text.
+            array = None
+            try:
+                if token == b"TJ":
+                    for item in operands[0]:
+                        if item[0] in _STRING_START:
+                            text = font.decode(_string(item))
+                            if text:
+                                output.append(text)
+                                last, segment = text[-1], True
+                        elif (
+                            abs(float(item)) >= space_width
+                            and segment
+                            and last != " "
+                        ):
+                            # Kerning as wide as a space inside a TJ array is a space
+                            output.append(" ")
+                            last = " "
+                        if dirty:
+                            moved()
+                            dirty = False
+                elif token == b"Tj":
+                    text = font.decode(_string(operands[0]))
+                    if text:
+                        output.append(text)
+                        last, segment = text[-1], True
+                    if dirty:
+                        moved()
+                        dirty = False
+                elif token == b"Td" or token == b"TD":
+                    tx, ty = float(operands[0]), float(operands[1])
+                    if token == b"TD":
+                        leading = -ty
+                    tm[4] += tx * tm[0] + ty * tm[2]
+                    tm[5] += tx * tm[1] + ty * tm[3]
+                    moved()
+                    dirty = False
+                elif token == b"Tm":
+                    tm = [float(x) for x in operands[:6]]
+                    moved()
+                    dirty = False
+                elif token == b"T*" or token == b"'" or token == b'"':
+                    tm[5] -= leading
+                    moved()
+                    dirty = False
+                    if token != b"T*":
+                        text = font.decode(_string(operands[-1]))
+                        if text:
+                            output.append(text)
+                            last, segment = text[-1], True
+                elif token == b"Tf":
+                    segment = False
+                    font = self._font(page, fonts, operands[0].decode("latin-1"))
+                    space_width = font.space_width
+                    try:
+                        font_size = float(operands[1])
+                    except (IndexError, ValueError):
+                        pass
+                elif token == b"BT":
+                    segment = False
+                    tm = list(_IDENTITY)
+                    dirty = True
+                elif token == b"ET":
+                    segment = False
+                elif token == b"TL":
+                    leading = float(operands[0])
+                elif token == b"q":
+                    cm_stack.append(
+                        (cm, font, font_size, space_width, leading)
+                    )
+                elif token == b"Q":
+                    if cm_stack:
+                        (
+                            cm,
+                            font,
+                            font_size,
+                            space_width,
+                            leading,
+                        ) = cm_stack.pop()
+                    else:
+                        cm = list(_IDENTITY)
+                    dirty = True
+                elif token == b"cm":
+                    segment = False
+                    cm = _mult([float(x) for x in operands[:6]], cm)
+                    dirty = True
+                elif token == b"Do":
+                    segment = False
+                    if last and last != "\n":
+                        output.append("\n")
+                        last = "\n"
+                    name = operands[0].decode("latin-1")
+                    xobject = xobjects[name] if xobjects is not None else None
+                    if xobject is None or xobject.get("/Subtype") != "/Image":
+                        raise UnsupportedContent()  # Text can be inside a form
+            except (IndexError, KeyError, TypeError, ValueError, AttributeError):
+                raise UnsupportedContent()
+            operands.clear()
+        return "".join(output)
+
+
+def iter_page_texts(pdf) -> Iterator[str]:
+    """
+    Yields the text of every page of pdf, one page at a time.
+
+    :param pdf: A PdfReader.
+    """
+    scanner = PageTextScanner(max_bytes=text_scan_max_bytes())
+    for page in pdf.pages:
+        yield scanner.page_text(page)
@@ -0,0 +1,372 @@
+import importlib
+import multiprocessing
+import os
+import platform
+import threading
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from buildpdf.checkpoint import BuildCheckpoint, get_checkpoints_enabled
+from buildpdf.report_ir import CompiledReport, FileTypeNode, compile_report
+from buildpdf.workspace import BuildWorkspace, WorkspaceQuotaExceeded
+from profile_imports import HEAVY_MODULES
+
+# Conditionally import pythoncom on Windows
+if platform.system() == "Windows":
+    import pythoncom
+else:
+    pythoncom = None
+
+# Number of warm build worker processes. 0 runs builds inside the API process.
+BUILD_WORKERS_ENV = "PDFBUILDER_BUILD_WORKERS"
+DEFAULT_BUILD_WORKERS = 2
+
+
+class BuildValidationError(Exception):
+    pass
+
+
+def get_build_worker_count() -> int:
+    try:
+        return max(int(os.environ.get(BUILD_WORKERS_ENV, DEFAULT_BUILD_WORKERS)), 0)
+    except ValueError:
+        return DEFAULT_BUILD_WORKERS
+
+
+def preload_modules() -> None:
+    """Imports the PDF and DOCX libraries so later imports are free."""
+    for module in HEAVY_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Could not preload {module}: {e}")
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _estimated_table_of_contents(
+    node: Dict[str, Any], docx_path: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Plans a table of contents template from its estimated page count instead of
+    converting it. The build renders it once every bookmark is known, and again if
+    its length turns out different.
+
+    Returns:
+        The file entry of the template, or None if the estimate can't be trusted.
+    """
+    from buildpdf.docx_scanner import CONFIDENCE_HIGH, estimate_docx_pages
+
+    try:
+        estimate = estimate_docx_pages(docx_path)
+    except Exception as e:
+        print(f"Error estimating the page count of {docx_path}: {e}")
+        return None
+    if estimate["confidence"] != CONFIDENCE_HIGH:
+        return None
+    print(f"Planning {docx_path} with {estimate['num_pages']} estimated pages")
+    return {
+        "type": "FileData",
+        "id": str(uuid.uuid4()),
+        "file_path": docx_path,
+        "num_pages": estimate["num_pages"],
+        "num_pages_confidence": estimate["confidence"],
+        "bookmark_name": node.get("bookmark_name"),
+        "is_table_of_contents": True,
+    }
+
+
+def convert_file_type_docx(
+    file_type: FileTypeNode,
+    workspace: BuildWorkspace,
+    compiled: CompiledReport,
+    scratch_dir: str = None,
+    watchdog=None,
+) -> bool:
+    """
+    Converts the DOCX template and DOCX files of a FileType to PDFs in the build workspace.
+    A table of contents template whose page count can be estimated reliably is not
+    converted, since the build renders it at the end anyway.
+
+    Args:
+        file_type: The compiled FileType. Its files are updated in place.
+        workspace: The workspace the PDFs are tracked in.
+        compiled: The compiled report, whose validation stats are reused.
+        scratch_dir: The directory in the workspace the PDFs are written to. Defaults
+            to the workspace itself. FileTypes converted concurrently need their own,
+            so templates with the same filename don't overwrite each other.
+        watchdog: The ConversionWatchdog conversions run under, which records those
+            that fail for good.
+
+    Returns:
+        Whether every DOCX was converted. Files that failed keep their DOCX entry.
+    """
+    from buildpdf.convert_docx import convert_docx_template_to_pdf
+
+    scratch_dir = scratch_dir or workspace.path
+    converted = True
+
+    node = file_type.data
+    replacements = file_type.replacements
+
+    # Check if this is a DocxTemplate-converted FileType
+    docx_path = file_type.docx_path
+    planned = None
+    if (
+        docx_path
+        and docx_path.lower().endswith(".docx")
+        and node.get("is_table_of_contents", False)
+        and compiled.path_exists(docx_path)
+    ):
+        planned = _estimated_table_of_contents(node, docx_path)
+    if planned is not None:
+        node.setdefault("files", []).append(planned)
+    elif (
+        docx_path
+        and docx_path.lower().endswith(".docx")
+        and compiled.path_exists(docx_path)
+    ):
+        converted = False
+        try:
+            print(f"Converting docx_path to PDF: {docx_path}")
+            print(f"Using replacements: {replacements}")
+
+            pdf_reader, num_pages, pdf_path, modified_docx = (
+                convert_docx_template_to_pdf(
+                    docx_path=docx_path,
+                    replacements=replacements,
+                    is_table_of_contents=node.get("is_table_of_contents", False),
+                    page_start_col=node.get("page_start_col"),
+                    page_end_col=node.get("page_end_col"),
+                    scratch_dir=scratch_dir,
+                    watchdog=watchdog,
+                )
+            )
+
+            if pdf_path and os.path.exists(pdf_path):
+                # Create a new file entry for the PDF
+                pdf_file_data = {
+                    "type": "FileData",
+                    "id": str(uuid.uuid4()),
+                    "file_path": pdf_path,
+                    "num_pages": num_pages,
+                    "bookmark_name": node.get("bookmark_name"),
+                    # Rendered without page numbers, the build fills them in at the end
+                    "is_table_of_contents": node.get("is_table_of_contents", False),
+                }
+
+                # Add this file to the files list
+                if "files" not in node:
+                    node["files"] = []
+                node["files"].append(pdf_file_data)
+                workspace.track(pdf_path)
+                converted = True
+                print(f"Successfully converted docx_path to: {pdf_path}")
+        except WorkspaceQuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Error converting docx_path to PDF: {docx_path} - {str(e)}")
+            traceback.print_exc()
+
+    # Check all files in this FileType
+    updated_files = []
+    for file_data in node.get("files", []):
+        if isinstance(file_data, dict):
+            file_path = file_data.get("file_path", "")
+        else:
+            # Handle case where file_data might be a string
+            file_path = str(file_data)
+            file_data = {"file_path": file_path}
+
+        # If it's a DOCX file, convert it to PDF. A table of contents planned from
+        # its estimate is left to the build.
+        if file_path.lower().endswith(".docx") and not file_data.get(
+            "is_table_of_contents"
+        ):
+            source_path = os.path.normpath(
+                os.path.join(file_type.directory_source, file_path)
+            )
+            try:
+                print(f"Converting DOCX to PDF: {source_path}")
+                print(f"Using replacements: {replacements}")
+
+                pdf_reader, num_pages, pdf_path, _ = convert_docx_template_to_pdf(
+                    docx_path=source_path,
+                    replacements=replacements,
+                    scratch_dir=scratch_dir,
+                    watchdog=watchdog,
+                )
+
+                if pdf_path and os.path.exists(pdf_path):
+                    # Create a new file entry for the PDF
+                    pdf_file_data = {
+                        "type": "FileData",
+                        "id": str(uuid.uuid4()),
+                        "file_path": pdf_path,
+                        "num_pages": num_pages,
+                        "bookmark_name": file_data.get("bookmark_name"),
+                    }
+
+                    # Copy any other important attributes from the original file_data
+                    for key in file_data:
+                        if (
+                            key
+                            not in [
+                                "type",
+                                "id",
+                                "file_path",
+                                "num_pages",
+                                "num_pages_confidence",
+                            ]
+                            and key not in pdf_file_data
+                        ):
+                            pdf_file_data[key] = file_data[key]
+
+                    updated_files.append(pdf_file_data)
+                    workspace.track(pdf_path)
+                    print(f"Successfully converted to: {pdf_path}")
+                else:
+                    # Keep the original DOCX if conversion failed
+                    updated_files.append(file_data)
+                    converted = False
+                    print(f"Failed to convert DOCX to PDF: {source_path}")
+            except WorkspaceQuotaExceeded:
+                raise
+            except Exception as e:
+                print(f"Error converting DOCX to PDF: {source_path} - {str(e)}")
+                traceback.print_exc()
+                converted = False
+        else:
+            # Keep non-DOCX files as they are
+            updated_files.append(file_data)
+
+    # Update the files list
+    node["files"] = updated_files
+    return converted
+
+
+def run_build(
+    data: dict, output_path: str, optimize: bool = False, resume: bool = False
+) -> Dict[str, Any]:
+    """
+    Runs one complete build: compile and validate the report, then convert DOCX
+    files, compose the PDF and write it to output_path in one pipeline.
+
+    Runs in a build worker process, or in the API process when workers are disabled.
+
+    Args:
+        data: The report.
+        output_path: Where the PDF is saved.
+        optimize: Whether to compact the output before saving.
+        resume: Whether to reuse the checkpoints of an earlier build of output_path
+            that crashed or was cancelled.
+
+    Returns:
+        The PDFBuilder result, including problematic_files.
+
+    Raises:
+        BuildValidationError: If the report has path or table of contents problems.
+    """
+    from buildpdf.build import PDFBuilder
+
+    if pythoncom is not None:
+        pythoncom.CoInitialize()  # Initialize COM library only on Windows
+    # Intermediate DOCX and PDF files for this build live here, never next to the sources
+    workspace = BuildWorkspace()
+    checkpoint = None
+    try:
+        # Normalize, resolve and validate the report in a single pass
+        compiled = compile_report(data)
+        if compiled.errors:
+            # Report every problem at once so they can all be fixed before the next build
+            raise BuildValidationError("\n".join(compiled.errors))
+
+        # With checkpoints, expensive units are persisted outside the workspace until
+        # the build succeeds
+        if resume or get_checkpoints_enabled():
+            checkpoint = BuildCheckpoint(output_path, resume=resume)
+
+        # DOCX files of every FileType are converted by the build pipeline
+        builder = PDFBuilder(workspace=workspace, checkpoint=checkpoint)
+        return builder.generate_pdf(
+            compiled, output_path, optimize=optimize, convert_docx=True
+        )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        # Every intermediate of this build goes away with the workspace
+        workspace.cleanup()
+        if pythoncom is not None:
+            pythoncom.CoUninitialize()  # Uninitialize COM library only on Windows
+
+
+class BuildWorkerPool:
+    """
+    A small pool of build processes that have the PDF and DOCX libraries imported.
+
+    Workers are started with the spawn method on every platform, like they are in the
+    frozen Windows app, and keep running between builds. A worker that crashes
+    takes only its own build down, and the pool is recreated for the next build.
+
+    Usage:
+        pool = BuildWorkerPool()
+        pool.start()  # optional, warms the workers ahead of the first build
+        result = pool.run(report, output_path)
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = (
+            get_build_worker_count() if max_workers is None else max_workers
+        )
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=preload_modules,
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Spawns every worker now instead of on the first build."""
+        if self.max_workers <= 0:
+            return
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            executor.submit(_worker_ready)
+
+    def run(
+        self,
+        data: dict,
+        output_path: str,
+        optimize: bool = False,
+        resume: bool = False,
+    ) -> Dict[str, Any]:
+        if self.max_workers <= 0:
+            return run_build(data, output_path, optimize, resume)
+        executor = self._get_executor()
+        try:
+            return executor.submit(
+                run_build, data, output_path, optimize, resume
+            ).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+# Where build workspaces are created. Point this at fast local disk (NVMe or a RAM
+# disk); it should never be the network share the sources live on.
+SCRATCH_DIR_ENV = "PDFBUILDER_SCRATCH_DIR"
+# Maximum number of megabytes a single build may keep in its workspace. 0 disables the check.
+SCRATCH_QUOTA_ENV = "PDFBUILDER_SCRATCH_QUOTA_MB"
+DEFAULT_QUOTA_MB = 20 * 1024
+
+WORKSPACE_PREFIX = "pdfbuilder_build_"
+# Checkpoints of builds that failed, kept next to the workspaces for a resumed build
+CHECKPOINT_PREFIX = "pdfbuilder_checkpoint_"
+STALE_WORKSPACE_SECONDS = 24 * 60 * 60
+
+
+class WorkspaceQuotaExceeded(Exception):
+    pass
+
+
+def get_scratch_root() -> str:
+    root = os.environ.get(SCRATCH_DIR_ENV) or tempfile.gettempdir()
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def get_quota_bytes() -> int:
+    try:
+        quota_mb = int(os.environ.get(SCRATCH_QUOTA_ENV, DEFAULT_QUOTA_MB))
+    except ValueError:
+        quota_mb = DEFAULT_QUOTA_MB
+    return max(quota_mb, 0) * 1024 * 1024
+
+
+def cleanup_stale_workspaces(root: str = None) -> None:
+    """
+    Removes workspaces left behind by builds whose process was killed outright, and
+    checkpoints no build resumed within a day.
+    """
+    root = root or get_scratch_root()
+    cutoff = time.time() - STALE_WORKSPACE_SECONDS
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if (
+            not name.startswith((WORKSPACE_PREFIX, CHECKPOINT_PREFIX))
+            or not os.path.isdir(path)
+        ):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class BuildWorkspace:
+    """
+    A private scratch directory for every intermediate file of one build.
+
+    The directory is removed when the build leaves the with-block, whether it
+    succeeded, failed or was cancelled, and as a last resort when the object is
+    garbage collected or the interpreter exits.
+
+    Usage:
+        with BuildWorkspace() as workspace:
+            pdf_path = workspace.new_path("cover.pdf")
+            ...
+            workspace.track(pdf_path)
+    """
+
+    def __init__(self, root: str = None, quota_bytes: int = None):
+        self.root = root or get_scratch_root()
+        self.quota_bytes = get_quota_bytes() if quota_bytes is None else quota_bytes
+        self.path = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=self.root)
+        self.used_bytes = 0
+        self._tracked = {}
+        # Conversion and scan threads of a pipelined build track files concurrently
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(
+            self, shutil.rmtree, self.path, ignore_errors=True
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
+
+    def new_path(self, filename: str) -> str:
+        """Returns a unique path in the workspace that keeps filename's extension."""
+        stem, ext = os.path.splitext(os.path.basename(filename))
+        return os.path.join(self.path, f"{stem}_{uuid.uuid4().hex[:8]}{ext}")
+
+    def subdir(self, name: str) -> str:
+        path = os.path.join(self.path, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def track(self, path: str) -> None:
+        """
+        Accounts for a file written into the workspace and enforces the quota.
+
+        :raises WorkspaceQuotaExceeded: If the workspace grew beyond its quota.
+        """
+        if not path or not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        with self._lock:
+            self.used_bytes += size - self._tracked.get(path, 0)
+            self._tracked[path] = size
+            used_bytes = self.used_bytes
+        if self.quota_bytes and used_bytes > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Build workspace {self.path} uses {used_bytes} bytes, "
+                f"over the {self.quota_bytes} byte quota. Set {SCRATCH_QUOTA_ENV} "
+                f"or {SCRATCH_DIR_ENV} to change the limit or location."
+            )
+
+    def release(self, path: str) -> None:
+        """Deletes a workspace file early and gives its bytes back to the quota."""
+        with self._lock:
+            self.used_bytes -= self._tracked.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def cleanup(self) -> None:
+        self._finalizer()
@@ -0,0 +1,106 @@
+"""
+Measures how long `import api` takes, which is how long the editor waits for the backend.
+
+Runs the import in fresh interpreters with `python -X importtime`, prints the slowest
+modules of the fastest run, and exits with status 1 if the import is over budget or
+pulls in one of the heavy PDF/DOCX libraries, which only the endpoints and build
+workers that need them should import.
+
+Usage (from src/backend):
+    python profile_imports.py
+    python profile_imports.py --budget-ms 500 --runs 5 --top 30
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 400
+
+# Must stay out of `import api`. The build workers preload them instead, so the
+# first build doesn't pay for them.
+HEAVY_MODULES = (
+    "PyPDF2",
+    "lxml",
+    "docx",
+    "python_docx_replace",
+    "docx2pdf",
+    "buildpdf.convert_docx",
+    "buildpdf.build",
+    "initialization.extract_RPT",
+)
+
+
+def is_heavy(name: str) -> bool:
+    """Whether a module is one of HEAVY_MODULES or inside one of them."""
+    return any(name == heavy or name.startswith(heavy + ".") for heavy in HEAVY_MODULES)
+
+
+def profile_import(module: str = "api"):
+    """
+    Imports module in a fresh interpreter.
+
+    :return: The total import time in milliseconds, and a list of
+        (module name, cumulative milliseconds) for every module imported.
+    """
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header line
+        modules.append((name.strip(), int(cumulative) / 1000))
+
+    total_ms = next(ms for name, ms in reversed(modules) if name == module)
+    return total_ms, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Profile the import time of api.py")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help=f"Maximum import time in milliseconds (default {DEFAULT_BUDGET_MS})",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Number of imports to time (default 3)"
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Number of slowest modules to print"
+    )
+    args = parser.parse_args()
+
+    runs = [profile_import() for _ in range(max(args.runs, 1))]
+    total_ms, modules = min(runs, key=lambda run: run[0])
+
+    print(f"Slowest modules (cumulative, best of {len(runs)} runs):")
+    for name, ms in sorted(modules, key=lambda m: m[1], reverse=True)[: args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    print(f"import api: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    heavy = sorted({name for name, _ in modules if is_heavy(name)})
+    if heavy:
+        print(f"FAIL: import api loads heavy modules: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: import api is over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,7 @@ class FileData(BaseModel):
     id: str
     file_path: str
     num_pages: Optional[int] = None  # in this document
+    num_pages_confidence: Optional[str] = None  # of an estimated DOCX page count
     current_page_num: Optional[int] = None  # in the parent document
     bookmark_name: Optional[str] = None
 
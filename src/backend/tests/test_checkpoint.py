@@ -0,0 +1,59 @@
+import os
+
+from buildpdf.checkpoint import UNIT_SCAN, BuildCheckpoint
+
+
+def _saved(root, output_path):
+    checkpoint = BuildCheckpoint(output_path, root=root)
+    checkpoint.save(UNIT_SCAN, "key", {"path": checkpoint.path})
+    return checkpoint
+
+
+def test_concurrent_builds_use_their_own_directories(tmp_path):
+    output_path = str(tmp_path / "report.pdf")
+    first = _saved(str(tmp_path), output_path)
+    second = BuildCheckpoint(output_path, root=str(tmp_path))
+
+    assert first.path != second.path
+    # Starting the second build left the first one's checkpoints alone
+    assert os.path.exists(first._manifest_path(UNIT_SCAN, "key"))
+    first.close()
+    second.close()
+
+
+def test_resume_takes_over_the_most_recent_released_directory(tmp_path):
+    root, output_path = str(tmp_path), str(tmp_path / "report.pdf")
+    older = _saved(root, output_path)
+    older.close()
+    newer = _saved(root, output_path)
+    newer.close()
+
+    resumed = BuildCheckpoint(output_path, resume=True, root=root)
+
+    assert resumed.path == newer.path
+    assert resumed.load(UNIT_SCAN, "key") == {"path": newer.path}
+    resumed.close()
+
+
+def test_resume_skips_directories_of_running_builds(tmp_path):
+    root, output_path = str(tmp_path), str(tmp_path / "report.pdf")
+    failed = _saved(root, output_path)
+    failed.close()
+    running = _saved(root, output_path)
+
+    resumed = BuildCheckpoint(output_path, resume=True, root=root)
+
+    assert resumed.path == failed.path
+    resumed.close()
+    running.close()
+
+
+def test_resume_without_checkpoints_starts_from_scratch(tmp_path):
+    root = str(tmp_path)
+    _saved(root, str(tmp_path / "other.pdf")).close()
+
+    resumed = BuildCheckpoint(str(tmp_path / "report.pdf"), resume=True, root=root)
+
+    assert resumed.load(UNIT_SCAN, "key") is None
+    resumed.remove()
+    assert not os.path.exists(resumed.path)
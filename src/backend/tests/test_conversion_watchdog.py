@@ -0,0 +1,178 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from buildpdf import conversion_watchdog
+from buildpdf.conversion_watchdog import (
+    ConversionTimeout,
+    ConversionWatchdog,
+    report_word_process,
+)
+
+# Reading process states from /proc keeps the tests from killing anything themselves
+needs_proc = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="reads process states from /proc"
+)
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(60)"]
+
+
+# The converters run in a spawned process, so they are defined at module level
+def write_pdf(docx_path, pdf_path):
+    with open(pdf_path, "w") as f:
+        f.write("%PDF")
+
+
+def hang(docx_path, pdf_path):
+    with open(pdf_path + ".pids", "w") as f:
+        f.write(str(os.getpid()))
+    time.sleep(60)
+
+
+def hang_with_word(docx_path, pdf_path):
+    # Started outside the converter's process tree, like Word started through COM
+    word = subprocess.Popen(SLEEPER, start_new_session=True)
+    report_word_process(word.pid)
+    with open(pdf_path + ".pids", "w") as f:
+        f.write(f"{os.getpid()} {word.pid}")
+    time.sleep(60)
+
+
+def fail(docx_path, pdf_path):
+    with open(pdf_path + ".attempts", "a") as f:
+        f.write("x")
+    raise ValueError("Word says no")
+
+
+def fail_once(docx_path, pdf_path):
+    marker = pdf_path + ".failed"
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        raise ValueError("Word says no")
+    write_pdf(docx_path, pdf_path)
+
+
+def crash(docx_path, pdf_path):
+    os._exit(3)
+
+
+def _is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            state = f.read().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state != "Z"
+
+
+def _wait_until_gone(pid, seconds=5):
+    deadline = time.monotonic() + seconds
+    while _is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _is_running(pid)
+
+
+def _read_pids(pdf_path):
+    with open(pdf_path + ".pids") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "report.docx"), str(tmp_path / "report.pdf")
+
+
+def test_success_converts_once(paths):
+    docx_path, pdf_path = paths
+    watchdog = ConversionWatchdog(write_pdf, timeout=30, retries=2)
+
+    watchdog.convert(docx_path, pdf_path)
+
+    assert os.path.exists(pdf_path)
+    assert watchdog.failures == []
+
+
+@needs_proc
+def test_timeout_raises_and_kills_converter(paths):
+    docx_path, pdf_path = paths
+    watchdog = ConversionWatchdog(hang, timeout=2, retries=0)
+
+    with pytest.raises(ConversionTimeout):
+        watchdog.convert(docx_path, pdf_path)
+
+    (converter_pid,) = _read_pids(pdf_path)
+    assert _wait_until_gone(converter_pid)
+
+
+@needs_proc
+def test_timeout_kills_only_the_reported_word(paths):
+    docx_path, pdf_path = paths
+    # The Word instance of another conversion
+    sibling = subprocess.Popen(SLEEPER, start_new_session=True)
+    try:
+        watchdog = ConversionWatchdog(hang_with_word, timeout=2, retries=0)
+
+        with pytest.raises(ConversionTimeout):
+            watchdog.convert(docx_path, pdf_path)
+
+        converter_pid, word_pid = _read_pids(pdf_path)
+        assert _wait_until_gone(converter_pid)
+        assert _wait_until_gone(word_pid)
+        assert sibling.poll() is None
+    finally:
+        sibling.kill()
+        sibling.wait()
+
+
+def test_failures_are_retried_with_backoff(paths, monkeypatch):
+    docx_path, pdf_path = paths
+    delays = []
+    monkeypatch.setattr(conversion_watchdog.time, "sleep", delays.append)
+    watchdog = ConversionWatchdog(fail, timeout=30, retries=2, backoff_seconds=0.5)
+
+    with pytest.raises(RuntimeError, match="Word says no"):
+        watchdog.convert(docx_path, pdf_path, source_path="source.docx")
+
+    with open(pdf_path + ".attempts") as f:
+        assert f.read() == "xxx"
+    assert delays == [0.5, 1.0]
+    assert len(watchdog.failures) == 1
+    assert watchdog.failures[0]["path"] == "source.docx"
+    assert "after 3 attempts" in watchdog.failures[0]["error"]
+    assert watchdog.failure("source.docx") is watchdog.failures[0]
+
+
+def test_crashed_converter_is_retried(paths):
+    docx_path, pdf_path = paths
+    watchdog = ConversionWatchdog(crash, timeout=30, retries=1, backoff_seconds=0)
+
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        watchdog.convert(docx_path, pdf_path)
+
+    assert len(watchdog.failures) == 1
+    assert watchdog.failures[0]["path"] == docx_path
+
+
+def test_success_after_failure_returns(paths):
+    docx_path, pdf_path = paths
+    watchdog = ConversionWatchdog(fail_once, timeout=30, retries=2, backoff_seconds=0)
+
+    watchdog.convert(docx_path, pdf_path)
+
+    assert os.path.exists(pdf_path + ".failed")
+    assert os.path.exists(pdf_path)
+    assert watchdog.failures == []
+    assert watchdog.failure(docx_path) is None
+
+
+def test_no_timeout_converts_in_process(paths):
+    docx_path, pdf_path = paths
+    watchdog = ConversionWatchdog(fail, timeout=0, retries=0)
+
+    with pytest.raises(RuntimeError, match="ValueError: Word says no"):
+        watchdog.convert(docx_path, pdf_path)
+
+    assert len(watchdog.failures) == 1
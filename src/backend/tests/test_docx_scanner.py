@@ -0,0 +1,71 @@
+import docx
+import pytest
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from python_docx_replace import docx_get_keys
+
+from buildpdf.docx_scanner import scan_docx_keys
+
+VML_NS = "urn:schemas-microsoft-com:vml"
+
+
+def _append_xml(parent, xml):
+    parent.append(parse_xml(xml))
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    document = docx.Document()
+    document.add_paragraph("Top ${top}")
+    split = document.add_paragraph()
+    split.add_run("${sp")
+    split.add_run("lit}")
+    _append_xml(
+        document.add_paragraph("See ")._p,
+        f'<w:hyperlink {nsdecls("w")}><w:r><w:t>${{link}}</w:t></w:r></w:hyperlink>',
+    )
+    # A text box, which Paragraph.get_all doesn't read
+    _append_xml(
+        document.add_paragraph()._p,
+        f'<w:r {nsdecls("w")} xmlns:v="{VML_NS}"><w:pict><v:shape><v:textbox><w:txbxContent>'
+        f"<w:p><w:r><w:t>${{textbox}}</w:t></w:r></w:p>"
+        f"</w:txbxContent></v:textbox></v:shape></w:pict></w:r>",
+    )
+    # A content control around a paragraph, which isn't read either
+    _append_xml(
+        document.element.body,
+        f'<w:sdt {nsdecls("w")}><w:sdtContent><w:p><w:r><w:t>${{control}}</w:t>'
+        f"</w:r></w:p></w:sdtContent></w:sdt>",
+    )
+
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "${cell}"
+    table.cell(0, 1).add_table(rows=1, cols=1).cell(0, 0).text = "${nested}"
+    # The continuation of a vertical merge reads as the cell it continues
+    table.cell(0, 0).merge(table.cell(1, 0))
+    _append_xml(
+        table.rows[1]._tr.tc_lst[0],
+        f'<w:p {nsdecls("w")}><w:r><w:t>${{merged}}</w:t></w:r></w:p>',
+    )
+
+    section = document.sections[0]
+    section.header.paragraphs[0].text = "${header}"
+    section.footer.add_table(1, 1, section.page_width).cell(0, 0).text = "${footer}"
+    # Only the default header and footer are read
+    section.different_first_page_header_footer = True
+    section.first_page_header.paragraphs[0].text = "${first_page}"
+
+    path = tmp_path / "template.docx"
+    document.save(path)
+    return str(path)
+
+
+def test_scan_docx_keys_matches_docx_get_keys(template_path):
+    keys = scan_docx_keys(template_path)
+
+    assert sorted(keys) == sorted(docx_get_keys(docx.Document(template_path)))
+    assert sorted(keys) == ["cell", "footer", "header", "link", "split", "top"]
+
+
+def test_scan_docx_keys_in_order_of_appearance(template_path):
+    assert scan_docx_keys(template_path)[:3] == ["top", "split", "link"]
@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+from profile_imports import HEAVY_MODULES, is_heavy, profile_import
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# About 300 ms measured, with headroom for a slower machine
+IMPORT_BUDGET_MS = 400
+
+
+def test_import_api_is_under_budget():
+    # The best of a few runs, so a busy machine doesn't fail the test
+    total_ms = min(profile_import("api")[0] for _ in range(5))
+
+    assert total_ms < IMPORT_BUDGET_MS
+
+
+def test_import_api_leaves_heavy_modules_unloaded():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json, sys, api; print(json.dumps(sorted(sys.modules)))",
+        ],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = json.loads(result.stdout.splitlines()[-1])
+
+    assert [module for module in modules if is_heavy(module)] == []
+
+
+def test_heavy_modules_include_the_docx_and_pdf_libraries():
+    for module in ("PyPDF2", "lxml", "docx", "docx2pdf", "python_docx_replace"):
+        assert module in HEAVY_MODULES
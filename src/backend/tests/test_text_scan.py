@@ -0,0 +1,119 @@
+import io
+
+import pytest
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+
+from buildpdf.text_scan import PageTextScanner, UnsupportedContent
+
+KERNING = b"BT /F1 12 Tf 72 700 Td [(Lab) -40 (Sample) -300 (ID:) 250 (S1234)] TJ ET"
+LINE_MOVES = (
+    b"BT /F1 12 Tf 14 TL 72 700 Td (First line) Tj 0 -14 Td (Second) Tj "
+    b"120 0 Td (same line) Tj 0 -14 TD (TD moved) Tj T* (T star) Tj "
+    b"(quote) ' 1 2 (double quote) \" ET"
+)
+GRAPHICS_STATE = (
+    b"q 1 0 0 1 50 50 cm BT /F1 12 Tf 10 600 Td (Inside q) Tj ET Q "
+    b"q 2 0 0 2 0 0 cm BT /F1 6 Tf 36 280 Td (Scaled) Tj ET Q "
+    b"BT /F1 12 Tf 72 500 Td (After Q) Tj ET"
+)
+FORM = b"BT /F1 12 Tf 72 700 Td (Before form) Tj ET /Fm1 Do"
+ROTATED_TEXT = b"BT /F1 12 Tf 0 1 -1 0 300 300 Tm (Sideways) Tj ET"
+PLAIN = b"BT /F1 12 Tf 72 700 Td (Lab Sample ID: S1234) Tj ET"
+
+
+def _stream(writer, data, entries=None):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    for key, value in (entries or {}).items():
+        stream[NameObject(key)] = value
+    return writer._add_object(stream)
+
+
+def _pdf(*pages, rotate=0):
+    """A PDF with one page per content stream, all showing text in Helvetica."""
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    fonts = DictionaryObject({NameObject("/F1"): font})
+    form = _stream(
+        writer,
+        b"BT /F1 12 Tf 72 600 Td (Inside form) Tj ET",
+        {
+            "/Type": NameObject("/XObject"),
+            "/Subtype": NameObject("/Form"),
+            "/BBox": ArrayObject(NumberObject(n) for n in (0, 0, 612, 792)),
+            "/Resources": DictionaryObject({NameObject("/Font"): fonts}),
+        },
+    )
+    for content in pages:
+        page = PageObject.create_blank_page(None, 612, 792)
+        page[NameObject("/Contents")] = _stream(writer, content)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {
+                NameObject("/Font"): fonts,
+                NameObject("/XObject"): DictionaryObject({NameObject("/Fm1"): form}),
+            }
+        )
+        if rotate:
+            page[NameObject("/Rotate")] = NumberObject(rotate)
+        writer.add_page(page)
+    output = io.BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return PdfReader(output)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [KERNING, LINE_MOVES, GRAPHICS_STATE],
+    ids=["tj-kerning", "line-moves", "q-cm"],
+)
+def test_scanned_text_matches_extract_text(content):
+    page = _pdf(content).pages[0]
+    scanner = PageTextScanner(enabled=True)
+
+    assert scanner.page_text(page) == page.extract_text()
+    assert scanner.scanned_pages == 1
+
+
+def test_rotated_page_matches_extract_text():
+    page = _pdf(PLAIN, rotate=90).pages[0]
+    scanner = PageTextScanner(enabled=True)
+
+    assert scanner.page_text(page) == page.extract_text()
+
+
+@pytest.mark.parametrize(
+    "content", [FORM, ROTATED_TEXT], ids=["form-xobject", "rotated-text"]
+)
+def test_unsupported_content_falls_back_to_extract_text(content):
+    page = _pdf(content).pages[0]
+    scanner = PageTextScanner(enabled=True)
+
+    with pytest.raises(UnsupportedContent):
+        scanner.scan(page)
+    assert scanner.page_text(page) == page.extract_text()
+    assert scanner.extracted_pages == 1
+
+
+def test_max_bytes_drops_text_shown_after_the_limit():
+    first = b"BT /F1 12 Tf 72 700 Td (Shown) Tj ET"
+    page = _pdf(first + b"\nBT /F1 12 Tf 72 600 Td (Cut off) Tj ET").pages[0]
+
+    assert PageTextScanner(enabled=True).page_text(page) == "Shown\nCut off"
+    limited = PageTextScanner(max_bytes=len(first), enabled=True)
+    assert limited.page_text(page) == "Shown"
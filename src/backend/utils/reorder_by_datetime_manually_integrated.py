@@ -1,3 +1,4 @@
+import io
 from PyPDF2 import PdfWriter, PdfReader, PageObject
 import re
 import datetime as dt
@@ -5,6 +6,9 @@ from pydantic import BaseModel
 from typing import Optional, List, Union
 import os
 
+from buildpdf.outline import walk_outline
+from buildpdf.text_scan import iter_page_texts
+
 
 class PdfPage(BaseModel):
     pdf_pages: List[PageObject]
@@ -12,6 +16,7 @@ class PdfPage(BaseModel):
     is_manually_integrated: Optional[bool]
     original_pdf_path: str
     bookmarks: List[dict]  # New field to store bookmarks
+    matches: List[list] = []  # Matched bookmark titles of pdf_pages
 
     class Config:
         arbitrary_types_allowed = True
@@ -40,39 +45,37 @@ def get_is_manually_integrated(text: str) -> bool:
 
 
 def reorder_pdfs_by_datetime(
-    paths: list[str], return_path: bool = False
+    paths: list[str],
+    return_path: bool = False,
+    match_page=None,
+    page_matches: list = None,
+    open_pdf=PdfReader,
 ) -> Union[tuple[PdfReader, int], tuple[str, int]]:
     """
     This reorder function is made for reordering the pages within pdfs based on datetime and if the page has been manually integrated.
     It also preserves the bookmarks from the original PDFs.
+    If match_page is given, it is called with the text of every page as it is read,
+    and if page_matches is a list its results are appended to it in output page order.
+    The PDFs are opened with open_pdf, which is given their path.
     Returns a tuple containing the PdfReader (or path) and the number of pages.
     """
     all_pages = []
     for path in paths:
-        pdf = PdfReader(path)
-        bookmarks = pdf.outline
+        pdf = open_pdf(path)
         page_bookmarks = [[] for _ in range(len(pdf.pages))]
 
-        def process_bookmarks(bookmarks, parent=None):
-            for bookmark in bookmarks:
-                if isinstance(bookmark, list):
-                    process_bookmarks(bookmark, parent)
-                else:
-                    if (
-                        "/Page" in bookmark
-                        and bookmark.get("/Title", "") != "Integration"
-                    ):
-                        page_num = pdf.get_destination_page_number(bookmark)
-                        page_bookmarks[page_num].append({**bookmark, "parent": parent})
-
-        process_bookmarks(bookmarks)
-
-        for i, page in enumerate(pdf.pages):
-            text = page.extract_text()
+        for _, title, page_num in walk_outline(pdf):
+            if title != "Integration" and 0 <= page_num < len(page_bookmarks):
+                page_bookmarks[page_num].append({"/Title": title})
+
+        for i, text in enumerate(iter_page_texts(pdf)):
+            page = pdf.pages[i]
+            matches = [match_page(text)] if match_page is not None else []
             datetime = get_datetime_from_text(text)
             is_manually_integrated = get_is_manually_integrated(text)
             if not datetime and all_pages:
                 all_pages[-1].pdf_pages.append(page)
+                all_pages[-1].matches.extend(matches)
                 all_pages[-1].bookmarks.extend(page_bookmarks[i])
                 all_pages[-1].is_manually_integrated = (
                     is_manually_integrated or all_pages[-1].is_manually_integrated
@@ -85,6 +88,7 @@ def reorder_pdfs_by_datetime(
                         is_manually_integrated=is_manually_integrated,
                         original_pdf_path=path,
                         bookmarks=page_bookmarks[i],
+                        matches=matches,
                     )
                 )
 
@@ -106,27 +110,28 @@ def reorder_pdfs_by_datetime(
         for pdf_page in page.pdf_pages:
             writer.add_page(pdf_page)
             total_pages += 1
+        if page_matches is not None:
+            page_matches.extend(page.matches)
 
     # Add bookmarks to the new PDF
     page_num = 0
     for page in all_pages:
         for bookmark in page.bookmarks:
-            if "parent" in bookmark:
-                del bookmark["parent"]
             title = bookmark.get("/Title", "")
             if title != "Integration":
                 writer.add_outline_item(title, page_num, parent=None)
         page_num += len(page.pdf_pages)
 
-    output_path = "temp.pdf"
-    writer.write(output_path)
-
     if return_path:
+        output_path = "temp.pdf"
+        writer.write(output_path)
         return output_path, total_pages
 
-    pdf = PdfReader(output_path)
-    os.remove(output_path)
-    return pdf, total_pages
+    # Keep the reordered document in memory instead of a temp.pdf in the working directory
+    pdf_bytes = io.BytesIO()
+    writer.write(pdf_bytes)
+    pdf_bytes.seek(0)
+    return PdfReader(pdf_bytes), total_pages
 
 
 if __name__ == "__main__":
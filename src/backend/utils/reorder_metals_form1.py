@@ -1,33 +1,39 @@
 import io
 from PyPDF2 import PdfReader, PdfWriter
-import re
 
+from buildpdf.page_level_bookmarks import page_sort_key
+from buildpdf.text_scan import iter_page_texts
 
-def reorder_metals_form1(files):
+
+def reorder_metals_form1(
+    files, match_page=None, page_matches=None, open_pdf=PdfReader
+):
     # returns (combined_pdf, num_pages)
-    pdfs = [PdfReader(file["file_path"]) for file in files]
+    # If match_page is given, it is called with the text of every page, and if
+    # page_matches is a list its results are appended to it in the new order.
+    # open_pdf opens the source PDFs by path.
+    pdfs = [open_pdf(file["file_path"]) for file in files]
     num_pages = sum([file["num_pages"] for file in files])
 
-    page_data = []
-    for pdf in pdfs:
-        for page in range(len(pdf.pages)):
-            text = pdf.pages[page].extract_text()
-            lab_sample_id = re.search(r"Lab Sample ID: (\S+)", text)
-            data_set_id = re.search(r"Data Set ID: (\S+)", text)
-            page_data.append(
-                (
-                    pdf.pages[page],
-                    lab_sample_id.group(1) if lab_sample_id else "",
-                    data_set_id.group(1) if data_set_id else "",
-                    text,
-                )
+    # Only small (sort key, position) tuples are kept, the text is dropped per page
+    order = []
+    matches = []
+    for pdf_index, pdf in enumerate(pdfs):
+        for page_index, text in enumerate(iter_page_texts(pdf)):
+            lab_sample_id, data_set_id = page_sort_key(text)
+            order.append(
+                (lab_sample_id, data_set_id, len(order), pdf_index, page_index)
             )
+            if match_page is not None:
+                matches.append(match_page(text))
 
-    page_data.sort(key=lambda x: (x[1], x[2]))
+    order.sort()
 
     result_pdf = PdfWriter()
-    for page in page_data:
-        result_pdf.add_page(page[0])
+    for _, _, position, pdf_index, page_index in order:
+        result_pdf.add_page(pdfs[pdf_index].pages[page_index])
+        if match_page is not None and page_matches is not None:
+            page_matches.append(matches[position])
 
     # Write the PdfWriter content to a BytesIO object
     pdf_bytes = io.BytesIO()
@@ -0,0 +1,71 @@
+import json
+import locale
+from typing import Any
+
+import orjson
+
+# Written into every report saved by save_report. Files with this version were
+# written from a validated schema.Section and need no backwards compatibility
+# conversion when they are loaded.
+REPORT_SCHEMA_VERSION = 1
+SCHEMA_VERSION_KEY = "schema_version"
+
+
+def read_json(path: str) -> Any:
+    """
+    Reads a JSON file with orjson in a single read.
+
+    Files written by older versions with json.dump on Windows may be in the
+    system's ANSI code page instead of UTF-8, so those are decoded with it.
+
+    :raises FileNotFoundError: If path doesn't exist.
+    :raises json.JSONDecodeError: If the file is not valid JSON.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError as error:
+        try:
+            return json.loads(raw.decode(locale.getpreferredencoding(False)))
+        except ValueError:
+            raise error
+
+
+def dump_json(data: Any, compact: bool = False) -> bytes:
+    """
+    Encodes data as UTF-8 JSON with orjson.
+
+    :param compact: Leave out all whitespace. Otherwise the JSON is indented with
+        two spaces so it stays readable in an editor.
+    """
+    option = orjson.OPT_NON_STR_KEYS
+    if not compact:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, option=option)
+
+
+def write_json(path: str, data: Any, compact: bool = False) -> None:
+    """Writes data as JSON with orjson. See dump_json for compact."""
+    encoded = dump_json(data, compact=compact)
+    with open(path, "wb") as f:
+        f.write(encoded)
+
+
+def is_current_report(data: Any) -> bool:
+    """Whether a loaded report was saved by save_report in the current schema version."""
+    return (
+        isinstance(data, dict)
+        and data.get(SCHEMA_VERSION_KEY) == REPORT_SCHEMA_VERSION
+    )
+
+
+def save_report(path: str, report: dict, compact: bool = False) -> None:
+    """
+    Writes a report in the current schema, tagged with REPORT_SCHEMA_VERSION.
+
+    :param report: A schema.Section dumped with model_dump.
+    :param compact: Write without whitespace, for very large reports.
+    """
+    report = {SCHEMA_VERSION_KEY: REPORT_SCHEMA_VERSION, **report}
+    write_json(path, report, compact=compact)
@@ -2,6 +2,132 @@ import json
 import os
 import re
 import glob
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Number of concurrent stat calls. On a network share every stat is a round-trip,
+# so validation time is bounded by latency rather than by local CPU.
+STAT_WORKERS = 16
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+
+def stat_paths(paths, max_workers=STAT_WORKERS):
+    """
+    Stats every path once, concurrently.
+
+    Returns a dict mapping each path to its os.stat_result, or None if it does not exist.
+    """
+    unique_paths = list(dict.fromkeys(paths))
+    if len(unique_paths) <= 1 or max_workers <= 1:
+        return {path: _stat(path) for path in unique_paths}
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(unique_paths)), thread_name_prefix="stat"
+    ) as executor:
+        return dict(zip(unique_paths, executor.map(_stat, unique_paths)))
+
+
+def _lookup_stat(path, stats):
+    if stats is not None and path in stats:
+        return stats[path]
+    return _stat(path)
+
+
+def check_docx_path(docx_path, bookmark_name, stats=None):
+    result = _lookup_stat(docx_path, stats)
+    if result is None:
+        return f"Error: docx_path ({docx_path}) does not exist for {bookmark_name}"
+    if not stat.S_ISREG(result.st_mode):
+        return f"Error: docx_path ({docx_path}) is not a file for {bookmark_name}"
+    if not (
+        docx_path.lower().endswith(".docx") or docx_path.lower().endswith(".doc")
+    ):
+        return f"Error: docx_path ({docx_path}) is not a docx file for {bookmark_name}"
+    return None
+
+
+def check_directory_source(directory_source, bookmark_name, stats=None):
+    result = _lookup_stat(directory_source, stats)
+    if result is None:
+        return f"Error: directory_source ({directory_source}) does not exist for file {bookmark_name}"
+    if not stat.S_ISDIR(result.st_mode):
+        return f"Error: directory_source ({directory_source}) is not a directory for file {bookmark_name}"
+    return None
+
+
+def check_file_path(file_path, index, bookmark_name, stats=None):
+    result = _lookup_stat(file_path, stats)
+    if result is None:
+        return f"Error: file_path ({file_path}) does not exist for the {index+1}th file in FileType {bookmark_name}"
+    if not stat.S_ISREG(result.st_mode):
+        return f"Error: file_path ({file_path}) is not a file for the {index+1}th file in FileType {bookmark_name}"
+    if not (
+        file_path.lower().endswith(".pdf") or file_path.lower().endswith(".docx")
+    ):
+        return f"Error: file_path ({file_path}) is not a pdf or docx file for the {index+1}th file in FileType {bookmark_name}"
+    return None
+
+
+def _file_type_directory_source(file_type, base_directory):
+    directory_source = os.path.join(base_directory, file_type["directory_source"])
+    return os.path.normpath(directory_source)
+
+
+def file_type_paths(file_type, base_directory):
+    """
+    Returns every path check_file_type_paths would stat for a FileType.
+    """
+    if "docx_path" in file_type:
+        return [os.path.normpath(os.path.join(base_directory, file_type["docx_path"]))]
+    directory_source = _file_type_directory_source(file_type, base_directory)
+    return [directory_source] + [
+        os.path.normpath(os.path.join(directory_source, file["file_path"]))
+        for file in file_type["files"]
+    ]
+
+
+def file_type_problems(file_type, base_directory, stats=None):
+    """
+    Returns every path problem of a FileType. Paths found in stats are not stat'ed again.
+    """
+    # Check if this is a former DocxTemplate (has docx_path attribute)
+    if "docx_path" in file_type:
+        docx_path = os.path.join(base_directory, file_type["docx_path"])
+        docx_path = os.path.normpath(docx_path)
+        problem = check_docx_path(docx_path, file_type["bookmark_name"], stats)
+        return [problem] if problem else []
+
+    # Regular FileType validation
+    directory_source = _file_type_directory_source(file_type, base_directory)
+    problem = check_directory_source(
+        directory_source, file_type["bookmark_name"], stats
+    )
+    if problem:
+        # Every file would be missing as well, so only the directory is reported
+        return [problem]
+
+    problems = []
+    for index, file in enumerate(file_type["files"]):
+        file_path = os.path.join(directory_source, file["file_path"])
+        file_path = os.path.normpath(file_path)
+        problem = check_file_path(file_path, index, file_type["bookmark_name"], stats)
+        if problem:
+            problems.append(problem)
+    return problems
+
+
+def check_file_type_paths(file_type, base_directory, stats=None):
+    """
+    Returns the first path problem of a FileType, or None if all of its paths are valid.
+    """
+    problems = file_type_problems(file_type, base_directory, stats)
+    return problems[0] if problems else None
 
 
 def validate_paths(report, cwd="/"):
@@ -10,41 +136,9 @@ def validate_paths(report, cwd="/"):
     for child in report["children"]:
         # Handle both regular FileType and FileType with DocxTemplate features
         if child["type"] == "FileType":
-            directory_source = os.path.join(base_directory, child["directory_source"])
-            directory_source = os.path.normpath(directory_source)
-
-            # Check if this is a former DocxTemplate (has docx_path attribute)
-            if "docx_path" in child:
-                docx_path = os.path.join(base_directory, child["docx_path"])
-                docx_path = os.path.normpath(docx_path)
-                if not os.path.exists(docx_path):
-                    return f"Error: docx_path ({docx_path}) does not exist for {child['bookmark_name']}"
-                if not os.path.isfile(docx_path):
-                    return f"Error: docx_path ({docx_path}) is not a file for {child['bookmark_name']}"
-                if not (
-                    docx_path.lower().endswith(".docx")
-                    or docx_path.lower().endswith(".doc")
-                ):
-                    return f"Error: docx_path ({docx_path}) is not a docx file for {child['bookmark_name']}"
-            else:
-                # Regular FileType validation
-                if not os.path.exists(directory_source):
-                    return f"Error: directory_source ({directory_source}) does not exist for file {child['bookmark_name']}"
-                if not os.path.isdir(directory_source):
-                    return f"Error: directory_source ({directory_source}) is not a directory for file {child['bookmark_name']}"
-
-                for index, file in enumerate(child["files"]):
-                    file_path = os.path.join(directory_source, file["file_path"])
-                    file_path = os.path.normpath(file_path)
-                    if not os.path.exists(file_path):
-                        return f"Error: file_path ({file_path}) does not exist for the {index+1}th file in FileType {child['bookmark_name']}"
-                    if not os.path.isfile(file_path):
-                        return f"Error: file_path ({file_path}) is not a file for the {index+1}th file in FileType {child['bookmark_name']}"
-                    if not (
-                        file_path.lower().endswith(".pdf")
-                        or file_path.lower().endswith(".docx")
-                    ):
-                        return f"Error: file_path ({file_path}) is not a pdf or docx file for the {index+1}th file in FileType {child['bookmark_name']}"
+            problem = check_file_type_paths(child, base_directory)
+            if problem:
+                return problem
 
         if child["type"] == "Section":
             # Add variables array if missing for backward compatibility
@@ -52,7 +146,7 @@ def validate_paths(report, cwd="/"):
                 child["variables"] = []
 
             result = validate_paths(child, base_directory)
-            if result:
+            if result is not True:
                 return result
 
     return True
@@ -260,105 +260,52 @@ const CreateFromReportModal = ({ show, onHide }) => {
       let extractedVariables = { ...data };
 
       // Extract variables from DOCX templates and merge them
+      const docxTemplates = {
+        coverPage: coverPageTemplatePath,
+        coverPages: coverPagesTemplatePath,
+        caseNarrative: caseNarrativeTemplatePath,
+      };
+      const docxPaths = Object.values(docxTemplates).filter(Boolean);
       const docxVariables = {};
-      let hasDocxTemplates = false;
-
-      // Process Cover Page Template if selected
-      if (coverPageTemplatePath) {
-        hasDocxTemplates = true;
-        try {
-          const coverPageResponse = await fetch(
-            'http://localhost:8000/get_docx_variables',
-            {
-              method: 'POST',
-              headers: {
-                'Content-Type': 'application/json',
-              },
-              body: JSON.stringify({
-                docx_path: coverPageTemplatePath,
-              }),
-            },
-          );
-
-          if (coverPageResponse.ok) {
-            const variables = await coverPageResponse.json();
-            docxVariables.coverPage = variables.variables;
-
-            // Add to extracted data without prefix
-            variables.variables.forEach((variable) => {
-              if (!extractedVariables[variable]) {
-                extractedVariables[variable] = '';
-              }
-            });
-          }
-        } catch (error) {
-          console.error('Error extracting Cover Page variables:', error);
-        }
-      }
 
-      // Process Cover Pages Template if selected
-      if (coverPagesTemplatePath) {
-        hasDocxTemplates = true;
+      if (docxPaths.length > 0) {
         try {
-          const coverPagesResponse = await fetch(
-            'http://localhost:8000/get_docx_variables',
+          const docxResponse = await fetch(
+            'http://localhost:8000/get_docx_variables_bulk',
             {
               method: 'POST',
               headers: {
                 'Content-Type': 'application/json',
               },
               body: JSON.stringify({
-                docx_path: coverPagesTemplatePath,
+                docx_paths: docxPaths,
               }),
             },
           );
 
-          if (coverPagesResponse.ok) {
-            const variables = await coverPagesResponse.json();
-            docxVariables.coverPages = variables.variables;
-
-            // Add to extracted data without prefix
-            variables.variables.forEach((variable) => {
-              if (!extractedVariables[variable]) {
-                extractedVariables[variable] = '';
-              }
-            });
-          }
-        } catch (error) {
-          console.error('Error extracting Cover Pages variables:', error);
-        }
-      }
-
-      // Process Case Narrative Template if selected
-      if (caseNarrativeTemplatePath) {
-        hasDocxTemplates = true;
-        try {
-          const caseNarrativeResponse = await fetch(
-            'http://localhost:8000/get_docx_variables',
-            {
-              method: 'POST',
-              headers: {
-                'Content-Type': 'application/json',
-              },
-              body: JSON.stringify({
-                docx_path: caseNarrativeTemplatePath,
-              }),
-            },
-          );
-
-          if (caseNarrativeResponse.ok) {
-            const variables = await caseNarrativeResponse.json();
-            docxVariables.caseNarrative = variables.variables;
-
-            // Add to extracted data without prefix
-            variables.variables.forEach((variable) => {
-              if (!extractedVariables[variable]) {
-                extractedVariables[variable] = '';
+          if (docxResponse.ok) {
+            const { variables, errors } = await docxResponse.json();
+            Object.entries(docxTemplates).forEach(([name, path]) => {
+              if (!path) return;
+              if (errors[path]) {
+                console.error(
+                  `Error extracting ${name} variables:`,
+                  errors[path],
+                );
+                return;
               }
+              docxVariables[name] = variables[path] || [];
+
+              // Add to extracted data without prefix
+              docxVariables[name].forEach((variable) => {
+                if (!extractedVariables[variable]) {
+                  extractedVariables[variable] = '';
+                }
+              });
             });
           }
         } catch (error) {
-          console.error('Error extracting Case Narrative variables:', error);
+          console.error('Error extracting DOCX template variables:', error);
         }
       }
 
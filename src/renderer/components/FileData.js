@@ -11,7 +11,7 @@ export default function FileData({
   onChange,
   directorySource,
 }) {
-  const { file_path, num_pages } = fileData;
+  const { file_path, num_pages, num_pages_confidence } = fileData;
   // Extract the filename without extension
   const fileName = path.basename(file_path, path.extname(file_path));
   const isDocx = file_path.toLowerCase().endsWith('.docx');
@@ -58,6 +58,14 @@ export default function FileData({
             {num_pages}
             {num_pages > 1 ? ' Pages' : ' Page'}
           </>
+        ) : num_pages > 0 ? (
+          <span
+            className="text-muted"
+            title={`Estimated without converting (${num_pages_confidence} confidence)`}
+          >
+            ~{num_pages}
+            {num_pages > 1 ? ' Pages' : ' Page'}
+          </span>
         ) : (
           <span className="text-muted">-</span>
         )}